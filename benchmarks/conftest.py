@@ -0,0 +1,63 @@
+from os import environ, listdir
+from os.path import abspath, dirname, exists, join
+
+import pytest
+
+from iatikit.data.registry import Registry
+from iatikit.utils.cache import tree_cache
+from iatikit.utils.config import CONFIG
+
+from .generate import generate
+
+
+# The size of the synthetic registry can be set using environment
+# variables, e.g. ``IATIKIT_BENCHMARK_ACTIVITIES=500``
+PUBLISHERS = int(environ.get('IATIKIT_BENCHMARK_PUBLISHERS', 5))
+DATASETS = int(environ.get('IATIKIT_BENCHMARK_DATASETS', 4))
+ACTIVITIES = int(environ.get('IATIKIT_BENCHMARK_ACTIVITIES', 50))
+
+# Defaults to the (partial) standard in the test fixtures. Point this
+# at a full download (see ``iatikit.download.standard``) to benchmark
+# validation against every version.
+STANDARD_PATH = environ.get(
+    'IATIKIT_BENCHMARK_STANDARD',
+    join(dirname(dirname(abspath(__file__))), 'tests', 'fixtures',
+         'standard'))
+
+
+def standard_versions(subdir):
+    """Return the versions available in a directory of the standard,
+    e.g. ``schemas``, in the form ``2.03``.
+    """
+    path = join(STANDARD_PATH, subdir)
+    if not exists(path):
+        return []
+    return sorted('{}.{}'.format(x[0], x[1:]) for x in listdir(path))
+
+
+@pytest.fixture(scope='session')
+def registry_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('registry'))
+    generate(path, PUBLISHERS, DATASETS, ACTIVITIES)
+    return path
+
+
+@pytest.fixture(scope='session', autouse=True)
+def config(registry_path):
+    CONFIG.read_dict({'paths': {
+        'registry': registry_path,
+        'standard': STANDARD_PATH,
+    }})
+
+
+@pytest.fixture
+def registry(registry_path):
+    return Registry(registry_path)
+
+
+@pytest.fixture
+def cold_cache():
+    """Empty the parsed tree cache, before and after a benchmark."""
+    tree_cache.clear()
+    yield
+    tree_cache.clear()
@@ -0,0 +1,143 @@
+"""Generate a synthetic IATI registry, for benchmarking.
+
+Usage::
+
+    python -m benchmarks.generate PATH [--publishers N] [--datasets M]
+                                       [--activities K]
+"""
+import argparse
+from datetime import date, datetime, timedelta
+import json
+from os import makedirs
+from os.path import join
+import random
+
+from lxml import etree as ET
+
+
+VERSIONS = ['1.01', '1.02', '1.03', '1.04', '1.05', '2.01', '2.02', '2.03']
+
+SECTOR_CODES = ['15153', '15163', '73010']
+
+
+def _text(parent, tag, text, version):
+    element = ET.SubElement(parent, tag)
+    if version.startswith('1.'):
+        element.text = text
+    else:
+        ET.SubElement(element, 'narrative').text = text
+    return element
+
+
+def _activity(publisher, idx, version, rand):
+    v1 = version.startswith('1.')
+    activity = ET.Element('iati-activity')
+    activity.set('default-currency', 'USD')
+    if version >= '2.02':
+        activity.set('humanitarian', rand.choice(['0', '1']))
+    identifier = 'XM-BENCH-{}-{}'.format(publisher, idx)
+    ET.SubElement(activity, 'iati-identifier').text = identifier
+    reporting_org = _text(activity, 'reporting-org',
+                          'Publisher {}'.format(publisher), version)
+    reporting_org.set('ref', 'XM-BENCH-{}'.format(publisher))
+    reporting_org.set('type', '21')
+    _text(activity, 'title', 'Activity {} of {}'.format(idx, publisher),
+          version)
+    _text(activity, 'description',
+          'A synthetic activity, for benchmarking. ' * 5, version)
+
+    start = date(2010, 1, 1) + timedelta(days=rand.randint(0, 3650))
+    end = start + timedelta(days=rand.randint(30, 1800))
+    date_types = ['start-planned', 'start-actual', 'end-planned'] if v1 \
+        else ['1', '2', '3']
+    for date_type, value in zip(date_types, [start, start, end]):
+        activity_date = ET.SubElement(activity, 'activity-date')
+        activity_date.set('type', date_type)
+        activity_date.set('iso-date', value.isoformat())
+
+    sector_codes = rand.sample(SECTOR_CODES, rand.randint(1, 2))
+    for code in sector_codes:
+        sector = ET.SubElement(activity, 'sector')
+        sector.set('code', code)
+        sector.set('vocabulary', 'DAC' if v1 else '1')
+        sector.set('percentage', str(100 // len(sector_codes)))
+    if not v1:
+        sector = ET.SubElement(activity, 'sector')
+        sector.set('code', rand.choice(SECTOR_CODES)[:3])
+        sector.set('vocabulary', '2')
+    return activity
+
+
+def _metadata(publisher, dataset_name, version, activity_count):
+    return {
+        'name': dataset_name,
+        'organization': {'name': publisher},
+        'extras': [
+            {'key': 'filetype', 'value': 'activity'},
+            {'key': 'iati_version', 'value': version},
+            {'key': 'activity_count', 'value': str(activity_count)},
+        ],
+    }
+
+
+def generate(path, publishers=5, datasets=4, activities=50,
+             versions=None, seed=0):
+    """Write a synthetic registry to ``path``, with ``publishers``
+    publishers, each with ``datasets`` activity datasets of
+    ``activities`` activities.
+
+    Dataset versions are cycled through ``versions``.
+    """
+    if versions is None:
+        versions = VERSIONS
+    rand = random.Random(seed)
+    makedirs(path, exist_ok=True)
+    with open(join(path, 'metadata.json'), 'w') as handler:
+        json.dump({
+            'updated_at': datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ'),
+        }, handler)
+
+    count = 0
+    for publisher_idx in range(publishers):
+        publisher = 'bench-pub-{}'.format(publisher_idx)
+        data_path = join(path, 'data', publisher)
+        metadata_path = join(path, 'metadata', publisher)
+        makedirs(data_path, exist_ok=True)
+        makedirs(metadata_path, exist_ok=True)
+        with open(metadata_path + '.json', 'w') as handler:
+            json.dump({'name': publisher}, handler)
+
+        for dataset_idx in range(datasets):
+            version = versions[count % len(versions)]
+            count += 1
+            dataset_name = '{}-{}'.format(publisher, dataset_idx)
+            root = ET.Element('iati-activities')
+            root.set('version', version)
+            for activity_idx in range(activities):
+                root.append(_activity(
+                    publisher, dataset_idx * activities + activity_idx,
+                    version, rand))
+            ET.ElementTree(root).write(
+                join(data_path, dataset_name + '.xml'),
+                encoding='UTF-8', xml_declaration=True, pretty_print=True)
+            with open(join(metadata_path, dataset_name + '.json'),
+                      'w') as handler:
+                json.dump(_metadata(publisher, dataset_name,
+                                    version, activities), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generate a synthetic IATI registry.')
+    parser.add_argument('path')
+    parser.add_argument('--publishers', type=int, default=5)
+    parser.add_argument('--datasets', type=int, default=4)
+    parser.add_argument('--activities', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generate(args.path, args.publishers, args.datasets, args.activities,
+             seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
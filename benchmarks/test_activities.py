@@ -0,0 +1,70 @@
+import datetime
+
+import pytest
+
+from iatikit.data.activity import Activity
+from iatikit.data.sector import Sector
+from iatikit.utils.cache import tree_cache
+
+
+# filters are built lazily, since sectors need the standard path
+FILTERS = {
+    'none': lambda: {},
+    'string': lambda: {
+        'iati_identifier__startswith': 'XM-BENCH-bench-pub-0-'},
+    'narrative': lambda: {'title__exists': True},
+    'date': lambda: {'planned_start__gt': datetime.date(2015, 1, 1)},
+    'sector': lambda: {'sector': Sector('15163', vocabulary='1')},
+    'sector_category': lambda: {
+        'sector__in': Sector('151', vocabulary='2')},
+    'boolean': lambda: {'humanitarian': True},
+    'xpath': lambda: {'xpath': 'sector[@percentage = "50"]'},
+}
+
+
+@pytest.mark.parametrize('name', sorted(FILTERS))
+def test_len(benchmark, registry, name):
+    activities = registry.activities.where(**FILTERS[name]())
+    benchmark(len, activities)
+
+
+@pytest.mark.parametrize('name', sorted(FILTERS))
+def test_iter(benchmark, registry, name):
+    activities = registry.activities.where(**FILTERS[name]())
+    benchmark(list, activities)
+
+
+def test_len_cold(benchmark, registry):
+    """Count activities with an empty tree cache,
+    so that every dataset is parsed.
+    """
+    activities = registry.activities
+    benchmark.pedantic(len, args=(activities,), setup=tree_cache.clear,
+                       rounds=5)
+
+
+def test_iter_stream(benchmark, registry):
+    activities = registry.activities.stream()
+    benchmark(list, activities)
+
+
+PROPERTIES = [
+    'iati_identifier', 'title', 'description', 'sector', 'humanitarian',
+    'planned_start', 'actual_start', 'start', 'planned_end', 'end',
+]
+
+
+@pytest.fixture(scope='module')
+def activity_list(registry_path):
+    from iatikit.data.registry import Registry
+    return [(x.etree, x.dataset, x.schema)
+            for x in Registry(registry_path).activities]
+
+
+@pytest.mark.parametrize('prop', PROPERTIES)
+def test_property(benchmark, activity_list, prop):
+    # properties are memoised, so build fresh activities each round
+    def access():
+        for etree, dataset, schema in activity_list:
+            getattr(Activity(etree, dataset, schema), prop)
+    benchmark(access)
@@ -0,0 +1,14 @@
+def test_publishers(benchmark, registry):
+    publishers = benchmark(lambda: list(registry.publishers))
+    assert publishers
+
+
+def test_datasets(benchmark, registry):
+    datasets = benchmark(lambda: list(registry.datasets))
+    assert datasets
+
+
+def test_datasets_filter(benchmark, registry):
+    datasets = benchmark(
+        lambda: list(registry.datasets.where(filetype='activity')))
+    assert datasets
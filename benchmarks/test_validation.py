@@ -0,0 +1,43 @@
+import pytest
+
+from iatikit.data.sector import Sector
+from iatikit.standard.codelist import CodelistSet
+
+from .conftest import standard_versions
+
+
+def dataset_for(registry, version):
+    for dataset in registry.datasets:
+        if dataset.version == version:
+            return dataset
+    pytest.skip('No {} dataset in the registry'.format(version))
+    return None
+
+
+@pytest.mark.parametrize('version', standard_versions('schemas'))
+def test_validate_iati(benchmark, registry, version):
+    dataset = dataset_for(registry, version)
+    result = benchmark(dataset.validate_iati)
+    assert result.is_valid
+
+
+@pytest.mark.parametrize('version', standard_versions('codelist_mappings'))
+def test_validate_codelists(benchmark, registry, version):
+    dataset = dataset_for(registry, version)
+    result = benchmark(dataset.validate_codelists)
+    assert result.is_valid
+
+
+@pytest.mark.parametrize('code,vocabulary', [
+    ('15163', '1'),
+    ('151', '2'),
+    ('73010', 'DAC'),
+])
+def test_sector(benchmark, code, vocabulary):
+    sector = benchmark(Sector, code, vocabulary=vocabulary)
+    assert sector.code.code == code
+
+
+def test_sector_from_codelist_item(benchmark):
+    item = CodelistSet().get('Sector').get('15163')
+    benchmark(Sector, item)
@@ -7,7 +7,9 @@ from .data.dataset import Dataset  # noqa: F401
 from .data.activity import Activity  # noqa: F401
 from .data.sector import Sector  # noqa: F401
 from .utils import download  # noqa: F401
+from .utils import index  # noqa: F401
 from .utils.config import CONFIG  # noqa: F401
+from .utils.validate import validate_registry  # noqa: F401
 from .__version__ import __version__  # noqa: F401
 
 
@@ -1,3 +1,5 @@
+from copy import copy, deepcopy
+import logging
 import webbrowser
 try:
     from urllib.parse import urlencode
@@ -8,13 +10,25 @@ from lxml import etree as ET
 
 from ..standard.schema import get_schema
 from ..standard.xsd_schema import XSDSchema
-from ..utils.abstract import GenericSet
-from ..utils.exceptions import SchemaError
+from ..utils.abstract import GenericSet, ResultSet, memoized_property
+from ..utils.exceptions import FieldError, SchemaError
+from ..utils.index import ActivityIndexes
 from ..utils.querybuilder import XPathQueryBuilder
+from ..utils import compression, export, parallel
+
+
+def _source(dataset, schema):
+    """Describe ``dataset``, so it can be loaded again later.
+    """
+    return (dataset.__class__, dataset.data_path,
+            dataset.metadata_path, schema.version)
 
 
 class Activity(object):
-    """Class representing an IATI activity."""
+    """Class representing an IATI activity.
+
+    Properties are only calculated once, and then remembered.
+    """
 
     def __init__(self, etree, dataset=None, schema=None):
         self.etree = etree
@@ -48,7 +62,7 @@ class Activity(object):
         """Return the raw XML of this activity, as a byte-string."""
         return bytes(ET.tostring(self.etree, pretty_print=True))
 
-    @property
+    @memoized_property
     def iati_identifier(self):
         """Return the iati-identifier for this activity,
         or ``None`` if it isn't provided.
@@ -61,7 +75,7 @@ class Activity(object):
     def validate_iati(self):
         etree = ET.Element('iati-activities')
         etree.set('version', self.version)
-        etree.append(self.etree)
+        etree.append(deepcopy(self.etree))
         xsd_schema = XSDSchema('activity', self.version)
         return xsd_schema.validate(etree)
 
@@ -70,32 +84,32 @@ class Activity(object):
         """Alias of ``iati_identifier``."""
         return self.iati_identifier
 
-    @property
+    @memoized_property
     def title(self):
         """Return a list of titles for this activity."""
         return self.schema.title().run(self.etree)
 
-    @property
+    @memoized_property
     def description(self):
         """Return a list of descriptions for this activity."""
         return self.schema.description().run(self.etree)
 
-    @property
+    @memoized_property
     def location(self):
         """Return a list of locations for this activity."""
         return self.schema.location().run(self.etree)
 
-    @property
+    @memoized_property
     def sector(self):
         """Return a list of sectors for this activity."""
         return self.schema.sector().run(self.etree)
 
-    @property
+    @memoized_property
     def humanitarian(self):
         """Return True if the humanitarian flag is set for this activity."""
         return self.schema.humanitarian().run(self.etree)
 
-    @property
+    @memoized_property
     def planned_start(self):
         """Return the planned start date for this activity,
         as a python ``date``.
@@ -103,7 +117,7 @@ class Activity(object):
         date = self.schema.planned_start().run(self.etree)
         return date[0] if date else None
 
-    @property
+    @memoized_property
     def actual_start(self):
         """Return the actual start date for this activity,
         as a python ``date``.
@@ -111,7 +125,7 @@ class Activity(object):
         date = self.schema.actual_start().run(self.etree)
         return date[0] if date else None
 
-    @property
+    @memoized_property
     def start(self):
         """Return the actual start date for this activity,
         if present. Otherwise, return the planned start.
@@ -121,7 +135,7 @@ class Activity(object):
             return start
         return self.planned_start
 
-    @property
+    @memoized_property
     def planned_end(self):
         """Return the planned end date for this activity,
         as a python ``date``.
@@ -129,7 +143,7 @@ class Activity(object):
         date = self.schema.planned_end().run(self.etree)
         return date[0] if date else None
 
-    @property
+    @memoized_property
     def actual_end(self):
         """Return the actual end date for this activity,
         as a python ``date``.
@@ -137,7 +151,7 @@ class Activity(object):
         date = self.schema.actual_end().run(self.etree)
         return date[0] if date else None
 
-    @property
+    @memoized_property
     def end(self):
         """Return the actual end date for this activity,
         if present. Otherwise, return the planned end.
@@ -154,6 +168,12 @@ class ActivitySet(GenericSet):
     Objects in this grouping can be filtered and iterated over.
     Queries are only constructed and run when needed, so they
     can be efficient.
+
+    If an activity index has been built for the registry containing
+    the datasets (using ``iatikit.index.build()``), filters on
+    ``iati_identifier``, ``sector``, ``humanitarian`` and the activity
+    dates are answered from the index, and only the matching
+    activities are loaded.
     """
 
     _key = 'iati_identifier'
@@ -164,6 +184,12 @@ class ActivitySet(GenericSet):
         'xpath', 'humanitarian',
     ]
     _instance_class = Activity
+    _fields = [
+        'iati_identifier', 'title', 'description', 'location',
+        'sector', 'humanitarian', 'planned_start', 'actual_start',
+        'start', 'planned_end', 'actual_end', 'end',
+    ]
+    _stream = False
     _filetype = 'activity'
     _element = '/iati-activities/iati-activity'
 
@@ -172,44 +198,331 @@ class ActivitySet(GenericSet):
         self.wheres = kwargs
         self.datasets = datasets
 
-    def __len__(self):
-        total = 0
+    def stream(self):
+        """Return a new set, that is counted and iterated over without
+        building a full element tree for each dataset.
+
+        Each dataset is parsed incrementally, and filters are applied
+        to one activity at a time. Activities are detached from the
+        dataset as they are yielded, so peak memory is bounded by
+        the largest single activity, rather than the largest dataset.
+
+        Note that ``xpath`` filters are evaluated against a partially
+        parsed dataset, so should only refer to the activity itself.
+        If a dataset contains invalid XML, the activities before the
+        error are still yielded.
+        """
+        out = deepcopy(self)
+        out._stream = True
+        return out
+
+    def _iterparse(self, dataset, queries):
+        for _, element, schema in self._iterparse_matches(dataset, queries):
+            yield self._instance_class(element, dataset, schema)
+
+    def _iterparse_matches(self, dataset, queries):
+        """Parse ``dataset`` incrementally, yielding a
+        ``(position, element, schema)`` tuple for each matching
+        activity.
+        """
+        _, root_tag, tag = self._element.split('/')
+        handler = compression.open_file(dataset.data_path)
+        context = ET.iterparse(handler, events=('end',), tag=tag,
+                               remove_blank_text=True, huge_tree=True)
+        query = None
+        position = 0
+        try:
+            for _, element in context:
+                root = element.getparent()
+                if root is None or root.getparent() is not None:
+                    continue
+                if root.tag != root_tag:
+                    return
+                if query is None:
+                    try:
+                        schema = get_schema(self._filetype,
+                                            root.get('version', '1.01'))
+                    except SchemaError:
+                        return
+                    if schema not in queries:
+                        queries[schema] = self._query(
+                            schema, prefix='self::' + tag)
+                    query = queries[schema]
+                matched = query(element)
+                # detach the element, so it can be freed
+                # as soon as it is no longer referenced
+                root.remove(element)
+                if matched:
+                    yield position, element, schema
+                position += 1
+        except ET.XMLSyntaxError:
+            logging.getLogger(__name__).warning(
+                'Dataset "%s" XML is invalid', dataset.name)
+        finally:
+            handler.close()
+
+    def values(self, *fields):
+        """Return an iterator over the activities in this set, yielding
+        a dictionary of ``fields`` for each one.
+
+        ``fields`` are ``Activity`` property names, e.g.
+        ``values('iati_identifier', 'start')``. Each underlying query
+        is only run once per activity, even when fields depend on each
+        other (like ``start``, which uses ``actual_start`` and
+        ``planned_start``). If no fields are given, all are included.
+
+        List values (like ``title``) are copies, so changing them
+        doesn't change the activity's own properties.
+        """
+        fields = self._check_fields(fields)
+        return ({field: self._value(activity, field) for field in fields}
+                for activity in self)
+
+    def values_list(self, *fields, flat=False):
+        """Like ``values()``, but yield a tuple for each activity.
+
+        If ``flat=True`` is given along with a single field, the
+        values themselves are yielded instead.
+        """
+        fields = self._check_fields(fields)
+        if flat:
+            if len(fields) != 1:
+                raise FieldError('flat=True requires exactly one field')
+            field = fields[0]
+            return (self._value(activity, field) for activity in self)
+        return (tuple(self._value(activity, field) for field in fields)
+                for activity in self)
+
+    @staticmethod
+    def _value(activity, field):
+        # copy lists, since the activity's properties are memoised
+        value = getattr(activity, field)
+        if isinstance(value, list):
+            return list(value)
+        return value
+
+    def _check_fields(self, fields):
+        if not fields:
+            return self._fields
+        for field in fields:
+            if field not in self._fields:
+                raise FieldError('Unknown field: {}'.format(field))
+        return list(fields)
+
+    def to_arrow(self, fields=None):
+        """Return a ``pyarrow.Table`` of ``fields`` for the activities
+        in this set.
+
+        ``fields`` is a list of ``Activity`` properties, e.g.
+        ``['iati_identifier', 'title', 'sector']``. Activities are
+        converted one dataset at a time. Requires ``pyarrow``.
+        """
+        if fields is None:
+            fields = export.DEFAULT_FIELDS
+        return export.to_arrow(self, fields)
+
+    def to_parquet(self, path, fields=None):
+        """Write ``fields`` for the activities in this set to a
+        Parquet file at ``path``.
+
+        Activities are written one dataset at a time, so the whole
+        set is never held in memory. Requires ``pyarrow``.
+        """
+        if fields is None:
+            fields = export.DEFAULT_FIELDS
+        export.to_parquet(self, path, fields)
+
+    def validate_iati(self):
+        """Validate the activities in this set against the relevant
+        IATI schema, yielding ``(activity, validator)`` pairs.
+
+        Each dataset is validated once as a whole, and the errors are
+        attributed to the activities they occur in. This is much faster
+        than calling ``Activity.validate_iati()`` on each activity.
+        """
+        queries = {}
         for dataset in self.datasets:
             if dataset.filetype != self._filetype:
                 continue
-            if not dataset.validate_xml():
+            results = dataset.validate_iati(per_activity=True)
+            if not results:
                 continue
-            try:
-                schema = get_schema(dataset.filetype, dataset.version)
-            except SchemaError:
+            if not self.wheres:
+                yield from results
                 continue
-            prefix = self._element
-            query = XPathQueryBuilder(
-                schema,
-                prefix=prefix,
-                count=True
-            ).where(**self.wheres)
-            total += int(dataset.etree.xpath(query))
+            schema = results[0][0].schema
+            if schema not in queries:
+                queries[schema] = self._query(schema)
+            # the results hold references to the activity elements,
+            # so the query returns the same element objects
+            matched = set(queries[schema](dataset.etree))
+            for activity, validator in results:
+                if activity.etree in matched:
+                    yield activity, validator
+
+    def __len__(self):
+        if self._workers:
+            return parallel.count(self)
+        queries = {}
+        indexes = ActivityIndexes()
+        total = 0
+        try:
+            for dataset in self.datasets:
+                index = indexes.get(dataset)
+                if index is not None:
+                    count = index.count(dataset, self.wheres)
+                    if count is not None:
+                        total += count
+                        continue
+                if dataset.filetype != self._filetype:
+                    continue
+                if self._stream:
+                    total += sum(1 for _ in self._iterparse(dataset, queries))
+                    continue
+                if not dataset.validate_xml():
+                    continue
+                try:
+                    schema = get_schema(dataset.filetype, dataset.version)
+                except SchemaError:
+                    continue
+                if schema not in queries:
+                    queries[schema] = self._query(schema, count=True)
+                total += int(queries[schema](dataset.etree))
+        finally:
+            indexes.close()
         return total
 
-    def _query(self, schema=None):
+    def _query(self, schema=None, prefix=None, count=False):
         if schema is None:
             schema = get_schema(self._filetype, '2.03')
         return XPathQueryBuilder(
             schema,
-            prefix=self._element,
+            prefix=prefix if prefix is not None else self._element,
+            count=count,
         ).where(**self.wheres)
 
     def __iter__(self):
-        for dataset in self.datasets:
-            if dataset.filetype != self._filetype:
-                continue
-            if not dataset.validate_xml():
-                continue
-            try:
-                schema = get_schema(dataset.filetype, dataset.version)
-            except SchemaError:
-                continue
-            activity_etrees = dataset.etree.xpath(self._query(schema))
-            for tree in activity_etrees:
-                yield self._instance_class(tree, dataset, schema)
+        if self._workers:
+            yield from parallel.iterate(self)
+            return
+        queries = {}
+        indexes = ActivityIndexes()
+        try:
+            for dataset in self.datasets:
+                index = indexes.get(dataset)
+                if index is not None:
+                    indexed = index.activities(dataset, self.wheres)
+                    if indexed is not None:
+                        schema, activity_etrees = indexed
+                        for tree in activity_etrees:
+                            yield self._instance_class(tree, dataset, schema)
+                        continue
+                if dataset.filetype != self._filetype:
+                    continue
+                if self._stream:
+                    yield from self._iterparse(dataset, queries)
+                    continue
+                if not dataset.validate_xml():
+                    continue
+                try:
+                    schema = get_schema(dataset.filetype, dataset.version)
+                except SchemaError:
+                    continue
+                if schema not in queries:
+                    queries[schema] = self._query(schema)
+                activity_etrees = queries[schema](dataset.etree)
+                for tree in activity_etrees:
+                    yield self._instance_class(tree, dataset, schema)
+        finally:
+            indexes.close()
+
+    def _handles(self):
+        """Yield a ``(source, position)`` handle for each activity
+        in this set, for use in a ``ResultSet``.
+        """
+        if self._workers:
+            yield from parallel.handles(self)
+            return
+        queries = {}
+        indexes = ActivityIndexes()
+        try:
+            for dataset in self.datasets:
+                index = indexes.get(dataset)
+                if index is not None:
+                    indexed = index.positions(dataset, self.wheres)
+                    if indexed is not None:
+                        schema, positions = indexed
+                        source = _source(dataset, schema)
+                        for position in positions:
+                            yield source, position
+                        continue
+                if dataset.filetype != self._filetype:
+                    continue
+                if self._stream:
+                    source = None
+                    for position, _, schema in self._iterparse_matches(
+                            dataset, queries):
+                        if source is None:
+                            source = _source(dataset, schema)
+                        yield source, position
+                    continue
+                if not dataset.validate_xml():
+                    continue
+                try:
+                    schema = get_schema(dataset.filetype, dataset.version)
+                except SchemaError:
+                    continue
+                if schema not in queries:
+                    queries[schema] = self._query(schema)
+                activity_etrees = queries[schema](dataset.etree)
+                if not activity_etrees:
+                    continue
+                positions = {tree: position for position, tree in
+                             enumerate(dataset.etree.xpath(self._element))}
+                source = _source(dataset, schema)
+                for tree in activity_etrees:
+                    yield source, positions[tree]
+        finally:
+            indexes.close()
+
+    def _load(self, source, positions):
+        """Load the activities at ``positions`` in the dataset
+        described by ``source``.
+        """
+        dataset_class, data_path, metadata_path, version = source
+        dataset = dataset_class(data_path, metadata_path)
+        schema = get_schema(self._filetype, version)
+        indexes = ActivityIndexes()
+        try:
+            index = indexes.get(dataset)
+            activity_etrees = None
+            if index is not None:
+                activity_etrees = index.load(dataset, positions)
+        finally:
+            indexes.close()
+        if activity_etrees is None:
+            if self._stream:
+                wanted = set(positions)
+                matches = {position: tree for position, tree, _ in
+                           self._iterparse_matches(dataset, {})
+                           if position in wanted}
+            else:
+                matches = dataset.etree.xpath(self._element)
+            activity_etrees = [matches[x] for x in positions]
+        return [self._instance_class(tree, dataset, schema)
+                for tree in activity_etrees]
+
+    def evaluate(self):
+        """Run the query, and return a ``ResultSet`` of the results.
+
+        Only the position of each matching activity is kept, so the
+        results don't keep their datasets' XML in memory. Activities
+        are loaded again whenever they are accessed, using the
+        activity index if there is one, or the cache of parsed
+        datasets if not.
+        """
+        loader = copy(self)
+        loader.datasets = None
+        loader._workers = None
+        return ResultSet(self._handles(), self._key,
+                         self._instance_class, loader._load)
@@ -1,20 +1,36 @@
+from bisect import bisect_right
 from os.path import basename, exists, splitext
 from glob import glob
 import json
 import logging
+import re
 import webbrowser
 
 from lxml import etree as ET
 
-from ..utils.abstract import GenericSet
-from ..utils.exceptions import SchemaNotFoundError, MappingsNotFoundError
+from ..utils.abstract import GenericSet, compile_xpath
+from ..utils import compression
+from ..utils.cache import tree_cache
+from ..utils.exceptions import SchemaError, SchemaNotFoundError, \
+                              MappingsNotFoundError
 from ..utils.validator import Validator, ValidationError
-from ..standard.xsd_schema import XSDSchema
+from ..standard.schema import get_schema
+from ..standard.xsd_schema import XSDSchema, XSDValidator
 from ..standard.codelist_mappings import CodelistMappings
-from .activity import ActivitySet
+from .activity import Activity, ActivitySet
 from .organisation import OrganisationSet
 
 
+_ACTIVITY_PATH_RE = re.compile(
+    r'^/iati-activities/iati-activity(?:\[(\d+)\])?(?:/|$)')
+
+
+def _parse(path):
+    parser = ET.XMLParser(remove_blank_text=True, huge_tree=True)
+    with compression.open_file(path) as handler:
+        return ET.parse(handler, parser)
+
+
 class Dataset(object):
     """Class representing an IATI dataset."""
 
@@ -23,10 +39,15 @@ class Dataset(object):
 
         The file locations of the data and metadata must be specified with
         the ``data_path`` and ``metadata_path`` arguments.
+
+        Data files compressed with gzip (``.xml.gz``) or zstandard
+        (``.xml.zst``) are decompressed transparently.
         """
         self.data_path = data_path
         self.metadata_path = metadata_path
         self._etree = None
+        self._root = None
+        self._filetype = None
         self._metadata = None
         self._schema = None
 
@@ -34,7 +55,7 @@ class Dataset(object):
     def name(self):
         """Return the name of this dataset, derived from the filename."""
         if isinstance(self.data_path, str):
-            return splitext(basename(self.data_path))[0]
+            return compression.name(self.data_path)
         elif isinstance(self.metadata_path, str):
             return splitext(basename(self.metadata_path))[0]
         else:
@@ -42,13 +63,17 @@ class Dataset(object):
 
     @property
     def etree(self):
-        """Return the XML of this dataset, as an lxml element tree."""
+        """Return the XML of this dataset, as an lxml element tree.
+
+        Parsed trees are shared between ``Dataset`` objects for the
+        same (unchanged) file, via a size-limited cache. So the tree
+        should be treated as read-only.
+        """
         if not self._etree:
             if not self.data_path:
                 raise IOError('XML file not found')
             try:
-                parser = ET.XMLParser(remove_blank_text=True, huge_tree=True)
-                self._etree = ET.parse(self.data_path, parser)
+                self._etree = tree_cache.get(self.data_path, _parse)
             except ET.XMLSyntaxError:
                 logging.getLogger(__name__).warning(
                     'Dataset "%s" XML is invalid', self.name)
@@ -68,7 +93,7 @@ class Dataset(object):
         if self.data_path is None:
             raise FileNotFoundError
 
-        with open(self.data_path, 'rb') as handler:
+        with compression.open_file(self.data_path) as handler:
             return handler.read()
 
     def __repr__(self):
@@ -112,18 +137,75 @@ class Dataset(object):
             return Validator(False, [ValidationError(str(error))])
         return Validator(True)
 
-    def validate_iati(self):
-        """Validate dataset against the relevant IATI schema."""
+    def validate_iati(self, per_activity=False):
+        """Validate dataset against the relevant IATI schema.
+
+        If ``per_activity`` is ``True``, the dataset is still validated
+        in a single pass, but a list of ``(activity, validator)`` pairs
+        is returned, with each schema error attributed to the activity
+        it occurs in. Errors outside of any activity are dropped.
+        """
         xml_valid = self.validate_xml()
         if not xml_valid:
+            if per_activity:
+                return []
             msg = 'Can\'t perform IATI schema validation for ' + \
                   'invalid XML.'
             return Validator(False, [ValidationError(msg)])
         try:
-            return self._get_schema().validate(self.etree)
+            validator = self._get_schema().validate(self.etree)
         except SchemaNotFoundError as error:
             logging.getLogger(__name__).warning(str(error))
-            return Validator(False, [ValidationError(str(error))])
+            validator = Validator(False, [ValidationError(str(error))])
+            if per_activity:
+                try:
+                    activities = self._activities()
+                except SchemaError:
+                    # no activities can be read from an unknown version
+                    return []
+                return [(x, validator) for x in activities]
+            return validator
+        if per_activity:
+            return self._split_by_activity(validator)
+        return validator
+
+    def _activities(self):
+        """Return a list of all the activities in this dataset,
+        in document order.
+        """
+        if self.filetype != 'activity':
+            return []
+        schema = get_schema(self.filetype, self.version)
+        return [Activity(x, self, schema)
+                for x in self.etree.getroot().iterchildren('iati-activity')]
+
+    def _split_by_activity(self, validator):
+        """Split the errors from a dataset ``validator`` into
+        a validator per activity.
+
+        Errors are matched to activities using their path, or their
+        line number if there's no path.
+        """
+        activities = self._activities()
+        sourcelines = [x.etree.sourceline or 0 for x in activities]
+        errors = [[] for _ in activities]
+        for error in validator._errors:
+            if error.path:
+                match = _ACTIVITY_PATH_RE.match(error.path)
+                if not match:
+                    continue
+                idx = int(match.group(1) or 1) - 1
+            elif error.line is None:
+                continue
+            else:
+                idx = bisect_right(sourcelines, error.line) - 1
+            if 0 <= idx < len(activities):
+                errors[idx].append(error)
+        return [(activity, XSDValidator(not activity_errors,
+                                        activity_errors,
+                                        validator.filetype,
+                                        validator.version))
+                for activity, activity_errors in zip(activities, errors)]
 
     def validate_codelists(self):
         """Validate dataset against the relevant IATI codelists."""
@@ -167,6 +249,9 @@ class Dataset(object):
 
         Returns None if the filetype can't be determined.
         """
+        if self._filetype is not None:
+            return self._filetype
+
         try:
             filetype = self.metadata['extras']['filetype']
             if filetype in ['activity', 'organisation']:
@@ -182,11 +267,30 @@ class Dataset(object):
         except KeyError:
             pass
 
+    def _sniff_root(self):
+        """Return the tag and ``@version`` of the XML root node.
+
+        If the XML hasn't already been parsed, only the start of the
+        file is read.
+        """
+        if self._root is None:
+            if self._etree:
+                root = self._etree.getroot()
+            else:
+                if not self.data_path:
+                    raise IOError('XML file not found')
+                with compression.open_file(self.data_path) as handler:
+                    context = ET.iterparse(handler, events=('start',),
+                                           huge_tree=True)
+                    _, root = next(context)
+            self._root = (root.tag, root.get('version'))
+        return self._root
+
     @property
     def root(self):
         """Return the name of the XML root node."""
         try:
-            return self.etree.getroot().tag
+            return self._sniff_root()[0]
         except ET.XMLSyntaxError:
             pass
 
@@ -196,7 +300,7 @@ class Dataset(object):
 
         Return "1.01" if the version can't be determined.
         """
-        version = self.etree.getroot().get('version')
+        version = self._sniff_root()[1]
         if version is not None:
             return version
 
@@ -229,21 +333,22 @@ class DatasetSet(GenericSet):
     _multi_filters = ['xpath']
     _instance_class = Dataset
 
-    def __init__(self, data_path, metadata_path, **kwargs):
+    def __init__(self, data_path, metadata_path, manifest=None, **kwargs):
         super(DatasetSet, self).__init__(**kwargs)
         self.data_path = data_path
         self.metadata_path = metadata_path
+        self.manifest = manifest
 
     def __iter__(self):
+        glob_ = self.manifest.glob if self.manifest else glob
         data_paths = {
-            splitext(basename(x))[0]: x
-            for x in glob(self.data_path)
+            compression.name(x): x
+            for x in glob_(self.data_path)
         } if self.data_path else {}
         metadata_paths = {
             splitext(basename(x))[0]: x
-            for x in glob(self.metadata_path)
+            for x in glob_(self.metadata_path)
         } if self.metadata_path else {}
-
         paths = {x: (data_paths.get(x), metadata_paths.get(x))
                  for x in set(list(data_paths.keys()) +
                               list(metadata_paths.keys()))}
@@ -259,6 +364,8 @@ class DatasetSet(GenericSet):
 
         for data_path, metadata_path in paths:
             dataset = Dataset(data_path, metadata_path)
+            if self.manifest:
+                self.manifest.apply(dataset)
             if where_filetype is not None and \
                     dataset.filetype != where_filetype:
                 continue
@@ -266,9 +373,11 @@ class DatasetSet(GenericSet):
                 if not dataset.validate_xml():
                     continue
                 for where_xpath in where_xpaths:
-                    if dataset.etree.xpath(where_xpath) == []:
+                    if compile_xpath(where_xpath)(dataset.etree) == []:
                         break
                 else:
                     yield dataset
                 continue
             yield dataset
+        if self.manifest:
+            self.manifest.save(ignore_errors=True)
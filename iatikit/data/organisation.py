@@ -1,3 +1,4 @@
+from copy import copy, deepcopy
 import webbrowser
 try:
     from urllib.parse import urlencode
@@ -8,13 +9,17 @@ from lxml import etree as ET
 
 from ..standard.schema import get_schema
 from ..standard.xsd_schema import XSDSchema
-from ..utils.abstract import GenericSet
+from ..utils.abstract import GenericSet, ResultSet, memoized_property
 from ..utils.exceptions import SchemaError
 from ..utils.querybuilder import XPathQueryBuilder
+from ..utils import parallel
 
 
 class Organisation(object):
-    """Class representing an IATI organisation."""
+    """Class representing an IATI organisation.
+
+    Properties are only calculated once, and then remembered.
+    """
 
     def __init__(self, etree, dataset=None, schema=None):
         self.etree = etree
@@ -45,7 +50,7 @@ class Organisation(object):
         """Return the raw XML of this organisation, as a byte-string."""
         return bytes(ET.tostring(self.etree, pretty_print=True))
 
-    @property
+    @memoized_property
     def org_identifier(self):
         """Return the org-identifier for this organisation,
         or ``None`` if it isn't provided.
@@ -58,7 +63,7 @@ class Organisation(object):
     def validate_iati(self):
         etree = ET.Element('iati-organisations')
         etree.set('version', self.version)
-        etree.append(self.etree)
+        etree.append(deepcopy(self.etree))
         xsd_schema = XSDSchema('organisation', self.version)
         return xsd_schema.validate(etree)
 
@@ -90,6 +95,9 @@ class OrganisationSet(GenericSet):
         self.datasets = datasets
 
     def __len__(self):
+        if self._workers:
+            return parallel.count(self)
+        queries = {}
         total = 0
         for dataset in self.datasets:
             if dataset.filetype != self._filetype:
@@ -100,24 +108,25 @@ class OrganisationSet(GenericSet):
                 schema = get_schema(dataset.filetype, dataset.version)
             except SchemaError:
                 continue
-            prefix = self._element
-            query = XPathQueryBuilder(
-                schema,
-                prefix=prefix,
-                count=True
-            ).where(**self.wheres)
-            total += int(dataset.etree.xpath(query))
+            if schema not in queries:
+                queries[schema] = self._query(schema, count=True)
+            total += int(queries[schema](dataset.etree))
         return total
 
-    def _query(self, schema=None):
+    def _query(self, schema=None, prefix=None, count=False):
         if schema is None:
             schema = get_schema(self._filetype, '2.03')
         return XPathQueryBuilder(
             schema,
-            prefix=self._element,
+            prefix=prefix if prefix is not None else self._element,
+            count=count,
         ).where(**self.wheres)
 
     def __iter__(self):
+        if self._workers:
+            yield from parallel.iterate(self)
+            return
+        queries = {}
         for dataset in self.datasets:
             if dataset.filetype != self._filetype:
                 continue
@@ -127,6 +136,62 @@ class OrganisationSet(GenericSet):
                 schema = get_schema(dataset.filetype, dataset.version)
             except SchemaError:
                 continue
-            organisation_etrees = dataset.etree.xpath(self._query(schema))
+            if schema not in queries:
+                queries[schema] = self._query(schema)
+            organisation_etrees = queries[schema](dataset.etree)
             for tree in organisation_etrees:
                 yield self._instance_class(tree, dataset, schema)
+
+    def _handles(self):
+        """Yield a ``(source, position)`` handle for each organisation
+        in this set, for use in a ``ResultSet``.
+        """
+        if self._workers:
+            yield from parallel.handles(self)
+            return
+        queries = {}
+        for dataset in self.datasets:
+            if dataset.filetype != self._filetype:
+                continue
+            if not dataset.validate_xml():
+                continue
+            try:
+                schema = get_schema(dataset.filetype, dataset.version)
+            except SchemaError:
+                continue
+            if schema not in queries:
+                queries[schema] = self._query(schema)
+            organisation_etrees = queries[schema](dataset.etree)
+            if not organisation_etrees:
+                continue
+            positions = {tree: position for position, tree in
+                         enumerate(dataset.etree.xpath(self._element))}
+            source = (dataset.__class__, dataset.data_path,
+                      dataset.metadata_path, schema.version)
+            for tree in organisation_etrees:
+                yield source, positions[tree]
+
+    def _load(self, source, positions):
+        """Load the organisations at ``positions`` in the dataset
+        described by ``source``.
+        """
+        dataset_class, data_path, metadata_path, version = source
+        dataset = dataset_class(data_path, metadata_path)
+        schema = get_schema(self._filetype, version)
+        organisation_etrees = dataset.etree.xpath(self._element)
+        return [self._instance_class(organisation_etrees[x], dataset, schema)
+                for x in positions]
+
+    def evaluate(self):
+        """Run the query, and return a ``ResultSet`` of the results.
+
+        Only the position of each matching organisation is kept, so
+        the results don't keep their datasets' XML in memory.
+        Organisations are loaded again (from the cache of parsed
+        datasets) whenever they are accessed.
+        """
+        loader = copy(self)
+        loader.datasets = None
+        loader._workers = None
+        return ResultSet(self._handles(), self._key,
+                         self._instance_class, loader._load)
@@ -13,10 +13,12 @@ from .organisation import OrganisationSet
 class Publisher(object):
     """Class representing an IATI publisher."""
 
-    def __init__(self, data_path, metadata_path, metadata_filepath):
+    def __init__(self, data_path, metadata_path, metadata_filepath,
+                 manifest=None):
         self.data_path = data_path
         self.metadata_path = metadata_path
         self.metadata_filepath = metadata_filepath
+        self.manifest = manifest
         self._metadata = None
 
     @property
@@ -54,7 +56,7 @@ class Publisher(object):
             if self.data_path else None
         metadata_path = join(self.metadata_path, '*') \
             if self.metadata_path else None
-        return DatasetSet(data_path, metadata_path)
+        return DatasetSet(data_path, metadata_path, manifest=self.manifest)
 
     @property
     def activities(self):
@@ -92,20 +94,22 @@ class PublisherSet(GenericSet):
     _key = 'name'
     _instance_class = Publisher
 
-    def __init__(self, data_path, metadata_path, **kwargs):
+    def __init__(self, data_path, metadata_path, manifest=None, **kwargs):
         super(PublisherSet, self).__init__(**kwargs)
         self.data_path = data_path
         self.metadata_path = metadata_path
+        self.manifest = manifest
 
     def __iter__(self):
+        glob_ = self.manifest.glob if self.manifest else glob
         data_paths = {basename(x): x
-                      for x in glob(self.data_path)
+                      for x in glob_(self.data_path)
                       if not x.endswith('.json')}
         metadata_paths = {basename(x): x
-                          for x in glob(self.metadata_path)
+                          for x in glob_(self.metadata_path)
                           if not x.endswith('.json')}
         metadata_filepaths = {splitext(basename(x))[0]: x
-                              for x in glob(self.metadata_path + '.json')}
+                              for x in glob_(self.metadata_path + '.json')}
         paths = {x: (data_paths.get(x),
                      metadata_paths.get(x),
                      metadata_filepaths.get(x))
@@ -120,4 +124,5 @@ class PublisherSet(GenericSet):
             paths = sorted(list(paths.values()), key=lambda x: x[1])
 
         for data_path, metadata_path, metadata_filepath in paths:
-            yield Publisher(data_path, metadata_path, metadata_filepath)
+            yield Publisher(data_path, metadata_path, metadata_filepath,
+                            manifest=self.manifest)
@@ -9,6 +9,7 @@ from .activity import ActivitySet
 from .organisation import OrganisationSet
 from ..utils.exceptions import NoDataError
 from ..utils.config import CONFIG
+from ..utils.manifest import get_manifest
 
 
 class Registry(object):
@@ -58,7 +59,8 @@ class Registry(object):
         """Return an iterator of all publishers on the registry."""
         data_path = join(self.path, 'data', '*')
         metadata_path = join(self.path, 'metadata', '*')
-        return PublisherSet(data_path, metadata_path)
+        return PublisherSet(data_path, metadata_path,
+                            manifest=get_manifest(self.path))
 
     @property
     def datasets(self):
@@ -66,7 +68,8 @@ class Registry(object):
         publisher_set = self.publishers
         data_path = join(publisher_set.data_path, '*')
         metadata_path = join(publisher_set.metadata_path, '*')
-        return DatasetSet(data_path, metadata_path)
+        return DatasetSet(data_path, metadata_path,
+                          manifest=publisher_set.manifest)
 
     @property
     def activities(self):
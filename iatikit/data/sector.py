@@ -1,9 +1,25 @@
-from ..standard.codelist import CodelistSet, CodelistItem
+from ..standard.codelist import CodelistSet, CodelistItem, get_store, \
+                               _restore
 from ..utils.exceptions import UnknownSectorVocabError, \
                                UnknownSectorCodeError, InvalidSectorCodeError
 
 
+# the codelist files used to resolve sectors
+_SECTOR_CODELISTS = [
+    'Sector.json', 'SectorCategory.json',
+    'SectorVocabulary.json', 'Vocabulary.json',
+]
+
+
 class Sector(object):
+    """Class representing a sector.
+
+    Sectors are immutable and hashable, so they can be used in sets
+    and as dictionary keys.
+    """
+
+    __slots__ = ('code', 'vocabulary', 'percentage')
+
     def __init__(self, code, vocabulary=None, percentage=None):
         codelists = CodelistSet()
         vocab_lookup = {
@@ -34,34 +50,69 @@ class Sector(object):
             return vocab_item
 
         if percentage is not None:
-            self.percentage = float(percentage)
-        else:
-            self.percentage = None
+            percentage = float(percentage)
 
         if isinstance(code, CodelistItem):
             if code.codelist.slug == 'Sector':
-                self.vocabulary = codelists.get(
+                vocab_item = codelists.get(
                     'SectorVocabulary').get('1')
             elif code.codelist.slug == 'SectorCategory':
-                self.vocabulary = codelists.get(
+                vocab_item = codelists.get(
                     'SectorVocabulary').get('2')
             else:
                 raise InvalidSectorCodeError(
                     'Not a sector code: {}'.format(code))
-            self.code = code
         elif vocabulary:
-            self.vocabulary = get_vocabulary(vocabulary)
+            vocab_item = get_vocabulary(vocabulary)
 
-            vocab_codelist_name = vocab_lookup.get(self.vocabulary.code)
+            vocab_codelist_name = vocab_lookup.get(vocab_item.code)
             if vocab_codelist_name:
-                self.code = codelists.get(vocab_codelist_name).get(code)
-                if self.code is None:
+                code = codelists.get(vocab_codelist_name).get(code)
+                if code is None:
                     raise UnknownSectorCodeError()
             else:
-                self.code = str(code)
+                code = str(code)
         else:
-            self.code = str(code)
-            self.vocabulary = None
+            code = str(code)
+            vocab_item = None
+        self._set(code, vocab_item, percentage)
+
+    def _set(self, code, vocabulary, percentage):
+        object.__setattr__(self, 'code', code)
+        object.__setattr__(self, 'vocabulary', vocabulary)
+        object.__setattr__(self, 'percentage', percentage)
+
+    @classmethod
+    def from_elements(cls, elements, default_vocabulary='1'):
+        """Return a list of sectors, one for each ``<sector>`` element
+        in ``elements``.
+
+        Each distinct vocabulary, code and percentage is only resolved
+        once, and the same ``Sector`` object is returned each time it
+        occurs, until the codelists change.
+        """
+        table = get_store().derived('sectors', _SECTOR_CODELISTS, dict)
+        sectors = []
+        for element in elements:
+            key = (element.get('vocabulary', default_vocabulary),
+                   element.get('code'),
+                   element.get('percentage'))
+            sector = table.get(key)
+            if sector is None:
+                vocabulary, code, percentage = key
+                unpercentaged = table.get((vocabulary, code, None))
+                if unpercentaged is None:
+                    unpercentaged = cls(code, vocabulary=vocabulary)
+                    table[(vocabulary, code, None)] = unpercentaged
+                sector = unpercentaged
+                if percentage is not None:
+                    sector = cls.__new__(cls)
+                    sector._set(unpercentaged.code,
+                                unpercentaged.vocabulary,
+                                float(percentage))
+                table[key] = sector
+            sectors.append(sector)
+        return sectors
 
     def __repr__(self):
         if isinstance(self.code, CodelistItem):
@@ -88,3 +139,27 @@ class Sector(object):
 
     def __ne__(self, value):
         return not self.__eq__(value)
+
+    def __hash__(self):
+        # sectors without a code or vocabulary compare equal to
+        # sectors with any code or vocabulary, so only the
+        # percentage can be hashed
+        return hash(self.percentage)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{} objects are immutable'.format(
+            self.__class__.__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError('{} objects are immutable'.format(
+            self.__class__.__name__))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (_restore, (self.__class__, {
+            x: getattr(self, x) for x in self.__slots__}))
@@ -1,19 +1,181 @@
+from copy import copy, deepcopy
 import json
-from os.path import exists, join
+from os import stat
+from os.path import abspath, dirname, exists, join
+from threading import Lock
+from time import monotonic
 
 from ..utils.abstract import GenericSet
 from ..utils.exceptions import NoCodelistsError
 from ..utils.config import CONFIG
 
 
+_STORES = {}
+
+# stores for each standard path, as it appears in the config
+# (relative paths are resolved when they're first used)
+_CONFIG_STORES = {}
+
+# codelist files are checked for changes at most this often (in seconds)
+_CHECK_INTERVAL = 1.0
+
+
+class CodelistStore(object):
+    """A shared store of the codelists in a directory.
+
+    Codelist files are loaded lazily, and only reloaded when they
+    change. Files are checked for changes at most once a second, or
+    straight away after ``refresh()``. The loaded data is shared by
+    every ``Codelist`` and ``CodelistSet``, so should be treated as
+    read-only.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._files = {}
+        self._derived = {}
+        self._codelists = {}
+        self._stamps = {}
+        self._lock = Lock()
+
+    def __repr__(self):
+        return '<{} ({})>'.format(self.__class__.__name__, self.path)
+
+    def _stamp(self, filename):
+        now = monotonic()
+        checked = self._stamps.get(filename)
+        if checked is not None and now - checked[0] < _CHECK_INTERVAL:
+            return checked[1]
+        stats = stat(join(self.path, filename))
+        stamp = (stats.st_mtime, stats.st_size)
+        self._stamps[filename] = (now, stamp)
+        return stamp
+
+    def refresh(self):
+        """Check the codelist files for changes on next use."""
+        self._stamps = {}
+
+    def load(self, filename):
+        """Return the parsed contents of the JSON file ``filename``."""
+        stamp = self._stamp(filename)
+        cached = self._files.get(filename)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        with open(join(self.path, filename)) as handler:
+            data = json.load(handler)
+        with self._lock:
+            self._files[filename] = (stamp, data)
+        return data
+
+    def derived(self, key, filenames, build):
+        """Return a value calculated by ``build()`` from the codelists
+        in ``filenames``.
+
+        The value is cached under ``key``, until any of those
+        codelist files change.
+        """
+        stamp = tuple(self._stamp(x) for x in filenames)
+        cached = self._derived.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        value = build()
+        with self._lock:
+            self._derived[key] = (stamp, value)
+        return value
+
+    def index(self, codelist, version):
+        """Return the index of ``codelist`` for ``version``."""
+        if codelist.wheres or codelist.version != version:
+            # items should refer to the unfiltered codelist
+            # for their own version
+            codelist = copy(codelist)
+            codelist.wheres = {}
+            codelist.version = version
+        return self.derived(('index', codelist.slug, version),
+                            [codelist.slug + '.json'],
+                            lambda: codelist._build_index(version))
+
+    def codelist(self, slug, version):
+        """Return the shared ``Codelist`` for ``slug`` and ``version``,
+        or ``None`` if it doesn't exist.
+        """
+        codelist_versions = self.load('codelists.json').get(slug)
+        if codelist_versions is None:
+            return None
+        if version is not None and version not in codelist_versions:
+            return None
+        codelist = self._codelists.get((slug, version))
+        if codelist is None:
+            codelist = Codelist(slug, version)
+            with self._lock:
+                codelist = self._codelists.setdefault(
+                    (slug, version), codelist)
+        return codelist
+
+
+def get_store(path=None):
+    """Return the shared codelist store for the standard at ``path``."""
+    if path is None:
+        # the raw value is much quicker to look up, and is only
+        # used as a key if it doesn't need interpolating
+        raw_path = CONFIG.get('paths', 'standard', raw=True)
+        store = _CONFIG_STORES.get(raw_path)
+        if store is not None:
+            return store
+        path = CONFIG['paths']['standard']
+        if path == raw_path:
+            store = _CONFIG_STORES[raw_path] = get_store(path)
+            return store
+    path = abspath(join(path, 'codelists'))
+    store = _STORES.get(path)
+    if store is None:
+        store = _STORES.setdefault(path, CodelistStore(path))
+    return store
+
+
+def _restore(cls, attrs):
+    obj = cls.__new__(cls)
+    for name, value in attrs.items():
+        object.__setattr__(obj, name, value)
+    return obj
+
+
 class CodelistItem(object):
+    """Class representing an item in a codelist.
+
+    Codelist items are immutable and hashable. Items are shared by
+    every copy of a codelist, so there is only one object per code
+    for each codelist version.
+    """
+
+    __slots__ = ('category', 'status', 'code', 'name', 'description',
+                 'codelist')
+
     def __init__(self, codelist, **kwargs):
-        self.category = kwargs.get('category')
-        self.status = kwargs.get('status', 'active')
-        self.code = kwargs.get('code')
-        self.name = kwargs.get('name')
-        self.description = kwargs.get('description')
-        self.codelist = codelist
+        object.__setattr__(self, 'category', kwargs.get('category'))
+        object.__setattr__(self, 'status', kwargs.get('status', 'active'))
+        object.__setattr__(self, 'code', kwargs.get('code'))
+        object.__setattr__(self, 'name', kwargs.get('name'))
+        object.__setattr__(self, 'description', kwargs.get('description'))
+        object.__setattr__(self, 'codelist', codelist)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{} objects are immutable'.format(
+            self.__class__.__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError('{} objects are immutable'.format(
+            self.__class__.__name__))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (_restore, (self.__class__, {
+            x: getattr(self, x) for x in self.__slots__}))
 
     def __repr__(self):
         return '<{} ({} ({}))>'.format(
@@ -31,6 +193,10 @@ class CodelistItem(object):
     def __ne__(self, value):
         return not self.__eq__(value)
 
+    def __hash__(self):
+        # consistent with comparing equal to the code as a string
+        return hash(self.code)
+
 
 class Codelist(GenericSet):
     _key = 'code'
@@ -44,14 +210,27 @@ class Codelist(GenericSet):
         self.path = join(CONFIG['paths']['standard'],
                          'codelists', slug + '.json')
         self.version = version
-        self.__data = None
+        self._store = get_store()
+
+    def __deepcopy__(self, memo):
+        # copies share the codelist store
+        out = self.__class__.__new__(self.__class__)
+        out.__dict__.update(self.__dict__)
+        out.wheres = deepcopy(self.wheres, memo)
+        return out
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_store', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._store = get_store(dirname(dirname(self.path)))
 
     @property
     def _data(self):
-        if not self.__data:
-            with open(self.path) as handler:
-                self.__data = json.load(handler)
-        return self.__data
+        return self._store.load(self.slug + '.json')
 
     @property
     def data(self):
@@ -65,24 +244,12 @@ class Codelist(GenericSet):
     def metadata(self):
         return self._data['metadata']
 
-    def __iter__(self):
-        code = self.wheres.get('code')
-        name = self.wheres.get('name')
-        category = self.wheres.get('category')
-        version = self.wheres.get('version', self.version)
-        if version is not None:
-            version = str(version)
-        if code is not None:
-            code = str(code)
-        if category is not None:
-            category = str(category)
+    def _build_index(self, version):
+        """Return the items for ``version``, along with lookups
+        of those items by code, name and category.
+        """
+        items = []
         for data in self.data.values():
-            if code is not None and data['code'] != code:
-                continue
-            if name is not None and data['name'] != name:
-                continue
-            if category is not None and data['category'] != category:
-                continue
             if version is not None:
                 version_from = data.get('from')
                 version_until = data.get('until')
@@ -90,7 +257,50 @@ class Codelist(GenericSet):
                         (version < version_from or
                          version > version_until):
                     continue
-            yield CodelistItem(self, **data)
+            items.append(CodelistItem(self, **data))
+        index = {'items': items}
+        for key in ['code', 'name', 'category']:
+            lookup = {}
+            for item in items:
+                lookup.setdefault(getattr(item, key), []).append(item)
+            index[key] = lookup
+        return index
+
+    def _filter(self, wheres):
+        version = wheres.get('version', self.version)
+        if version is not None:
+            version = str(version)
+        filters = []
+        for key in ['code', 'name', 'category']:
+            value = wheres.get(key)
+            if value is None:
+                continue
+            if key != 'name':
+                value = str(value)
+            filters.append((key, value))
+        index = self._store.index(self, version)
+        if not filters:
+            return index['items']
+        key, value = filters[0]
+        return [item for item in index[key].get(value, [])
+                if all(getattr(item, k) == v for k, v in filters[1:])]
+
+    def __iter__(self):
+        return iter(self._filter(self.wheres))
+
+    def find(self, **kwargs):
+        """Return the first matching item from the set, according to the
+        filters provided in ``kwargs``.
+
+        If no matching item is found, an ``IndexError`` is raised.
+        """
+        if any(k not in self._filters or k in self.wheres for k in kwargs):
+            # let ``where`` raise the appropriate error
+            return super(Codelist, self).find(**kwargs)
+        items = self._filter(dict(self.wheres, **kwargs))
+        if not items:
+            raise IndexError('index out of range')
+        return items[0]
 
     def __repr__(self):
         if self.version:
@@ -131,22 +341,54 @@ class CodelistSet(GenericSet):
                           'using:\n\n   ' + \
                           '>>> iatikit.download.codelists()\n'
             raise NoCodelistsError(error_msg)
+        self._store = get_store()
 
-    def __iter__(self):
-        version = self.wheres.get('version')
+    def __deepcopy__(self, memo):
+        # copies share the codelist store
+        out = self.__class__.__new__(self.__class__)
+        out.__dict__.update(self.__dict__)
+        out.wheres = deepcopy(self.wheres, memo)
+        return out
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_store', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._store = get_store(dirname(self.path))
+
+    def _filter(self, wheres):
+        version = wheres.get('version')
         if version:
             version = str(version)
-        slug = self.wheres.get('slug')
-        with open(join(self.path, 'codelists.json')) as handler:
-            all_codelists = json.load(handler)
-        for codelist_slug, codelist_versions in all_codelists.items():
-            if version is not None and version not in codelist_versions:
-                continue
+        else:
+            version = None
+        slug = wheres.get('slug')
+        if slug is not None:
+            slugs = [slug]
+        else:
+            slugs = self._store.load('codelists.json').keys()
+        codelists = [self._store.codelist(x, version) for x in slugs]
+        return [x for x in codelists if x is not None]
 
-            if slug is not None and slug != codelist_slug:
-                continue
+    def __iter__(self):
+        return iter(self._filter(self.wheres))
+
+    def find(self, **kwargs):
+        """Return the first matching item from the set, according to the
+        filters provided in ``kwargs``.
 
-            yield Codelist(codelist_slug, version)
+        If no matching item is found, an ``IndexError`` is raised.
+        """
+        if any(k not in self._filters or k in self.wheres for k in kwargs):
+            # let ``where`` raise the appropriate error
+            return super(CodelistSet, self).find(**kwargs)
+        codelists = self._filter(dict(self.wheres, **kwargs))
+        if not codelists:
+            raise IndexError('index out of range')
+        return codelists[0]
 
 
 def codelists():
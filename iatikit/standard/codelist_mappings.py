@@ -1,12 +1,25 @@
+from collections import namedtuple
 import json
+from os import stat
 from os.path import exists, join
+from threading import Lock
 
+from ..utils.abstract import compile_xpath
 from ..utils.exceptions import MappingsNotFoundError
 from ..utils.validator import Validator, ValidationError
 from ..utils.config import CONFIG
 from .codelist import CodelistSet
 
 
+# a compiled XPath for a mapping, along with its codelist
+# and the set of codes in that codelist
+_Rule = namedtuple('_Rule', ['xpath', 'codelist', 'codes'])
+
+# compiled rules, keyed by mappings path and modification times
+_COMPILED_RULES = {}
+_COMPILED_RULES_LOCK = Lock()
+
+
 class CodelistValidationError(ValidationError):
     def __init__(self, msg, line, path, codelist, version):
         super(CodelistValidationError, self).__init__(msg, line, None, path)
@@ -49,8 +62,8 @@ class CodelistMappings(object):
         return '<{} ({} {})>'.format(self.__class__.__name__,
                                      self.filetype, self.version)
 
-    def validate(self, dataset):
-        codelists = CodelistSet(version=dataset.version)
+    def _compile(self):
+        codelists = CodelistSet(version=self.version)
 
         def parse_mapping(mapping):
             condition = mapping.get('condition')
@@ -68,6 +81,38 @@ class CodelistMappings(object):
         with open(self.mappings_path) as handler:
             mappings = json.load(handler)
 
+        rules = []
+        for mapping in mappings:
+            xpath_query, codelist = parse_mapping(mapping)
+            if codelist is None or not codelist.complete:
+                continue
+            codes = frozenset(item.code for item in codelist)
+            rules.append(_Rule(compile_xpath(xpath_query), codelist, codes))
+        return rules
+
+    @property
+    def rules(self):
+        """Return the compiled rules for these mappings.
+
+        Rules are shared across the process, and are recompiled
+        if the mappings or codelists change.
+        """
+        codelists_path = join(CONFIG['paths']['standard'], 'codelists',
+                              'codelists.json')
+        key = (self.mappings_path, stat(self.mappings_path).st_mtime,
+               stat(codelists_path).st_mtime if exists(codelists_path)
+               else None)
+        with _COMPILED_RULES_LOCK:
+            rules = _COMPILED_RULES.get(key)
+            if rules is None:
+                rules = self._compile()
+                for old_key in list(_COMPILED_RULES.keys()):
+                    if old_key[0] == key[0]:
+                        del _COMPILED_RULES[old_key]
+                _COMPILED_RULES[key] = rules
+        return rules
+
+    def validate(self, dataset):
         def get_path(value):
             if value.is_text:
                 output = ['text()']
@@ -87,20 +132,17 @@ class CodelistMappings(object):
 
         success = True
         error_log = []
-        for mapping in mappings:
-            xpath_query, codelist = parse_mapping(mapping)
-            if not codelist.complete:
-                continue
-            values = dataset.etree.xpath(xpath_query)
+        for rule in self.rules:
+            values = rule.xpath(dataset.etree)
             for value in set(values):
-                if codelist.get(value):
+                if value in rule.codes:
                     continue
                 line = value.getparent().sourceline
                 path = get_path(value)
                 msg = 'The value "{}" is not in the {} codelist.'.format(
-                    value, codelist.name)
+                    value, rule.codelist.name)
                 codelist_error = CodelistValidationError(
-                    msg, line, path, codelist, self.version)
+                    msg, line, path, rule.codelist, self.version)
                 error_log.append(codelist_error)
                 success = False
         return Validator(success, error_log)
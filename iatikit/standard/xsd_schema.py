@@ -1,5 +1,7 @@
+from os import listdir, stat
 from os.path import exists, join
 import re
+from threading import Lock
 
 from lxml import etree as ET
 
@@ -8,6 +10,16 @@ from ..utils.validator import Validator, ValidationError
 from ..utils.config import CONFIG
 
 
+_SCHEMA_FILENAMES = {
+    'activity': 'iati-activities-schema.xsd',
+    'organisation': 'iati-organisations-schema.xsd',
+}
+
+# compiled schemas, keyed by (filetype, version, path, mtime)
+_COMPILED_SCHEMAS = {}
+_COMPILED_SCHEMAS_LOCK = Lock()
+
+
 class XSDValidationError(ValidationError):
     def __init__(self, error, filetype, version):
         super(XSDValidationError, self).__init__(
@@ -387,10 +399,7 @@ class XSDSchema(object):
         self.filetype = filetype
         self.version = version
 
-        schema = {
-            'activity': 'iati-activities-schema.xsd',
-            'organisation': 'iati-organisations-schema.xsd',
-        }.get(filetype)
+        schema = _SCHEMA_FILENAMES.get(filetype)
 
         if filetype is None:
             msg = 'Couldn\'t discern the filetype (activity or ' + \
@@ -419,8 +428,55 @@ class XSDSchema(object):
         return '<{} ({} {})>'.format(self.__class__.__name__,
                                      self.filetype, self.version)
 
+    def _compiled(self):
+        """Return the compiled schema, along with a lock for using it.
+
+        Compiled schemas are shared across the process, and are
+        recompiled if the schema file changes.
+        """
+        mtime = stat(self.schema_path).st_mtime
+        key = (self.filetype, self.version, self.schema_path, mtime)
+        with _COMPILED_SCHEMAS_LOCK:
+            compiled = _COMPILED_SCHEMAS.get(key)
+            if compiled is None:
+                schema = ET.XMLSchema(ET.parse(self.schema_path))
+                # drop any stale versions of this schema
+                for old_key in list(_COMPILED_SCHEMAS.keys()):
+                    if old_key[:3] == key[:3]:
+                        del _COMPILED_SCHEMAS[old_key]
+                compiled = (schema, Lock())
+                _COMPILED_SCHEMAS[key] = compiled
+        return compiled
+
     def validate(self, etree):
-        schema = ET.XMLSchema(ET.parse(self.schema_path))
-        is_valid = schema.validate(etree)
-        return XSDValidator(is_valid, schema.error_log,
+        schema, lock = self._compiled()
+        # the error log belongs to the schema, so validation
+        # and reading the errors must happen together
+        with lock:
+            is_valid = schema.validate(etree)
+            error_log = schema.error_log
+        return XSDValidator(is_valid, error_log,
                             self.filetype, self.version)
+
+
+def compile_schemas():
+    """Compile and cache every downloaded schema.
+
+    This can be used to avoid the cost of compiling schemas
+    during the first validation of each version. Returns a list
+    of the compiled ``XSDSchema`` objects.
+    """
+    schemas_path = join(CONFIG['paths']['standard'], 'schemas')
+    if not exists(schemas_path):
+        return []
+    schemas = []
+    for version_path in sorted(listdir(schemas_path)):
+        version = '{}.{}'.format(version_path[0], version_path[1:])
+        for filetype in sorted(_SCHEMA_FILENAMES.keys()):
+            try:
+                schema = XSDSchema(filetype, version)
+            except SchemaNotFoundError:
+                continue
+            schema._compiled()
+            schemas.append(schema)
+    return schemas
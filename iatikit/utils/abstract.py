@@ -1,8 +1,45 @@
 from copy import deepcopy
-from itertools import islice
+from functools import lru_cache
+from itertools import groupby, islice
+from multiprocessing import cpu_count
+from operator import itemgetter
+
+from lxml import etree as ET
+
 from .exceptions import FilterError
 
 
+@lru_cache(maxsize=4096)
+def compile_xpath(expr):
+    """Return a compiled (and reusable) XPath for ``expr``.
+
+    Compiled expressions are memoised, so each distinct expression
+    is only compiled once.
+    """
+    return ET.XPath(expr)
+
+
+class memoized_property(object):  # pylint: disable=invalid-name
+    """Like ``property``, but the value is only calculated once
+    per instance.
+
+    The value is stored on the instance, so later lookups don't
+    call the getter at all.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+        self.name = func.__name__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        value = self.func(instance)
+        instance.__dict__[self.name] = value
+        return value
+
+
 class GenericSet(object):
     """Class representing a generic grouping of iatikit objects.
 
@@ -15,6 +52,7 @@ class GenericSet(object):
     _filters = []
     _multi_filters = []
     _instance_class = None
+    _workers = None
 
     def __init__(self, **kwargs):
         self.wheres = {}
@@ -44,6 +82,22 @@ class GenericSet(object):
         """
         return self.where(**kwargs)
 
+    def parallel(self, workers=None):
+        """Return a new set, that is counted and iterated over using
+        a pool of ``workers`` processes.
+
+        Each dataset is queried in a separate process. Results are
+        returned in the same order as a serial scan. If ``workers``
+        is ``None``, the number of CPUs is used.
+
+        Only sets of items read from datasets (i.e. activities and
+        organisations) are spread across processes. Other sets are
+        unaffected.
+        """
+        out = deepcopy(self)
+        out._workers = workers if workers is not None else cpu_count()
+        return out
+
     def __getitem__(self, index):
         try:
             return next(islice(self, index, index + 1))
@@ -97,6 +151,96 @@ class GenericSet(object):
         """
         return self.where(**kwargs).first()
 
+    def evaluate(self):
+        """Run the query, and return a ``ResultSet`` of the results.
+
+        The result set supports ``len``, indexing, slicing and
+        iteration without querying the data again.
+        """
+        return ResultSet(self, self._key, self._instance_class)
+
+
+class ResultSet(object):
+    """Class representing the evaluated results of a set.
+
+    Unlike other sets, the results are fetched once and then kept,
+    so counting, indexing and iterating don't repeat the query.
+
+    If a ``loader`` is given, ``items`` are lightweight
+    ``(source, position)`` handles instead of the results themselves,
+    and ``loader(source, positions)`` returns the results at
+    ``positions`` in ``source``. Activity and organisation sets are
+    evaluated this way, so the results don't keep their datasets'
+    XML in memory. Instead, results are loaded again whenever they
+    are accessed. Handles from the same source are loaded together.
+    """
+
+    def __init__(self, items, key=None, instance_class=None, loader=None):
+        self._items = list(items)
+        self._key = key
+        self._instance_class = instance_class
+        self._loader = loader
+        self._lookup = None
+
+    def __repr__(self):
+        return '<{} ({} items)>'.format(self.__class__.__name__,
+                                        len(self._items))
+
+    def _load(self, items):
+        if self._loader is None:
+            yield from items
+            return
+        for source, handles in groupby(items, key=itemgetter(0)):
+            yield from self._loader(source, [x[1] for x in handles])
+
+    def __iter__(self):
+        return self._load(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self._load(self._items[index]))
+        return next(self._load([self._items[index]]))
+
+    def count(self):
+        """The number of items in this set.
+
+        Equivalent to ``len(self)``.
+        """
+        return len(self)
+
+    def first(self):
+        """Return the first item in this set.
+
+        Raises an ``IndexError`` if the set contains zero items.
+
+        Equivalent to ``self[0]``.
+        """
+        return self[0]
+
+    def all(self):
+        """Return a list of all items in this set.
+        """
+        return list(self)
+
+    def get(self, item, default=None):
+        """Return an item from the set, according to the primary key.
+
+        If no matching item is found, ``default`` is returned.
+        """
+        if self._lookup is None:
+            self._lookup = {}
+            for idx, obj in enumerate(self):
+                self._lookup.setdefault(getattr(obj, self._key), idx)
+        if self._instance_class is not None and \
+                isinstance(item, self._instance_class):
+            item = getattr(item, self._key)
+        if item not in self._lookup:
+            return default
+        return self[self._lookup[item]]
+
 
 class GenericType(object):
     def __init__(self, expr):
@@ -106,9 +250,18 @@ class GenericType(object):
         return self._expr
 
     def run(self, etree):
-        return etree.xpath(self.get())
+        return compile_xpath(self.get())(etree)
+
+    @staticmethod
+    def variable(variables, value):
+        """Add ``value`` to the dictionary of XPath ``variables``,
+        and return a reference to it, for use in an expression.
+        """
+        name = 'v{}'.format(len(variables))
+        variables[name] = value
+        return '$' + name
 
-    def where(self, operation, value):
+    def where(self, operation, value, variables):
         if operation == 'exists':
             sub_operation = '!= 0' if value else '= 0'
             return 'count({expr}) {subop}'.format(
@@ -116,8 +269,8 @@ class GenericType(object):
                 subop=sub_operation,
             )
         elif operation == 'eq':
-            return '{expr} = "{value}"'.format(
+            return '{expr} = {value}'.format(
                 expr=self.get(),
-                value=value,
+                value=self.variable(variables, str(value)),
             )
         raise FilterError('Unknown filter modifier: {}'.format(operation))
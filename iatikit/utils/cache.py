@@ -0,0 +1,108 @@
+from collections import OrderedDict
+from os import stat
+from os.path import abspath
+from threading import Lock
+
+from . import compression
+from .config import CONFIG
+
+
+# parsed lxml trees typically take up several times
+# the size of the XML they were parsed from
+_TREE_SIZE_FACTOR = 4
+
+# compressed XML is typically around a tenth of its original size
+_COMPRESSION_RATIO = 10
+
+
+def _cost(path, size):
+    """Return the estimated size of the tree parsed from the file
+    at ``path``, of ``size`` bytes.
+    """
+    if compression.compression(path):
+        size *= _COMPRESSION_RATIO
+    return size * _TREE_SIZE_FACTOR
+
+
+class TreeCache(object):
+    """A least-recently-used cache of parsed XML trees.
+
+    Trees are keyed by file path, modification time and size, so
+    changed files are always re-parsed. The total estimated size of
+    cached trees is capped at the ``tree_memory`` setting (in
+    megabytes) in the ``cache`` section of ``iatikit.ini``. A value
+    of ``0`` disables the cache.
+    """
+
+    def __init__(self):
+        self._trees = OrderedDict()
+        self._lock = Lock()
+        self.memory = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __repr__(self):
+        return '<{} ({} trees)>'.format(self.__class__.__name__,
+                                        len(self._trees))
+
+    def __len__(self):
+        return len(self._trees)
+
+    @property
+    def max_memory(self):
+        return int(CONFIG.getfloat('cache', 'tree_memory') * 1024 * 1024)
+
+    def info(self):
+        """Return a dictionary of cache statistics."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'trees': len(self._trees),
+            'memory': self.memory,
+            'max_memory': self.max_memory,
+        }
+
+    def clear(self):
+        """Remove all trees from the cache, and reset the statistics."""
+        with self._lock:
+            self._trees.clear()
+            self.memory = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def get(self, path, parse):
+        """Return the parsed tree for the file at ``path``.
+
+        If it isn't cached, ``parse(path)`` is called to parse it.
+        """
+        stats = stat(path)
+        key = (abspath(path), stats.st_mtime, stats.st_size)
+        with self._lock:
+            tree = self._trees.get(key)
+            if tree is not None:
+                self._trees.move_to_end(key)
+                self.hits += 1
+                return tree
+            self.misses += 1
+
+        tree = parse(path)
+
+        cost = _cost(path, stats.st_size)
+        max_memory = self.max_memory
+        if cost > max_memory:
+            return tree
+        with self._lock:
+            if key not in self._trees:
+                self._trees[key] = tree
+                self.memory += cost
+            while self.memory > max_memory:
+                old_key, _ = self._trees.popitem(last=False)
+                self.memory -= _cost(old_key[0], old_key[2])
+                self.evictions += 1
+        return tree
+
+
+tree_cache = TreeCache()
@@ -0,0 +1,80 @@
+import gzip
+from os.path import basename, splitext
+import shutil
+
+
+# compression methods, and the suffix added to compressed files
+SUFFIXES = {
+    'gzip': '.gz',
+    'zstd': '.zst',
+}
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('zstandard is required for reading and ' +
+                          'writing .zst files. Install it using:\n\n   ' +
+                          'pip install zstandard\n')
+    return zstandard
+
+
+def compression(path):
+    """Return the compression method used for the file at ``path``,
+    according to its suffix, or ``None`` if it isn't compressed.
+    """
+    for method, suffix in SUFFIXES.items():
+        if path.endswith(suffix):
+            return method
+    return None
+
+
+def name(path):
+    """Return the name of the file at ``path``, without any
+    compression suffix or file extension.
+    """
+    filename = basename(path)
+    method = compression(filename)
+    if method:
+        filename = filename[:-len(SUFFIXES[method])]
+    return splitext(filename)[0]
+
+
+def open_file(path):
+    """Open the file at ``path`` for reading bytes,
+    decompressing it if necessary.
+    """
+    method = compression(path)
+    if method == 'gzip':
+        return gzip.open(path, 'rb')
+    if method == 'zstd':
+        return _zstandard().ZstdDecompressor().stream_reader(
+            open(path, 'rb'), closefd=True)
+    return open(path, 'rb')
+
+
+def _open_compressed(path, method):
+    if method == 'gzip':
+        return gzip.open(path, 'wb')
+    if method == 'zstd':
+        return _zstandard().ZstdCompressor().stream_writer(
+            open(path, 'wb'), closefd=True)
+    raise ValueError('Unknown compression method: {}'.format(method))
+
+
+def write(source, path, method=None):
+    """Write the file-like object ``source`` to ``path``, compressed
+    using ``method`` (i.e. "gzip" or "zstd").
+
+    The compression suffix is added to ``path``, and the new path is
+    returned.
+    """
+    if method is None:
+        with open(path, 'wb') as handler:
+            shutil.copyfileobj(source, handler, 1024 * 1024)
+        return path
+    path += SUFFIXES.get(method, '')
+    with _open_compressed(path, method) as handler:
+        shutil.copyfileobj(source, handler, 1024 * 1024)
+    return path
@@ -7,11 +7,18 @@ def _load_config():
     defaults = {
         'data_sources': {
             'zip_url': '',
+            'registry_url': 'https://iatiregistry.org',
         },
         'paths': {
             'registry': join('__iatikitcache__', 'registry'),
             'standard': join('__iatikitcache__', 'standard'),
-        }
+        },
+        'cache': {
+            'tree_memory': '512',
+        },
+        'download': {
+            'workers': '8',
+        },
     }
     config = ConfigParser()
     config.read_dict(defaults)
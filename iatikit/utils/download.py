@@ -1,28 +1,115 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import csv
 from collections import OrderedDict, defaultdict
+from datetime import datetime, timezone
+from hashlib import sha1
 import json
-from os.path import exists, join
-from os import listdir, makedirs, unlink as _unlink
+from os.path import dirname, exists, getsize, isdir, join, splitext
+from os import link, listdir, makedirs, rename, replace, unlink as _unlink
 import shutil
 import logging
+import tempfile
 import zipfile
 
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3 import Retry
 
-from ..standard.codelist import CodelistSet
+from ..standard.codelist import CodelistSet, get_store
 from .config import CONFIG
-from . import helpers
+from . import compression, helpers, manifest
 
 
 http_adapter = HTTPAdapter(max_retries=Retry(total=3))
 
+# log progress after this many datasets are downloaded
+_PROGRESS_INTERVAL = 50
 
-def data():
+_CHUNK_SIZE = 1024 * 1024
+
+_STATE_FILENAME = 'download-state.json'
+
+# the number of datasets in each page of registry search results
+_PAGE_SIZE = 1000
+
+
+def _session(workers):
+    """Return a session with a connection pool big enough for
+    ``workers`` threads.
+
+    Failed requests are retried with an exponential backoff. Rate
+    limited requests are retried after waiting for as long as the
+    server's ``Retry-After`` header asks.
+    """
+    retry = Retry(total=5, backoff_factor=0.5,
+                  status_forcelist=[429, 502, 503, 504])
+    adapter = HTTPAdapter(max_retries=retry, pool_maxsize=workers)
     session = requests.Session()
-    session.mount('https://', http_adapter)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def _staging_path(path):
+    return path.rstrip('/\\') + '.staging'
+
+
+def _swap(staging_path, path):
+    """Replace the directory at ``path`` with ``staging_path``.
+
+    The old directory is renamed out of the way first, so there's
+    only a brief moment when there's nothing at ``path``.
+    """
+    old_path = path.rstrip('/\\') + '.old'
+    shutil.rmtree(old_path, ignore_errors=True)
+    if exists(path):
+        rename(path, old_path)
+    rename(staging_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def data(incremental=False, workers=None, publishers=None,
+         filetypes=None, compress=None):
+    """Download all IATI data.
+
+    By default, the whole data dump is downloaded and unzipped.
+
+    With ``incremental=True``, fresh metadata is fetched from the
+    registry, and only datasets that have changed since the last
+    download are fetched from their publishers, using a pool of
+    ``workers`` threads (by default, the ``workers`` setting in the
+    ``download`` section of ``iatikit.ini``). Changes are detected
+    by comparing the registry's hash of each dataset (or its size,
+    if there's no hash) with the local copy.
+
+    To only download some of the data, pass a list of publisher
+    names as ``publishers``, and/or a list of filetypes (i.e.
+    "activity" or "organisation") as ``filetypes``.
+
+    To store the data compressed, set ``compress`` to "gzip" or
+    "zstd". Compressed data is decompressed transparently when it's
+    read.
+
+    When downloading the whole data dump, the existing data stays
+    usable while the dump downloads. It's then removed, and the dump
+    is extracted straight into place, so at most the dump plus one
+    copy of the data is on disk at a time.
+
+    Incremental downloads are written to a staging directory, which
+    replaces the local registry cache when it's complete. If an
+    incremental download is interrupted, running it again resumes
+    where it left off.
+    """
+    if compress is not None and compress not in compression.SUFFIXES:
+        raise ValueError('Unknown compression method: {}'.format(compress))
     path = CONFIG['paths']['registry']
+    if incremental:
+        if workers is None:
+            workers = CONFIG.getint('download', 'workers')
+        _data_incremental(path, workers, publishers, filetypes, compress)
+        return
+    session = requests.Session()
+    session.mount('https://', http_adapter)
     if CONFIG['data_sources']['zip_url'] != "":
         zip_url = CONFIG['data_sources']['zip_url']
     else:
@@ -30,60 +117,416 @@ def data():
         response = session.get(download_url)
         response.raise_for_status()
         zip_url = response.text.strip()
-    shutil.rmtree(path, ignore_errors=True)
-    makedirs(path)
-    zip_filepath = join(path, 'iati_dump.zip')
-
-    logging.getLogger(__name__).info('Downloading all IATI registry data...')
-    response = session.get(zip_url, stream=True)
-    response.raise_for_status()
-    with open(zip_filepath, 'wb') as handler:
-        shutil.copyfileobj(response.raw, handler)
-    logging.getLogger(__name__).info('Unzipping data...')
+    # the dump is downloaded alongside the existing data, which is
+    # only removed once the download is complete
+    zip_filepath = path.rstrip('/\\') + '.zip'
+    try:
+        logging.getLogger(__name__).info(
+            'Downloading all IATI registry data...')
+        response = session.get(zip_url, stream=True)
+        response.raise_for_status()
+        with open(zip_filepath, 'wb') as handler:
+            shutil.copyfileobj(response.raw, handler, _CHUNK_SIZE)
+        shutil.rmtree(path, ignore_errors=True)
+        makedirs(path)
+        logging.getLogger(__name__).info('Unzipping data...')
+        _extract(zip_filepath, path, publishers, filetypes, compress)
+    finally:
+        if exists(zip_filepath):
+            _unlink(zip_filepath)
+    manifest.build(path)
+
+
+def _filetype(dataset_metadata):
+    """Return the filetype from a dataset's registry metadata."""
+    for extra in dataset_metadata.get('extras') or []:
+        if extra.get('key') == 'filetype':
+            return extra.get('value')
+
+
+def _selected(org_name, dataset_metadata, publishers, filetypes):
+    """Return whether a dataset matches the selected publishers
+    and filetypes.
+
+    If ``dataset_metadata`` is ``None``, only the publisher is
+    checked.
+    """
+    if publishers is not None and org_name not in publishers:
+        return False
+    if filetypes is not None and dataset_metadata is not None and \
+            _filetype(dataset_metadata) not in filetypes:
+        return False
+    return True
+
+
+def _extract(zip_filepath, path, publishers=None, filetypes=None,
+             compress=None):
+    """Extract the data dump at ``zip_filepath`` to ``path``.
+
+    Each file is written straight to its final path, without the
+    top-level ``iati-data-main`` directory. Only datasets that match
+    ``publishers`` and ``filetypes`` are extracted, and data files
+    are compressed using ``compress``.
+    """
     with zipfile.ZipFile(zip_filepath, 'r') as zip_ref:
-        zip_ref.extractall(path)
-    logging.getLogger(__name__).info('Cleaning up...')
-    zip_output_path = join(path, 'iati-data-main')
-    for f in listdir(zip_output_path):
-        shutil.move(join(zip_output_path, f), path)
-    _unlink(zip_filepath)
-
-
-def metadata():
-    session = requests.Session()
-    session.mount('https://', http_adapter)
+        members = OrderedDict()
+        for info in zip_ref.infolist():
+            parts = info.filename.split('/')
+            if parts[0] == 'iati-data-main':
+                parts = parts[1:]
+            if info.is_dir() or not parts or '' in parts or \
+                    '..' in parts:
+                continue
+            members[tuple(parts)] = info
+
+        dataset_metadata = {}
+        if filetypes is not None:
+            for parts, info in members.items():
+                if len(parts) == 3 and parts[0] == 'metadata':
+                    with zip_ref.open(info) as handler:
+                        dataset_metadata[parts[1:]] = json.load(handler)
+
+        for parts, info in members.items():
+            if len(parts) == 2 and parts[0] == 'metadata':
+                # publisher metadata
+                if not _selected(splitext(parts[1])[0], None,
+                                 publishers, None):
+                    continue
+            elif len(parts) == 3 and parts[0] in ['data', 'metadata']:
+                org_name, filename = parts[1:]
+                dataset_name = splitext(filename)[0]
+                if not _selected(org_name, dataset_metadata.get(
+                        (org_name, dataset_name + '.json'), {}),
+                        publishers, filetypes):
+                    continue
+            filepath = join(path, *parts)
+            makedirs(dirname(filepath), exist_ok=True)
+            with zip_ref.open(info) as source:
+                compression.write(source, filepath,
+                                  compress if parts[0] == 'data' else None)
+
+
+def _resource(dataset_metadata):
+    """Return the url, hash and size of a dataset's resource,
+    from its registry metadata.
+    """
+    resources = dataset_metadata.get('resources') or [{}]
+    resource = resources[0]
+    return {
+        'url': resource.get('url'),
+        'hash': resource.get('hash') or None,
+        'size': resource.get('size'),
+    }
+
+
+def _load_resource(metadata_filepath):
+    if not exists(metadata_filepath):
+        return None
+    with open(metadata_filepath) as handler:
+        return _resource(json.load(handler))
+
+
+def _changed(resource, old_resource, data_filepath):
+    """Return whether the local copy of a dataset is out of date."""
+    if old_resource is None or data_filepath is None:
+        return True
+    if resource['url'] != old_resource['url']:
+        return True
+    if resource['hash'] and old_resource['hash']:
+        return resource['hash'] != old_resource['hash']
+    if resource['size'] is not None:
+        if compression.compression(data_filepath):
+            # compare with the size of the file when it was downloaded
+            return old_resource['size'] is None or \
+                int(resource['size']) != int(old_resource['size'])
+        return int(resource['size']) != getsize(data_filepath)
+    return True
+
+
+def _find_data_file(path, key):
+    """Return the path to the data file for ``key`` in ``path``, in
+    whichever format it's stored, or ``None`` if there isn't one.
+    """
+    filepath = join(path, 'data', key + '.xml')
+    for suffix in [''] + list(compression.SUFFIXES.values()):
+        if exists(filepath + suffix):
+            return filepath + suffix
+    return None
+
+
+def _link(source, destination):
+    """Hard link ``source`` to ``destination``, falling back to
+    copying it.
+    """
+    try:
+        link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def _store(source, filepath, compress):
+    """Store the data file at ``source`` at ``filepath`` (plus a
+    compression suffix), compressed using ``compress``.
+
+    If ``source`` is already in that format, it's linked rather
+    than copied.
+    """
+    if compression.compression(source) == compress:
+        _link(source, filepath + compression.SUFFIXES.get(compress, ''))
+    else:
+        with compression.open_file(source) as handler:
+            compression.write(handler, filepath, compress)
+
+
+def _fetch(session, url, filepath, resume, compress=None):
+    """Download ``url`` to ``filepath``, and compress it using
+    ``compress``.
+
+    The data is written to a ``.part`` file first. If ``resume`` is
+    true and there's already a ``.part`` file, only the rest of the
+    file is requested.
+    """
+    part_filepath = filepath + '.part'
+    headers = {}
+    offset = getsize(part_filepath) \
+        if resume and exists(part_filepath) else 0
+    if offset:
+        headers['Range'] = 'bytes={}-'.format(offset)
+    with session.get(url, stream=True, headers=headers,
+                     timeout=60) as response:
+        # a 416 means the partial download was already complete
+        if response.status_code != 416:
+            response.raise_for_status()
+            mode = 'ab' if response.status_code == 206 else 'wb'
+            with open(part_filepath, mode) as handler:
+                for chunk in response.iter_content(_CHUNK_SIZE):
+                    handler.write(chunk)
+    if compress is None:
+        rename(part_filepath, filepath)
+    else:
+        _store(part_filepath, filepath, compress)
+        _unlink(part_filepath)
+
+
+def _data_incremental(path, workers, publishers=None, filetypes=None,
+                      compress=None):
+    staging_path = _staging_path(path)
+    state_filepath = join(staging_path, _STATE_FILENAME)
+    makedirs(staging_path, exist_ok=True)
+    state = {}
+    if exists(state_filepath):
+        with open(state_filepath) as handler:
+            state = json.load(handler)
+
+    def save_state():
+        tmp_filepath = state_filepath + '.tmp'
+        with open(tmp_filepath, 'w') as handler:
+            json.dump(state, handler)
+        replace(tmp_filepath, state_filepath)
+
+    session = _session(workers)
+
+    metadata_path = join(staging_path, 'metadata')
+    shutil.rmtree(metadata_path, ignore_errors=True)
+    makedirs(metadata_path)
     logging.getLogger(__name__).info(
         'Downloading metadata from the IATI registry...')
-    path = join(CONFIG['paths']['registry'], 'metadata')
-    shutil.rmtree(path, ignore_errors=True)
-    makedirs(path)
+    _fetch_metadata(session, metadata_path, workers)
+
+    logging.getLogger(__name__).info('Checking for changed datasets...')
+    downloads = []
+    for org_name in sorted(listdir(metadata_path)):
+        org_metadata_path = join(metadata_path, org_name)
+        if not isdir(org_metadata_path):
+            continue
+        if not _selected(org_name, None, publishers, None):
+            shutil.rmtree(org_metadata_path)
+            if exists(org_metadata_path + '.json'):
+                _unlink(org_metadata_path + '.json')
+            continue
+        makedirs(join(staging_path, 'data', org_name), exist_ok=True)
+        for filename in sorted(listdir(org_metadata_path)):
+            dataset_name = filename[:-len('.json')]
+            key = join(org_name, dataset_name)
+            metadata_filepath = join(metadata_path, key + '.json')
+            with open(metadata_filepath) as handler:
+                dataset_metadata = json.load(handler)
+            if not _selected(org_name, dataset_metadata,
+                             publishers, filetypes):
+                _unlink(metadata_filepath)
+                continue
+            resource = _resource(dataset_metadata)
+            if not resource['url']:
+                continue
+            staged_filepath = _find_data_file(staging_path, key)
+            if state.get(key) == resource:
+                if staged_filepath is not None:
+                    # already downloaded by an interrupted run
+                    continue
+                downloads.append((key, resource, True))
+                continue
+            if staged_filepath is not None:
+                _unlink(staged_filepath)
+            data_filepath = _find_data_file(path, key)
+            old_resource = _load_resource(
+                join(path, 'metadata', key + '.json'))
+            if _changed(resource, old_resource, data_filepath):
+                state[key] = resource
+                downloads.append((key, resource, False))
+            else:
+                _store(data_filepath,
+                       join(staging_path, 'data', key + '.xml'), compress)
+    # record what's being downloaded, so an interrupted download
+    # can be resumed
+    save_state()
 
-    url_tmpl = 'https://iatiregistry.org/api/3/action/package_search' + \
-               '?start={start}&rows=1000'
-    org_url_tmpl = 'https://iatiregistry.org/api/3/action/group_show' + \
-                   '?id={org_slug}'
-    start = 0
-    while True:
-        response = session.get(url_tmpl.format(start=start))
+    logging.getLogger(__name__).info(
+        'Downloading %d changed datasets...', len(downloads))
+    count = 0
+    with ThreadPoolExecutor(workers) as executor:
+        futures = {
+            executor.submit(
+                _fetch, session, resource['url'],
+                join(staging_path, 'data', key + '.xml'),
+                resume, compress): key
+            for key, resource, resume in downloads}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                future.result()
+            except (requests.RequestException, OSError) as error:
+                logging.getLogger(__name__).warning(
+                    'Failed to download %s: %s', key, error)
+                # if this run is interrupted, the next one shouldn't
+                # mistake the fallback copy for a finished download
+                del state[key]
+                save_state()
+                # fall back to the last copy downloaded, if any
+                data_filepath = _find_data_file(path, key)
+                if data_filepath is not None:
+                    _store(data_filepath, join(
+                        staging_path, 'data', key + '.xml'), compress)
+                    # along with its metadata, so the next download
+                    # still sees it as out of date
+                    old_metadata_filepath = join(
+                        path, 'metadata', key + '.json')
+                    metadata_filepath = join(
+                        staging_path, 'metadata', key + '.json')
+                    if exists(old_metadata_filepath):
+                        shutil.copy2(old_metadata_filepath,
+                                     metadata_filepath)
+                    else:
+                        _unlink(metadata_filepath)
+            count += 1
+            if count % _PROGRESS_INTERVAL == 0:
+                logging.getLogger(__name__).info(
+                    'Downloaded %d of %d datasets',
+                    count, len(downloads))
+
+    for filename in listdir(join(staging_path, 'data')):
+        # remove leftover partial downloads
+        org_path = join(staging_path, 'data', filename)
+        for data_filename in listdir(org_path):
+            if data_filename.endswith('.part'):
+                _unlink(join(org_path, data_filename))
+    _unlink(state_filepath)
+    with open(join(staging_path, 'metadata.json'), 'w') as handler:
+        json.dump({
+            'updated_at': datetime.now(timezone.utc).strftime(
+                '%Y-%m-%dT%H:%M:%SZ'),
+        }, handler)
+    _swap(staging_path, path)
+    manifest.build(path)
+
+
+def _fetch_metadata(session, path, workers):
+    """Download metadata for every dataset and publisher on the
+    registry to ``path``, using a pool of ``workers`` threads.
+
+    Pages of search results, publisher metadata and writing the
+    files to disk are all handled concurrently.
+    """
+    registry_url = CONFIG['data_sources']['registry_url'].rstrip('/')
+    url_tmpl = registry_url + '/api/3/action/package_search' + \
+        '?start={start}&rows={rows}'
+    org_url_tmpl = registry_url + '/api/3/action/group_show' + \
+        '?id={org_slug}'
+
+    def write(filepath, j):
+        with open(filepath, 'w') as f:
+            json.dump(j, f)
+
+    def fetch_page(start):
+        response = session.get(
+            url_tmpl.format(start=start, rows=_PAGE_SIZE), timeout=60)
         response.raise_for_status()
-        j = response.json()
-        if len(j['result']['results']) == 0:
-            break
-        for res in j['result']['results']:
+        result = response.json()['result']
+        org_names = set()
+        for res in result['results']:
             org = res['organization']
             if not org:
                 continue
             org_name = org['name']
-            if not exists(join(path, org_name + '.json')):
-                j = session.get(org_url_tmpl.format(org_slug=org_name)).json()
-                with open(join(path, org_name + '.json'), 'w') as f:
-                    json.dump(j['result'], f)
-            dataset_name = res['name']
-            orgpath = join(path, org_name)
-            makedirs(orgpath, exist_ok=True)
-            with open(join(orgpath, dataset_name + '.json'), 'w') as f:
-                json.dump(res, f)
-        start += 1000
+            makedirs(join(path, org_name), exist_ok=True)
+            write(join(path, org_name, res['name'] + '.json'), res)
+            org_names.add(org_name)
+        return result, org_names
+
+    def fetch_org(org_name):
+        response = session.get(
+            org_url_tmpl.format(org_slug=org_name), timeout=60)
+        response.raise_for_status()
+        write(join(path, org_name + '.json'), response.json()['result'])
+
+    org_futures = {}
+    with ThreadPoolExecutor(workers) as executor:
+        def fetch_orgs(org_names):
+            for org_name in org_names:
+                if org_name not in org_futures:
+                    org_futures[org_name] = executor.submit(
+                        fetch_org, org_name)
+
+        # the first page says how many more pages there are
+        result, org_names = fetch_page(0)
+        fetch_orgs(org_names)
+        count = result.get('count')
+        if count is None:
+            start = 0
+            while result['results']:
+                start += _PAGE_SIZE
+                result, org_names = fetch_page(start)
+                fetch_orgs(org_names)
+        else:
+            pages = [executor.submit(fetch_page, start)
+                     for start in range(_PAGE_SIZE, count, _PAGE_SIZE)]
+            for future in as_completed(pages):
+                _, org_names = future.result()
+                fetch_orgs(org_names)
+        for future in as_completed(org_futures.values()):
+            future.result()
+    logging.getLogger(__name__).info(
+        'Downloaded metadata for %d publishers', len(org_futures))
+
+
+def metadata(workers=None):
+    """Download metadata for every dataset and publisher on the
+    registry, using a pool of ``workers`` threads (by default, the
+    ``workers`` setting in the ``download`` section of
+    ``iatikit.ini``).
+
+    Requests that are rate limited are retried, after waiting for
+    as long as the registry asks.
+    """
+    if workers is None:
+        workers = CONFIG.getint('download', 'workers')
+    session = _session(workers)
+    logging.getLogger(__name__).info(
+        'Downloading metadata from the IATI registry...')
+    path = join(CONFIG['paths']['registry'], 'metadata')
+    shutil.rmtree(path, ignore_errors=True)
+    makedirs(path)
+    _fetch_metadata(session, path, workers)
+    manifest.build(CONFIG['paths']['registry'])
 
 
 _VERY_OLD_IATI_VERSIONS = ['1.01', '1.02']
@@ -109,12 +552,64 @@ _OLD_SCHEMA_TMPL = 'https://iatistandard.org/reference_downloads/archive/downloa
 _NEW_SCHEMA_TMPL = 'https://iatistandard.org/reference_downloads/{dotless_version}/schema/downloads/{filename}'
 
 
-def _get_codelist_mappings(versions):
+_HTTP_CACHE_DIRNAME = '.http_cache'
+
+
+def _get_cached(session, url):
+    """Return the body of the response from ``url``.
+
+    Responses are cached in the standard directory, along with
+    their ``ETag`` and ``Last-Modified`` headers. Cached responses
+    are revalidated using a conditional request, so files that
+    haven't changed aren't downloaded again.
+    """
+    cache_path = join(CONFIG['paths']['standard'], _HTTP_CACHE_DIRNAME)
+    body_filepath = join(cache_path, sha1(url.encode()).hexdigest())
+    headers_filepath = body_filepath + '.json'
+    cached = None
+    if exists(headers_filepath) and exists(body_filepath):
+        with open(headers_filepath) as handler:
+            cached = json.load(handler)
+    headers = {}
+    if cached is not None:
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+    response = session.get(url, headers=headers, timeout=60)
+    if cached is not None and response.status_code == 304:
+        with open(body_filepath, 'rb') as handler:
+            return handler.read()
+    response.raise_for_status()
+    content = response.content
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if etag or last_modified:
+        makedirs(cache_path, exist_ok=True)
+        for filepath, mode, data in [
+                (body_filepath, 'wb', content),
+                (headers_filepath, 'w', json.dumps({
+                    'url': url,
+                    'etag': etag,
+                    'last_modified': last_modified,
+                }))]:
+            # the same URL may be fetched by several threads at once,
+            # so each one writes to its own temporary file
+            fd, tmp_filepath = tempfile.mkstemp(dir=cache_path,
+                                                suffix='.tmp')
+            try:
+                with open(fd, mode) as handler:
+                    handler.write(data)
+                replace(tmp_filepath, filepath)
+            except BaseException:
+                _unlink(tmp_filepath)
+                raise
+    return content
+
+
+def _get_codelist_mappings(versions, session, executor):
     all_codelists = CodelistSet()
 
-    session = requests.Session()
-    session.mount('https://', http_adapter)
-
     path = join(CONFIG['paths']['standard'], 'codelist_mappings')
     shutil.rmtree(path, ignore_errors=True)
     makedirs(path)
@@ -124,82 +619,85 @@ def _get_codelist_mappings(versions):
 
     tmpl = 'https://iatistandard.org/reference_downloads/' + \
            '{version}/codelists/downloads/clv2/mapping.json'
-    for version in versions:
-        if version not in ['1.01', '1.02', '1.03']:
-            dotless_version = version.replace('.', '')
-            mapping_path = join(path, dotless_version)
-            makedirs(mapping_path)
-
-            mapping_url = tmpl.format(version=dotless_version)
-            mappings_response = session.get(mapping_url)
-            mappings_response.raise_for_status()
-            mappings = mappings_response.json()
-
-            activity_mappings = [
-                x for x in mappings
-                if not x['path'].startswith('//iati-org')]
-            filepath = join(mapping_path, 'activity-mappings.json')
-            with open(filepath, 'w') as handler:
-                json.dump(activity_mappings, handler)
-
-            organisation_mappings = [
-                x for x in mappings
-                if not x['path'].startswith('//iati-act')]
-            filepath = join(mapping_path, 'organisation-mappings.json')
-            with open(filepath, 'w') as handler:
-                json.dump(organisation_mappings, handler)
-
-
-def codelists():
+    dotless_versions = [
+        version.replace('.', '') for version in versions
+        if version not in ['1.01', '1.02', '1.03']]
+    responses = executor.map(
+        lambda dotless_version: _get_cached(
+            session, tmpl.format(version=dotless_version)),
+        dotless_versions)
+    for dotless_version, content in zip(dotless_versions, responses):
+        mapping_path = join(path, dotless_version)
+        makedirs(mapping_path)
+
+        mappings = json.loads(content)
+
+        activity_mappings = [
+            x for x in mappings
+            if not x['path'].startswith('//iati-org')]
+        filepath = join(mapping_path, 'activity-mappings.json')
+        with open(filepath, 'w') as handler:
+            json.dump(activity_mappings, handler)
+
+        organisation_mappings = [
+            x for x in mappings
+            if not x['path'].startswith('//iati-act')]
+        filepath = join(mapping_path, 'organisation-mappings.json')
+        with open(filepath, 'w') as handler:
+            json.dump(organisation_mappings, handler)
+
+
+def codelists(workers=None):
+    """Download the codelists for every version of the IATI Standard,
+    using a pool of ``workers`` threads (by default, the ``workers``
+    setting in the ``download`` section of ``iatikit.ini``).
+
+    Downloads are cached, and only transferred again if they've
+    changed.
+    """
+    if workers is None:
+        workers = CONFIG.getint('download', 'workers')
+    session = _session(workers)
+
+    def get_csv(url):
+        return list(csv.DictReader(
+            _get_cached(session, url).decode().splitlines()))
+
     def get_list_of_codelists(version):
-        session = requests.Session()
-        session.mount('https://', http_adapter)
         if version in _VERY_OLD_IATI_VERSIONS:
-            response = session.get(_VERY_OLD_CODELISTS_URL)
-            response.raise_for_status()
-            # import pdb; pdb.set_trace()
-            list_of_codelists = [x['name'] for x in csv.DictReader(
-                [x.decode() for x in response.iter_lines()])]
+            list_of_codelists = [
+                x['name'] for x in get_csv(_VERY_OLD_CODELISTS_URL)]
         elif version in _OLD_IATI_VERSIONS:
-            response = session.get(_OLD_CODELISTS_URL)
-            response.raise_for_status()
-            list_of_codelists = [x['name'] for x in response.json()['codelist']]
+            list_of_codelists = [x['name'] for x in json.loads(
+                _get_cached(session, _OLD_CODELISTS_URL))['codelist']]
         else:
             codelists_url = _NEW_CODELISTS_TMPL.format(
                 version=version.replace('.', ''))
-            response = session.get(codelists_url)
-            response.raise_for_status()
-            list_of_codelists = response.json()
+            list_of_codelists = json.loads(
+                _get_cached(session, codelists_url))
         return list_of_codelists
 
     def get_codelist(codelist_name, version):
-        session = requests.Session()
-        session.mount('https://', http_adapter)
         if version in _VERY_OLD_IATI_VERSIONS:
             codelist_url = _VERY_OLD_CODELIST_TMPL.format(
                 codelist_name=codelist_name)
-            response = session.get(codelist_url)
-            response.raise_for_status()
-            codes = list(csv.DictReader(
-                [x.decode() for x in response.iter_lines()]))
-            version_codelist = {'data': codes}
+            version_codelist = {'data': get_csv(codelist_url)}
         elif version in _OLD_IATI_VERSIONS:
             codelist_url = _OLD_CODELIST_TMPL.format(
                 codelist_name=codelist_name)
-            response = session.get(codelist_url)
-            response.raise_for_status()
-            codes = list(csv.DictReader(
-                [x.decode() for x in response.iter_lines()]))
-            version_codelist = {'data': codes}
+            version_codelist = {'data': get_csv(codelist_url)}
         else:
             codelist_url = _NEW_CODELIST_TMPL.format(
                 codelist_name=codelist_name,
                 version=version.replace('.', ''))
-            response = session.get(codelist_url)
-            response.raise_for_status()
-            version_codelist = response.json()
+            version_codelist = json.loads(
+                _get_cached(session, codelist_url))
         return version_codelist
 
+    def embedded(version_codelist):
+        return version_codelist.get(
+            'attributes', {}).get('embedded') != '0'
+
     path = join(CONFIG['paths']['standard'], 'codelists')
     shutil.rmtree(path, ignore_errors=True)
     makedirs(path)
@@ -209,79 +707,114 @@ def codelists():
 
     codelist_versions_by_name = defaultdict(list)
     all_versions = helpers.get_iati_versions()
-    for version in all_versions:
-        for codelist_name in get_list_of_codelists(version):
-            codelist_versions_by_name[codelist_name].append(version)
-
-    with open(join(path, 'codelists.json'), 'w') as handler:
-        json.dump(codelist_versions_by_name, handler)
-
-    for codelist_name, versions in codelist_versions_by_name.items():
-        codelist = None
-        for version in versions:
-            version_codelist = get_codelist(codelist_name, version)
-
-            if version_codelist.get('attributes', {}).get('embedded') == '0':
-                codelist = version_codelist
-                codelist['data'] = OrderedDict(
-                    [(x['code'], x) for x in codelist['data']])
-                break
-
-            if codelist is None:
-                codelist = {
-                    'attributes': version_codelist.get('attributes', {}),
-                    'metadata': version_codelist.get('metadata', {}),
-                    'data': OrderedDict(),
-                }
-
-            for item in version_codelist['data']:
-                if item['code'] not in codelist['data']:
-                    item['from'] = version
-                    item['until'] = version
-                    codelist['data'][item['code']] = item
-                else:
-                    current_item = codelist['data'][item['code']]
-                    if version < current_item['from']:
-                        current_item['from'] = version
-                    if version > current_item['until']:
-                        current_item['until'] = version
-                    codelist['data'][item['code']] = current_item
-
-        with open(join(path, codelist_name + '.json'), 'w') as handler:
-            json.dump(codelist, handler)
-
-    _get_codelist_mappings(all_versions)
-
-
-def schemas():
-    session = requests.Session()
-    session.mount('https://', http_adapter)
+    with ThreadPoolExecutor(workers) as executor:
+        for version, list_of_codelists in zip(
+                all_versions,
+                executor.map(get_list_of_codelists, all_versions)):
+            for codelist_name in list_of_codelists:
+                codelist_versions_by_name[codelist_name].append(version)
+
+        with open(join(path, 'codelists.json'), 'w') as handler:
+            json.dump(codelist_versions_by_name, handler)
+
+        # non-embedded codelists are the same for every version, so
+        # only fetch the other versions of embedded codelists
+        futures = {
+            (codelist_name, versions[0]): executor.submit(
+                get_codelist, codelist_name, versions[0])
+            for codelist_name, versions in
+            codelist_versions_by_name.items()}
+        for codelist_name, versions in codelist_versions_by_name.items():
+            if embedded(futures[(codelist_name, versions[0])].result()):
+                for version in versions[1:]:
+                    futures[(codelist_name, version)] = executor.submit(
+                        get_codelist, codelist_name, version)
+
+        for codelist_name, versions in codelist_versions_by_name.items():
+            codelist = None
+            for version in versions:
+                version_codelist = futures[
+                    (codelist_name, version)].result()
+
+                if not embedded(version_codelist):
+                    codelist = version_codelist
+                    codelist['data'] = OrderedDict(
+                        [(x['code'], x) for x in codelist['data']])
+                    break
+
+                if codelist is None:
+                    codelist = {
+                        'attributes': version_codelist.get(
+                            'attributes', {}),
+                        'metadata': version_codelist.get('metadata', {}),
+                        'data': OrderedDict(),
+                    }
+
+                for item in version_codelist['data']:
+                    if item['code'] not in codelist['data']:
+                        item['from'] = version
+                        item['until'] = version
+                        codelist['data'][item['code']] = item
+                    else:
+                        current_item = codelist['data'][item['code']]
+                        if version < current_item['from']:
+                            current_item['from'] = version
+                        if version > current_item['until']:
+                            current_item['until'] = version
+                        codelist['data'][item['code']] = current_item
+
+            with open(join(path, codelist_name + '.json'), 'w') as handler:
+                json.dump(codelist, handler)
+
+        _get_codelist_mappings(all_versions, session, executor)
+    # make sure the new codelists are used straight away
+    get_store().refresh()
+
+
+def schemas(workers=None):
+    """Download the schemas for every version of the IATI Standard,
+    using a pool of ``workers`` threads (by default, the ``workers``
+    setting in the ``download`` section of ``iatikit.ini``).
+
+    Downloads are cached, and only transferred again if they've
+    changed.
+    """
+    if workers is None:
+        workers = CONFIG.getint('download', 'workers')
+    session = _session(workers)
     path = join(CONFIG['paths']['standard'], 'schemas')
     shutil.rmtree(path, ignore_errors=True)
     makedirs(path)
 
     versions_url = _NEW_CODELIST_TMPL.format(version='201', codelist_name='Version')
-    versions_response = session.get(versions_url)
-    versions_response.raise_for_status()
-    versions = [d['code'] for d in versions_response.json()['data']]
+    versions = [d['code'] for d in json.loads(
+        _get_cached(session, versions_url))['data']]
     versions.reverse()
 
     logging.getLogger(__name__).info('Downloading IATI Standard schemas...')
     filenames = ['iati-activities-schema.xsd', 'iati-organisations-schema.xsd',
                  'iati-common.xsd', 'xml.xsd']
-    for version in versions:
+
+    def get_schema(version, filename):
         dotless_version = version.replace('.', '')
-        makedirs(join(path, dotless_version))
-        for filename in filenames:
-            if version in _VERY_OLD_IATI_VERSIONS + _OLD_IATI_VERSIONS:
-                url = _OLD_SCHEMA_TMPL.format(version=version, filename=filename)
-            else:
-                url = _NEW_SCHEMA_TMPL.format(dotless_version=dotless_version, filename=filename)
-            response = session.get(url)
-            response.raise_for_status()
-            filepath = join(path, dotless_version, filename)
-            with open(filepath, 'wb') as handler:
-                handler.write(response.content)
+        if version in _VERY_OLD_IATI_VERSIONS + _OLD_IATI_VERSIONS:
+            url = _OLD_SCHEMA_TMPL.format(
+                version=version, filename=filename)
+        else:
+            url = _NEW_SCHEMA_TMPL.format(
+                dotless_version=dotless_version, filename=filename)
+        content = _get_cached(session, url)
+        filepath = join(path, dotless_version, filename)
+        with open(filepath, 'wb') as handler:
+            handler.write(content)
+
+    for version in versions:
+        makedirs(join(path, version.replace('.', '')))
+    with ThreadPoolExecutor(workers) as executor:
+        futures = [executor.submit(get_schema, version, filename)
+                   for version in versions for filename in filenames]
+        for future in as_completed(futures):
+            future.result()
 
 
 def standard():
@@ -44,3 +44,8 @@ class SchemaNotFoundError(Exception):
 
 class MappingsNotFoundError(Exception):
     pass
+
+
+class FieldError(Exception):
+    """Raised when an unknown field is requested."""
+    pass
@@ -0,0 +1,112 @@
+from copy import copy
+
+from .exceptions import FieldError
+
+
+DEFAULT_FIELDS = [
+    'iati_identifier', 'title', 'planned_start', 'actual_start',
+    'planned_end', 'actual_end', 'sector', 'humanitarian',
+]
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError('pyarrow is required for exporting to Arrow ' +
+                          'and Parquet. Install it using:\n\n   ' +
+                          'pip install pyarrow\n')
+    return pyarrow
+
+
+def _strings(values):
+    # plain strings, so the values don't keep the tree alive
+    return [str(x) for x in values]
+
+
+def _sectors(sectors):
+    return [{
+        'vocabulary': x.vocabulary.code if x.vocabulary else None,
+        'code': x.code.code if hasattr(x.code, 'code') else x.code,
+        'percentage': x.percentage,
+    } for x in sectors]
+
+
+def _fields(pa):
+    """Return the Arrow type of each field, along with a function
+    for converting its value.
+    """
+    sector_type = pa.struct([
+        ('vocabulary', pa.string()),
+        ('code', pa.string()),
+        ('percentage', pa.float64()),
+    ])
+    return {
+        'iati_identifier': (pa.string(), None),
+        'title': (pa.list_(pa.string()), _strings),
+        'description': (pa.list_(pa.string()), _strings),
+        'planned_start': (pa.date32(), None),
+        'actual_start': (pa.date32(), None),
+        'start': (pa.date32(), None),
+        'planned_end': (pa.date32(), None),
+        'actual_end': (pa.date32(), None),
+        'end': (pa.date32(), None),
+        'sector': (pa.list_(sector_type), _sectors),
+        'humanitarian': (pa.bool_(), None),
+    }
+
+
+def schema(fields):
+    """Return the Arrow schema for a table of ``fields``."""
+    pa = _pyarrow()
+    types = _fields(pa)
+    for field in fields:
+        if field not in types:
+            raise FieldError('Unknown field: {}'.format(field))
+    return pa.schema([(field, types[field][0]) for field in fields])
+
+
+def record_batches(item_set, fields):
+    """Yield an Arrow record batch of ``fields`` for the items
+    in each dataset of ``item_set``.
+
+    Only one dataset's worth of items is held in memory at a time.
+    """
+    pa = _pyarrow()
+    arrow_schema = schema(fields)
+    converters = [_fields(pa)[field][1] for field in fields]
+    for dataset in item_set.datasets:
+        dataset_set = copy(item_set)
+        dataset_set.datasets = [dataset]
+        dataset_set._workers = None
+        columns = [[] for _ in fields]
+        for values in dataset_set.values_list(*fields):
+            for column, value, convert in zip(columns, values, converters):
+                column.append(convert(value) if convert else value)
+        if not columns or not columns[0]:
+            continue
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(column, type=arrow_field.type)
+             for column, arrow_field in zip(columns, arrow_schema)],
+            schema=arrow_schema)
+
+
+def to_arrow(item_set, fields):
+    """Return an Arrow table of ``fields`` for the items
+    in ``item_set``.
+    """
+    pa = _pyarrow()
+    return pa.Table.from_batches(record_batches(item_set, fields),
+                                 schema=schema(fields))
+
+
+def to_parquet(item_set, path, fields):
+    """Write a Parquet file of ``fields`` for the items
+    in ``item_set`` to ``path``, one dataset at a time.
+    """
+    _pyarrow()
+    import pyarrow.parquet as pq
+
+    with pq.ParquetWriter(path, schema(fields)) as writer:
+        for batch in record_batches(item_set, fields):
+            writer.write_batch(batch)
@@ -0,0 +1,546 @@
+from math import isnan
+from os import stat, unlink as _unlink
+from os.path import abspath, basename, dirname, exists, join
+import logging
+import re
+import sqlite3
+
+from lxml import etree as ET
+
+from ..data.sector import Sector
+from ..standard.codelist import CodelistSet
+from ..standard.schema import get_schema
+from . import compression
+from .abstract import compile_xpath
+from .config import CONFIG
+from .exceptions import SchemaError
+from .manifest import get_manifest
+
+
+_INDEX_FILENAME = 'activity-index.sqlite'
+
+_SCHEMA_SQL = '''
+CREATE TABLE datasets (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    name TEXT NOT NULL,
+    publisher TEXT,
+    version TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    prolog BLOB
+);
+CREATE TABLE activities (
+    id INTEGER PRIMARY KEY,
+    dataset_id INTEGER NOT NULL REFERENCES datasets(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    iati_identifier TEXT,
+    planned_start REAL,
+    actual_start REAL,
+    planned_end REAL,
+    actual_end REAL,
+    humanitarian INTEGER NOT NULL,
+    not_humanitarian INTEGER NOT NULL,
+    start_offset INTEGER,
+    end_offset INTEGER
+);
+CREATE TABLE identifiers (
+    activity_id INTEGER NOT NULL REFERENCES activities(id) ON DELETE CASCADE,
+    value TEXT NOT NULL
+);
+CREATE TABLE sectors (
+    activity_id INTEGER NOT NULL REFERENCES activities(id) ON DELETE CASCADE,
+    code TEXT,
+    vocabulary TEXT
+);
+CREATE INDEX activities_dataset ON activities (dataset_id, position);
+CREATE INDEX identifiers_value ON identifiers (value);
+CREATE INDEX identifiers_activity ON identifiers (activity_id);
+CREATE INDEX sectors_code ON sectors (code);
+CREATE INDEX sectors_activity ON sectors (activity_id);
+'''
+
+_DATE_FIELDS = ['planned_start', 'actual_start', 'planned_end', 'actual_end']
+
+_ATTRS = r'(?:\s+[^\s=/>]+\s*=\s*(?:"[^"]*"|\'[^\']*\'))*\s*'
+_ROOT_RE = re.compile(br'<iati-activities' + _ATTRS.encode() + br'>')
+_ACTIVITY_START_RE = re.compile(
+    br'<iati-activity' + _ATTRS.encode() + br'(/?)>')
+_ACTIVITY_END_RE = re.compile(br'</iati-activity\s*>')
+
+
+def _index_path(path=None):
+    if path is None:
+        path = CONFIG['paths']['registry']
+    return join(path, _INDEX_FILENAME)
+
+
+def _stat(path):
+    stats = stat(path)
+    return stats.st_mtime, stats.st_size
+
+
+def _find_offsets(raw, etrees):
+    """Find the byte range of each activity in the raw XML.
+
+    Returns the root element prolog, and a list of
+    ``(start, end)`` tuples, or ``(None, [])`` if the activities
+    couldn't be reliably located.
+    """
+    root_match = _ROOT_RE.search(raw)
+    if not root_match:
+        return None, []
+    prolog = raw[:root_match.end()]
+    parser = ET.XMLParser(huge_tree=True)
+    offsets = []
+    line = 1
+    pos = 0
+    idx = root_match.end()
+    for etree in etrees:
+        start_match = _ACTIVITY_START_RE.search(raw, idx)
+        if not start_match:
+            return None, []
+        start = start_match.start()
+        line += raw.count(b'\n', pos, start)
+        pos = start
+        if line != etree.sourceline:
+            return None, []
+        if start_match.group(1):
+            end = start_match.end()
+        else:
+            end_match = _ACTIVITY_END_RE.search(raw, start_match.end())
+            if not end_match:
+                return None, []
+            end = end_match.end()
+            if b'<!' in raw[start:end] or b'<?' in raw[start:end]:
+                # the end tag may be inside a comment, CDATA section
+                # or processing instruction, so check the fragment
+                try:
+                    ET.fromstring(prolog + raw[start:end] +
+                                  b'</iati-activities>', parser)
+                except ET.XMLSyntaxError:
+                    return None, []
+        offsets.append((start, end))
+        idx = end
+    return prolog, offsets
+
+
+def _date_value(etree, date_type):
+    expr = 'number(translate({expr}, "-", ""))'.format(expr=date_type.get())
+    value = compile_xpath(expr)(etree)
+    return None if isnan(value) else value
+
+
+class ActivityIndex(object):
+    """An on-disk index of the activities in the local registry cache.
+
+    The index stores one row per activity, so that ``ActivitySet``
+    filters can be answered without parsing every dataset. Only the
+    matching activities are then loaded from disk.
+
+    Build (or refresh) the index using ``iatikit.index.build()``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute('PRAGMA foreign_keys = ON')
+
+    def __repr__(self):
+        return '<{} ({})>'.format(self.__class__.__name__, self.path)
+
+    @classmethod
+    def open(cls, path=None):
+        """Return the index for the registry at ``path``,
+        or ``None`` if it hasn't been built.
+        """
+        index_path = _index_path(path)
+        if not exists(index_path):
+            return None
+        return cls(index_path)
+
+    def close(self):
+        self._conn.close()
+
+    def _dataset_row(self, dataset):
+        """Return the index row for ``dataset``, or ``None`` if
+        it isn't indexed or the file has changed since indexing.
+        """
+        if not dataset.data_path or not exists(dataset.data_path):
+            return None
+        row = self._conn.execute(
+            'SELECT id, version, mtime, size, prolog FROM datasets ' +
+            'WHERE path = ?', (abspath(dataset.data_path),)).fetchone()
+        if row is None:
+            return None
+        if (row[2], row[3]) != _stat(dataset.data_path):
+            return None
+        return row
+
+    def _conditions(self, schema, wheres):
+        """Translate ``ActivitySet`` filters into SQL conditions.
+
+        Returns ``None`` if any filter can't be answered by the index.
+        """
+        conditions = []
+        params = []
+        for key, values in wheres.items():
+            shortcut, _, operation = key.partition('__')
+            operation = operation or 'eq'
+            for value in values:
+                condition = self._condition(schema, shortcut,
+                                            operation, value)
+                if condition is None:
+                    return None
+                conditions.append(condition[0])
+                params += condition[1]
+        return conditions, params
+
+    @staticmethod
+    def _condition(schema, shortcut, operation, value):
+        # pylint: disable=too-many-return-statements
+        if shortcut in ['id', 'iati_identifier']:
+            tmpl = 'EXISTS (SELECT 1 FROM identifiers i ' + \
+                   'WHERE i.activity_id = a.id{})'
+            if operation == 'exists':
+                return ('{}' if value else 'NOT {}').format(
+                    tmpl.format('')), []
+            condition = {
+                'eq': ' AND i.value = ?',
+                'startswith': ' AND substr(i.value, 1, length(?)) = ?',
+                'contains': ' AND instr(i.value, ?) > 0',
+            }.get(operation)
+            if condition is None:
+                return None
+            return tmpl.format(condition), \
+                [str(value)] * condition.count('?')
+        elif shortcut in _DATE_FIELDS:
+            operator = {
+                'lt': '<', 'lte': '<=',
+                'gt': '>', 'gte': '>=',
+                'eq': '=',
+            }.get(operation)
+            if operator is None:
+                return None
+            try:
+                number = float(str(value).replace('-', ''))
+            except ValueError:
+                return None
+            return 'a.{} {} ?'.format(shortcut, operator), [number]
+        elif shortcut == 'humanitarian':
+            if operation != 'eq' or value is not bool(value):
+                return None
+            if value:
+                return 'a.humanitarian', []
+            return 'a.not_humanitarian', []
+        elif shortcut == 'sector':
+            return ActivityIndex._sector_condition(
+                schema, operation, value)
+        return None
+
+    @staticmethod
+    def _sector_condition(schema, operation, value):
+        if not isinstance(value, Sector):
+            return None
+        condition = schema.sector().condition
+        conditions = []
+        params = []
+        if operation == 'in':
+            if value.vocabulary is None or value.vocabulary.code != '2':
+                return None
+            codes = [c.code for c in CodelistSet().get('Sector').where(
+                category=value.code.code).all()]
+            conditions.append('s.code IN ({})'.format(
+                ', '.join(['?'] * len(codes))))
+            params += codes
+            vocabularies = condition.get('1')
+        elif operation == 'eq':
+            code = getattr(value.code, 'code', value.code)
+            if code is not None:
+                conditions.append('s.code = ?')
+                params.append(code)
+            vocabularies = None
+            if value.vocabulary is not None:
+                vocabularies = condition.get(value.vocabulary.code,
+                                             value.vocabulary.code)
+        else:
+            return None
+        if operation == 'in' or value.vocabulary is not None:
+            if not isinstance(vocabularies, list):
+                vocabularies = [vocabularies]
+            vocab_conditions = []
+            for vocabulary in vocabularies:
+                if vocabulary is None:
+                    vocab_conditions.append('s.vocabulary IS NULL')
+                else:
+                    vocab_conditions.append('s.vocabulary = ?')
+                    params.append(vocabulary)
+            conditions.append('({})'.format(' OR '.join(vocab_conditions)))
+        if not conditions:
+            conditions.append('1')
+        tmpl = 'EXISTS (SELECT 1 FROM sectors s ' + \
+               'WHERE s.activity_id = a.id AND {})'
+        return tmpl.format(' AND '.join(conditions)), params
+
+    def _query(self, dataset, wheres, select):
+        row = self._dataset_row(dataset)
+        if row is None:
+            return None
+        dataset_id, version = row[0], row[1]
+        try:
+            schema = get_schema('activity', version)
+        except SchemaError:
+            return None
+        conditions = self._conditions(schema, wheres)
+        if conditions is None:
+            return None
+        conditions, params = conditions
+        sql = 'SELECT {select} FROM activities a ' + \
+              'WHERE a.dataset_id = ?{conditions} ORDER BY a.position'
+        sql = sql.format(
+            select=select,
+            conditions=''.join([' AND ' + x for x in conditions]))
+        return row, schema, self._conn.execute(
+            sql, [dataset_id] + params).fetchall()
+
+    def count(self, dataset, wheres):
+        """Return the number of activities in ``dataset`` matching
+        ``wheres``, or ``None`` if the index can't answer the query.
+        """
+        result = self._query(dataset, wheres, 'COUNT(*)')
+        if result is None:
+            return None
+        return result[2][0][0]
+
+    def positions(self, dataset, wheres):
+        """Return a tuple of the activity schema and a list of the
+        positions of activities in ``dataset`` matching ``wheres``.
+
+        Returns ``None`` if the index can't answer the query.
+        """
+        result = self._query(dataset, wheres, 'a.position')
+        if result is None:
+            return None
+        _, schema, matches = result
+        return schema, [x[0] for x in matches]
+
+    def activities(self, dataset, wheres):
+        """Return a tuple of the activity schema and a list of
+        activity element trees in ``dataset`` matching ``wheres``.
+
+        Returns ``None`` if the index can't answer the query.
+        """
+        result = self._query(
+            dataset, wheres, 'a.position, a.start_offset, a.end_offset')
+        if result is None:
+            return None
+        row, schema, matches = result
+        return schema, self._load(dataset, row[4], matches)
+
+    def load(self, dataset, positions):
+        """Return a list of the activity element trees at
+        ``positions`` in ``dataset``.
+
+        Returns ``None`` if ``dataset`` isn't indexed.
+        """
+        row = self._dataset_row(dataset)
+        if row is None:
+            return None
+        offsets = {x[0]: x for x in self._conn.execute(
+            'SELECT position, start_offset, end_offset FROM activities ' +
+            'WHERE dataset_id = ?', (row[0],))}
+        try:
+            matches = [offsets[x] for x in positions]
+        except KeyError:
+            return None
+        return self._load(dataset, row[4], matches)
+
+    @staticmethod
+    def _load(dataset, prolog, matches):
+        """Load the activities in ``matches`` (a list of
+        ``(position, start, end)`` tuples) from ``dataset``.
+        """
+        if not matches:
+            return []
+        if prolog is None:
+            all_etrees = dataset.etree.xpath(
+                '/iati-activities/iati-activity')
+            return [all_etrees[x[0]] for x in matches]
+        etrees = []
+        parser = ET.XMLParser(remove_blank_text=True, huge_tree=True)
+        with open(dataset.data_path, 'rb') as handler:
+            for _, start, end in matches:
+                handler.seek(start)
+                fragment = prolog + handler.read(end - start) + \
+                    b'</iati-activities>'
+                try:
+                    etrees.append(ET.fromstring(fragment, parser)[0])
+                except ET.XMLSyntaxError:
+                    # the offsets are wrong, so load the activities
+                    # from the full dataset instead
+                    logging.getLogger(__name__).warning(
+                        'Couldn\'t load indexed activities from dataset '
+                        '"%s". Rebuild the index using '
+                        'iatikit.index.build(rebuild=True).', dataset.name)
+                    all_etrees = dataset.etree.xpath(
+                        '/iati-activities/iati-activity')
+                    return [all_etrees[x[0]] for x in matches]
+        return etrees
+
+    def _remove_dataset(self, path):
+        self._conn.execute('DELETE FROM datasets WHERE path = ?', (path,))
+
+    def _add_dataset(self, dataset):
+        try:
+            schema = get_schema('activity', dataset.version)
+        except SchemaError:
+            return False
+        path = abspath(dataset.data_path)
+        mtime, size = _stat(dataset.data_path)
+        etrees = dataset.etree.xpath('/iati-activities/iati-activity')
+        if compression.compression(dataset.data_path):
+            # compressed files can't be read from an offset, so
+            # activities are loaded from the full dataset
+            prolog, offsets = None, [(None, None)] * len(etrees)
+        else:
+            with open(dataset.data_path, 'rb') as handler:
+                prolog, offsets = _find_offsets(handler.read(), etrees)
+            if prolog is None:
+                logging.getLogger(__name__).warning(
+                    'Couldn\'t locate activities in dataset "%s". '
+                    'Activities will be loaded from the full dataset.',
+                    dataset.name)
+                offsets = [(None, None)] * len(etrees)
+
+        cursor = self._conn.execute(
+            'INSERT INTO datasets (path, name, publisher, version, ' +
+            'mtime, size, prolog) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (path, dataset.name, basename(dirname(path)), schema.version,
+             mtime, size, prolog))
+        dataset_id = cursor.lastrowid
+
+        hum_true = compile_xpath(
+            schema.humanitarian().where('eq', True, {}))
+        hum_false = compile_xpath(
+            schema.humanitarian().where('eq', False, {}))
+        identifiers_xpath = compile_xpath(schema.iati_identifier().get())
+        sectors_xpath = compile_xpath(schema.sector().get())
+        for position, (etree, offset) in enumerate(zip(etrees, offsets)):
+            identifiers = identifiers_xpath(etree)
+            cursor = self._conn.execute(
+                'INSERT INTO activities (dataset_id, position, ' +
+                'iati_identifier, planned_start, actual_start, ' +
+                'planned_end, actual_end, humanitarian, ' +
+                'not_humanitarian, start_offset, end_offset) ' +
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [dataset_id, position,
+                 identifiers[0].strip() if identifiers else None] +
+                [_date_value(etree, getattr(schema, x)())
+                 for x in _DATE_FIELDS] +
+                [bool(hum_true(etree)), bool(hum_false(etree)),
+                 offset[0], offset[1]])
+            activity_id = cursor.lastrowid
+            self._conn.executemany(
+                'INSERT INTO identifiers (activity_id, value) ' +
+                'VALUES (?, ?)',
+                [(activity_id, str(x)) for x in identifiers])
+            self._conn.executemany(
+                'INSERT INTO sectors (activity_id, code, vocabulary) ' +
+                'VALUES (?, ?, ?)',
+                [(activity_id, x.get('code'), x.get('vocabulary'))
+                 for x in sectors_xpath(etree)])
+        return True
+
+    def update(self, datasets):
+        """Add ``datasets`` to the index.
+
+        Datasets that are already indexed and unchanged on disk are
+        skipped, and indexed datasets no longer present are removed.
+        """
+        indexed = dict(self._conn.execute(
+            'SELECT path, id FROM datasets').fetchall())
+        seen = set()
+        for dataset in datasets:
+            if not dataset.data_path:
+                continue
+            path = abspath(dataset.data_path)
+            seen.add(path)
+            if path in indexed:
+                if self._dataset_row(dataset) is not None:
+                    continue
+                self._remove_dataset(path)
+            if dataset.filetype != 'activity':
+                continue
+            if not dataset.validate_xml():
+                continue
+            self._add_dataset(dataset)
+            self._conn.commit()
+        for path in set(indexed.keys()) - seen:
+            self._remove_dataset(path)
+        self._conn.commit()
+
+    @classmethod
+    def create(cls, path=None):
+        """Create a new, empty index for the registry at ``path``."""
+        index_path = _index_path(path)
+        if exists(index_path):
+            _unlink(index_path)
+        index = cls(index_path)
+        index._conn.executescript(_SCHEMA_SQL)
+        return index
+
+
+class ActivityIndexes(object):
+    """The activity indexes for the datasets in a set.
+
+    Each dataset is looked up in the index of the registry that
+    contains it, so sets from any registry path use that registry's
+    index. Indexes are opened when first needed, and kept open until
+    ``close()`` is called.
+    """
+
+    def __init__(self):
+        self._indexes = {}
+
+    def get(self, dataset):
+        """Return the index for the registry containing ``dataset``,
+        or ``None`` if there isn't one.
+        """
+        if not dataset.data_path:
+            return None
+        # datasets are stored at ``<registry>/data/<publisher>/``
+        path = dirname(dirname(dirname(abspath(dataset.data_path))))
+        if path not in self._indexes:
+            self._indexes[path] = ActivityIndex.open(path)
+        return self._indexes[path]
+
+    def close(self):
+        for index in self._indexes.values():
+            if index is not None:
+                index.close()
+        self._indexes = {}
+
+
+def build(path=None, rebuild=False):
+    """Build or refresh the activity index for the local registry cache.
+
+    By default, only new and changed datasets are (re)indexed.
+    Set ``rebuild=True`` to index everything from scratch.
+    """
+    # imported here to avoid a circular import
+    from ..data.dataset import DatasetSet
+
+    if path is None:
+        path = CONFIG['paths']['registry']
+    index = None if rebuild else ActivityIndex.open(path)
+    if index is None:
+        index = ActivityIndex.create(path)
+
+    logging.getLogger(__name__).info('Indexing IATI activities...')
+    datasets = DatasetSet(join(path, 'data', '*', '*'),
+                          join(path, 'metadata', '*', '*'),
+                          manifest=get_manifest(path))
+    try:
+        index.update(datasets)
+    finally:
+        index.close()
@@ -0,0 +1,250 @@
+from fnmatch import fnmatch
+from glob import glob, has_magic
+import json
+import logging
+from os import listdir, replace, stat
+from os.path import abspath, dirname, exists, isdir, join, relpath, sep
+from threading import Lock
+
+from lxml import etree as ET
+
+from .config import CONFIG
+
+
+_MANIFEST_FILENAME = 'manifest.json'
+
+_MANIFESTS = {}
+
+
+class Manifest(object):
+    """A cached listing of the files in the local registry cache.
+
+    The manifest stores the contents of each directory, along with
+    the size, modification time, filetype and version of each
+    dataset. Directory listings are only refreshed when the
+    directory's modification time changes. Dataset details are only
+    checked again when the directories containing the dataset's
+    files change, which happens whenever files are added, removed
+    or replaced (as downloads do). Files edited in place aren't
+    noticed until ``build()`` is run.
+
+    Changes to the manifest are saved opportunistically while
+    reading. If the registry cache isn't writable, they're kept in
+    memory instead.
+
+    Manifests are shared (rather than copied) between sets.
+    """
+
+    def __init__(self, path):
+        self.path = abspath(path)
+        self.filepath = join(self.path, _MANIFEST_FILENAME)
+        self._dirs = {}
+        self._datasets = {}
+        self._dirty = False
+        self._lock = Lock()
+        if exists(self.filepath):
+            with open(self.filepath) as handler:
+                j = json.load(handler)
+            self._dirs = j.get('dirs', {})
+            self._datasets = j.get('datasets', {})
+
+    def __repr__(self):
+        return '<{} ({})>'.format(self.__class__.__name__, self.path)
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def save(self, ignore_errors=False):
+        """Write the manifest to disk, if it has changed.
+
+        If ``ignore_errors`` is true, failing to write the manifest
+        (e.g. because the registry cache is read-only) isn't an
+        error.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            tmp_filepath = self.filepath + '.tmp'
+            try:
+                with open(tmp_filepath, 'w') as handler:
+                    json.dump({
+                        'dirs': self._dirs,
+                        'datasets': self._datasets,
+                    }, handler)
+                replace(tmp_filepath, self.filepath)
+            except OSError:
+                if not ignore_errors:
+                    raise
+                logging.getLogger(__name__).debug(
+                    'Couldn\'t save the manifest at %s', self.filepath)
+                return
+            self._dirty = False
+
+    def _rel(self, path):
+        return relpath(abspath(path), self.path)
+
+    def listdir(self, path):
+        """Return a dictionary of the names of entries in the directory
+        at ``path``, mapped to whether or not each is a directory.
+        """
+        key = self._rel(path)
+        try:
+            mtime = stat(path).st_mtime
+        except OSError:
+            return {}
+        listing = self._dirs.get(key)
+        if listing is None or listing['mtime'] != mtime:
+            entries = {x: isdir(join(path, x)) for x in listdir(path)}
+            with self._lock:
+                self._dirs[key] = {'mtime': mtime, 'entries': entries}
+                self._dirty = True
+            return entries
+        return listing['entries']
+
+    def glob(self, pattern):
+        """Return a list of paths matching ``pattern``,
+        like ``glob.glob``.
+
+        Patterns outside of the registry are passed to ``glob.glob``.
+        """
+        rel_pattern = self._rel(pattern)
+        if rel_pattern.startswith('..') or \
+                not pattern.endswith(rel_pattern):
+            return glob(pattern)
+        paths = [self.path]
+        parts = rel_pattern.split(sep)
+        for idx, part in enumerate(parts):
+            last = idx == len(parts) - 1
+            matches = []
+            if not has_magic(part):
+                for path in paths:
+                    path = join(path, part)
+                    if exists(path) if last else isdir(path):
+                        matches.append(path)
+                paths = matches
+                continue
+            for path in paths:
+                entries = self.listdir(path)
+                for name, is_dir in sorted(entries.items()):
+                    if not last and not is_dir:
+                        continue
+                    if fnmatch(name, part) and not name.startswith('.'):
+                        matches.append(join(path, name))
+            paths = matches
+        self.save(ignore_errors=True)
+        # mirror the form of the paths returned by ``glob.glob``
+        prefix = pattern[:len(pattern) - len(rel_pattern)]
+        return [prefix + relpath(x, self.path) for x in paths]
+
+    def _dir_mtime(self, path):
+        """Return the modification time of the directory containing
+        ``path``, as recorded when it was last listed.
+        """
+        directory = dirname(path)
+        listing = self._dirs.get(self._rel(directory))
+        if listing is not None:
+            return listing['mtime']
+        try:
+            return stat(directory).st_mtime
+        except OSError:
+            return None
+
+    def dataset_info(self, dataset):
+        """Return a dictionary of cached details for ``dataset``.
+
+        The dataset's files are only checked if the directories
+        containing them have changed. The details are recalculated
+        if the files themselves have changed.
+        """
+        key = self._rel(dataset.data_path)
+        dir_mtimes = [
+            self._dir_mtime(dataset.data_path),
+            self._dir_mtime(dataset.metadata_path)
+            if dataset.metadata_path else None,
+        ]
+        info = self._datasets.get(key)
+        if info is not None and info.get('dir_mtimes') == dir_mtimes:
+            return info
+        data_stat = stat(dataset.data_path)
+        metadata_mtime = stat(dataset.metadata_path).st_mtime \
+            if dataset.metadata_path and exists(dataset.metadata_path) \
+            else None
+        if info is not None and info['size'] == data_stat.st_size and \
+                info['mtime'] == data_stat.st_mtime and \
+                info['metadata_mtime'] == metadata_mtime:
+            info = dict(info, dir_mtimes=dir_mtimes)
+            with self._lock:
+                self._datasets[key] = info
+                self._dirty = True
+        else:
+            try:
+                root, version = dataset._sniff_root()
+            except ET.XMLSyntaxError:
+                root, version = None, None
+            info = {
+                'size': data_stat.st_size,
+                'mtime': data_stat.st_mtime,
+                'metadata_mtime': metadata_mtime,
+                'filetype': dataset.filetype,
+                'root': root,
+                'version': version,
+                'dir_mtimes': dir_mtimes,
+            }
+            with self._lock:
+                self._datasets[key] = info
+                self._dirty = True
+        return info
+
+    def apply(self, dataset):
+        """Set the filetype and root details of ``dataset``
+        from the manifest.
+        """
+        if not dataset.data_path:
+            return dataset
+        info = self.dataset_info(dataset)
+        if info['filetype'] is not None:
+            dataset._filetype = info['filetype']
+        if info['root'] is not None:
+            dataset._root = (info['root'], info['version'])
+        return dataset
+
+
+def get_manifest(path=None):
+    """Return the shared manifest for the registry at ``path``,
+    or ``None`` if it hasn't been built.
+    """
+    if path is None:
+        path = CONFIG['paths']['registry']
+    path = abspath(path)
+    if not exists(join(path, _MANIFEST_FILENAME)):
+        _MANIFESTS.pop(path, None)
+        return None
+    if path not in _MANIFESTS:
+        _MANIFESTS[path] = Manifest(path)
+    return _MANIFESTS[path]
+
+
+def build(path=None):
+    """Build the manifest for the registry at ``path``,
+    from scratch.
+    """
+    # imported here to avoid a circular import
+    from ..data.dataset import DatasetSet
+
+    if path is None:
+        path = CONFIG['paths']['registry']
+    path = abspath(path)
+    _MANIFESTS.pop(path, None)
+    manifest = Manifest(path)
+    manifest._dirs = {}
+    manifest._datasets = {}
+    manifest._dirty = True
+    datasets = DatasetSet(join(path, 'data', '*', '*'),
+                          join(path, 'metadata', '*', '*'),
+                          manifest=manifest)
+    # iterating over the datasets populates the manifest
+    for _ in datasets:
+        pass
+    manifest.save()
+    _MANIFESTS[path] = manifest
+    return manifest
@@ -0,0 +1,118 @@
+from collections import deque
+from copy import copy
+from multiprocessing import Pool
+
+from lxml import etree as ET
+
+from ..standard.schema import get_schema
+from .cache import tree_cache
+from .config import CONFIG
+from .exceptions import SchemaError
+
+
+# the number of datasets queued per worker
+_QUEUED_PER_WORKER = 4
+
+
+def _config():
+    """Return the current config, as a dictionary that can be sent
+    to worker processes.
+    """
+    return {section: dict(CONFIG[section])
+            for section in CONFIG.sections()}
+
+
+def _init_worker(config):
+    # make sure workers see the same config as the parent,
+    # even if they weren't forked from it
+    CONFIG.read_dict(config)
+
+
+def _run(task):
+    """Run a query over a single dataset, in a worker process.
+
+    Returns the dataset version, and either the number of matching
+    items, a list of handles for the matching items, or a list of the
+    matching items as serialised XML (depending on ``mode``).
+    """
+    item_set, dataset_class, data_path, metadata_path, mode = task
+    dataset = dataset_class(data_path, metadata_path)
+    item_set.datasets = [dataset]
+    try:
+        if mode == 'count':
+            return None, len(item_set)
+        if mode == 'handles':
+            return None, list(item_set._handles())
+        items = [item for item in item_set]
+        if not items:
+            return None, []
+        return items[0].version, [ET.tostring(item.etree)
+                                  for item in items]
+    finally:
+        # the pool only lasts for one scan, so cached trees would
+        # never be reused. Don't let them build up in the worker
+        tree_cache.clear()
+
+
+def _tasks(item_set, mode):
+    template = copy(item_set)
+    template.datasets = None
+    template._workers = None
+    for dataset in item_set.datasets:
+        yield dataset, (template, dataset.__class__, dataset.data_path,
+                        dataset.metadata_path, mode)
+
+
+def _imap(item_set, mode):
+    """Run ``_run`` over each dataset in ``item_set``, yielding
+    ``(dataset, result)`` pairs in order.
+
+    Only a few datasets per worker are queued at a time, so the
+    datasets (and results) aren't all held in memory at once.
+    """
+    max_queued = item_set._workers * _QUEUED_PER_WORKER
+    queued = deque()
+    with Pool(item_set._workers, _init_worker, (_config(),)) as pool:
+        for dataset, task in _tasks(item_set, mode):
+            queued.append((dataset, pool.apply_async(_run, (task,))))
+            if len(queued) >= max_queued:
+                dataset, result = queued.popleft()
+                yield dataset, result.get()
+        while queued:
+            dataset, result = queued.popleft()
+            yield dataset, result.get()
+
+
+def count(item_set):
+    """Count the items in ``item_set``, spreading datasets
+    across a process pool.
+    """
+    return sum(total for _, (_, total) in _imap(item_set, 'count'))
+
+
+def iterate(item_set):
+    """Iterate over the items in ``item_set``, spreading datasets
+    across a process pool.
+
+    Results are streamed back in the same order as a serial scan.
+    """
+    parser = ET.XMLParser(remove_blank_text=True, huge_tree=True)
+    for dataset, (version, items) in _imap(item_set, 'items'):
+        if not items:
+            continue
+        try:
+            schema = get_schema(item_set._filetype, version)
+        except SchemaError:
+            continue
+        for xml in items:
+            yield item_set._instance_class(
+                ET.fromstring(xml, parser), dataset, schema)
+
+
+def handles(item_set):
+    """Yield a ``(source, position)`` handle for each item in
+    ``item_set`` (see ``ResultSet``), spreading datasets across
+    a process pool.
+    """
+    for _, (_, items) in _imap(item_set, 'handles'):
+        yield from items
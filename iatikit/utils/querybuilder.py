@@ -1,3 +1,24 @@
+from .abstract import compile_xpath
+
+
+class XPathQuery(object):
+    """A compiled XPath query, along with the values of its variables.
+
+    Call it with an element tree to run the query.
+    """
+
+    def __init__(self, query_str, variables):
+        self.query_str = query_str
+        self.variables = variables
+        self.xpath = compile_xpath(query_str)
+
+    def __repr__(self):
+        return '<{} ({})>'.format(self.__class__.__name__, self.query_str)
+
+    def __call__(self, etree):
+        return self.xpath(etree, **self.variables)
+
+
 class XPathQueryBuilder(object):
     def __init__(self, schema, prefix='', count=False):
         self._schema = schema
@@ -8,18 +29,20 @@ class XPathQueryBuilder(object):
         query_str = self._prefix
 
         exprs = []
+        variables = {}
         for shortcut, values in kwargs.items():
             if '__' in shortcut:
                 shortcut, operator = shortcut.split('__')
             else:
                 operator = 'eq'
             for value in values:
-                expr = self.filter(shortcut, operator, value)
+                expr = self.filter(shortcut, operator, value, variables)
                 exprs.append(expr)
         query_str += ''.join(['[{}]'.format(x) for x in exprs])
         if self._count:
             query_str = 'count({})'.format(query_str)
-        return query_str
+        return XPathQuery(query_str, variables)
 
-    def filter(self, shortcut, operator, value):
-        return getattr(self._schema, shortcut)().where(operator, value)
+    def filter(self, shortcut, operator, value, variables):
+        return getattr(self._schema, shortcut)().where(
+            operator, value, variables)
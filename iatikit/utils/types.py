@@ -3,41 +3,43 @@ from datetime import datetime
 
 from ..data.sector import Sector
 from ..standard.codelist import CodelistSet, CodelistItem
-from ..utils.abstract import GenericType
+from ..utils.abstract import GenericType, compile_xpath
 
 
 class StringType(GenericType):
-    def where(self, operation, value):
+    def where(self, operation, value, variables):
         if operation in ['contains', 'startswith']:
             if operation == 'startswith':
                 operation = 'starts-with'
-            return '{expr}[{operation}(., "{value}")]'.format(
+            return '{expr}[{operation}(., {value})]'.format(
                 expr=self.get(),
                 operation=operation,
-                value=value,
+                value=self.variable(variables, str(value)),
             )
-        return super(StringType, self).where(operation, value)
+        return super(StringType, self).where(operation, value, variables)
 
 
 class DateType(GenericType):
-    def where(self, operation, value):
+    def where(self, operation, value, variables):
         operator = {
             'lt': '<', 'lte': '<=',
             'gt': '>', 'gte': '>=',
             'eq': '=',
         }.get(operation)
         if operator:
-            tmpl = 'number(translate({expr}, "-", "")) {operator} {value}'
+            tmpl = 'number(translate({expr}, "-", "")) {operator} ' + \
+                   'number({value})'
             return tmpl.format(
                 expr=self.get(),
                 operator=operator,
-                value=str(value).replace('-', ''),
+                value=self.variable(variables,
+                                    str(value).replace('-', '')),
             )
-        return super(DateType, self).where(operation, value)
+        return super(DateType, self).where(operation, value, variables)
 
     def run(self, etree):
         dates = []
-        dates_str = etree.xpath(self.get())
+        dates_str = compile_xpath(self.get())(etree)
         for date_str in dates_str:
             try:
                 dates.append(datetime.strptime(date_str, '%Y-%m-%d').date())
@@ -52,8 +54,7 @@ class SectorType(GenericType):
         super(SectorType, self).__init__(expr)
         self.condition = condition
 
-    @staticmethod
-    def _vocab_condition(conditions):
+    def _vocab_condition(self, conditions, variables):
         conditions_list = []
         if not isinstance(conditions, list):
             conditions = [conditions]
@@ -61,23 +62,25 @@ class SectorType(GenericType):
             if condition is None:
                 conditions_list.append('not(@vocabulary)')
             else:
-                conditions_list.append('@vocabulary = "{}"'.format(condition))
+                conditions_list.append('@vocabulary = {}'.format(
+                    self.variable(variables, condition)))
         conditions_str = ' or '.join(conditions_list)
         if len(conditions_list) > 1:
             conditions_str = '({})'.format(conditions_str)
         return conditions_str
 
-    def where(self, operation, value):
+    def where(self, operation, value, variables):
         if operation == 'in':
             if not isinstance(value, Sector) or value.vocabulary.code != '2':
                 raise Exception('{} is not a sector category'.format(value))
             codelist_items = CodelistSet().get('Sector').where(
                 category=value.code.code).all()
-            conditions = ' or '.join(['@code = "{code}"'.format(code=c.code)
-                                      for c in codelist_items])
+            conditions = ' or '.join([
+                '@code = {}'.format(self.variable(variables, c.code))
+                for c in codelist_items])
             conditions = ['(' + conditions + ')']
             conditions.append(
-                self._vocab_condition(self.condition.get('1')))
+                self._vocab_condition(self.condition.get('1'), variables))
             return '{expr}[{conditions}]'.format(
                 expr=self.get(),
                 conditions=' and '.join(conditions),
@@ -91,36 +94,34 @@ class SectorType(GenericType):
             else:
                 code = value.code
             if code is not None:
-                conditions.append('@code = "{code}"'.format(code=code))
+                conditions.append('@code = {}'.format(
+                    self.variable(variables, str(code))))
             if value.vocabulary is not None:
                 conds = self.condition.get(value.vocabulary.code,
                                            value.vocabulary.code)
-                conditions.append(self._vocab_condition(conds))
+                conditions.append(self._vocab_condition(conds, variables))
             return '{expr}[{conditions}]'.format(
                 expr=self.get(),
                 conditions=' and '.join(conditions),
             )
-        return super(SectorType, self).where(operation, value)
+        return super(SectorType, self).where(operation, value, variables)
 
     def run(self, etree):
-        return [Sector(x.get('code'),
-                       vocabulary=x.get('vocabulary', '1'),
-                       percentage=x.get('percentage'))
-                for x in etree.xpath(self.get())]
+        return Sector.from_elements(compile_xpath(self.get())(etree))
 
 
 class XPathType(GenericType):
-    def where(self, operation, value):
+    def where(self, operation, value, variables):
         return value
 
 
 class BooleanType(GenericType):
     def run(self, etree):
-        return etree.xpath('{expr} = "true" or {expr} = "1"'.format(
+        return compile_xpath('{expr} = "true" or {expr} = "1"'.format(
             expr=self.get(),
-        ))
+        ))(etree)
 
-    def where(self, operation, value):
+    def where(self, operation, value, variables):
         if value is not bool(value):
             raise Exception('{} is not a boolean'.format(value))
         if value:
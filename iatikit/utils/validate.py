@@ -0,0 +1,238 @@
+import argparse
+from hashlib import sha1
+import json
+import logging
+from multiprocessing import Pool, cpu_count
+from os import replace, truncate, unlink as _unlink
+from os.path import abspath, exists, relpath
+
+from ..data.registry import Registry
+from .cache import tree_cache
+from .parallel import _config, _init_worker
+
+
+# log progress after this many datasets are validated
+_PROGRESS_INTERVAL = 50
+
+
+def _hash(path):
+    hasher = sha1()
+    with open(path, 'rb') as handler:
+        for chunk in iter(lambda: handler.read(1024 * 1024), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _errors(validator):
+    return [{
+        'type': error.__class__.__name__,
+        'message': str(error),
+        'line': error.line,
+    } for error in validator.errors]
+
+
+def _validate_dataset(dataset):
+    """Run the XML, IATI schema and codelist checks on ``dataset``,
+    and return the results as a dictionary.
+    """
+    result = {
+        'name': dataset.name,
+        'filetype': dataset.filetype,
+        'version': None,
+    }
+    xml_result = dataset.validate_xml()
+    if xml_result:
+        result['version'] = dataset.version
+    for check, validator in [
+            ('xml', xml_result),
+            ('iati', dataset.validate_iati()),
+            ('codelists', dataset.validate_codelists())]:
+        result[check] = {
+            'valid': bool(validator),
+            'errors': _errors(validator),
+        }
+    return result
+
+
+def _run(task):
+    """Validate a single dataset, in a worker process.
+
+    Returns ``None`` as the result if the dataset is unchanged since
+    it was last validated.
+    """
+    key, dataset_class, data_path, metadata_path, cached, last_hash = task
+    hash_ = _hash(data_path) if data_path and exists(data_path) else None
+    if cached and hash_ == last_hash:
+        return key, hash_, None
+    dataset = dataset_class(data_path, metadata_path)
+    result = _validate_dataset(dataset)
+    # don't let trees from finished datasets build up in the worker
+    tree_cache.clear()
+    return key, hash_, result
+
+
+def _load_state(state_path):
+    """Return the hash of each dataset with a saved result, from the
+    log of results at ``state_path``.
+    """
+    state = {}
+    if not exists(state_path):
+        return state
+    with open(state_path) as handler:
+        for line in handler:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # cut short by an interrupted run
+                continue
+            state[entry['dataset']] = entry['hash']
+    return state
+
+
+def _index_results(results_path):
+    """Return the offset and hash of the last result for each dataset
+    in the JSON lines file at ``results_path``, along with the offset
+    of the end of the last complete line.
+    """
+    index = {}
+    offset = 0
+    if not exists(results_path):
+        return index, offset
+    with open(results_path, 'rb') as handler:
+        for line in handler:
+            if not line.endswith(b'\n'):
+                # cut short by an interrupted run
+                break
+            result = json.loads(line)
+            index[result['dataset']] = (offset, result['hash'])
+            offset += len(line)
+    return index, offset
+
+
+def _finish(output_path, partial_path, state_path, written):
+    """Write the latest result for each dataset in ``written`` to
+    ``output_path``, and rewrite the log at ``state_path`` to match.
+    """
+    tmp_path = output_path + '.tmp'
+    with open(partial_path, 'rb') as source, \
+            open(tmp_path, 'wb') as handler:
+        for offset, _ in sorted(written.values()):
+            source.seek(offset)
+            handler.write(source.readline())
+    replace(tmp_path, output_path)
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w') as handler:
+        for key, (_, hash_) in written.items():
+            handler.write(json.dumps({'dataset': key, 'hash': hash_}) + '\n')
+    replace(tmp_path, state_path)
+    _unlink(partial_path)
+
+
+def validate_registry(output_path, path=None, workers=None,
+                      state_path=None):
+    """Validate every dataset on the registry, using a pool of
+    ``workers`` processes.
+
+    Each dataset's XML, IATI schema and codelist validation results
+    are written to ``output_path``, as one line of JSON per dataset.
+    While the registry is being validated, results are appended to
+    ``output_path`` with ``.partial`` appended, and ``output_path`` is
+    only replaced when every dataset is done.
+
+    Progress is logged to ``state_path`` (by default, ``output_path``
+    with ``.state`` appended), along with a hash of each dataset. If a
+    run is interrupted, running it again picks up where it left off.
+    Datasets that are unchanged since they were last validated aren't
+    validated again – their previous results are copied from the
+    last output instead.
+
+    Returns a dictionary with the number of datasets that were
+    validated, and the number that were skipped.
+    """
+    if state_path is None:
+        state_path = output_path + '.state'
+    if workers is None:
+        workers = cpu_count()
+    partial_path = output_path + '.partial'
+    registry = Registry(path)
+    registry_path = abspath(registry.path)
+    state = _load_state(state_path)
+    previous, _ = _index_results(output_path)
+    partial, offset = _index_results(partial_path)
+    if exists(partial_path):
+        # drop any line cut short by an interrupted run
+        truncate(partial_path, offset)
+    counts = {'validated': 0, 'skipped': 0}
+    # the offset and hash of each result written by this run
+    written = {}
+
+    def saved(key, hash_):
+        # return the file and offset of a saved result for ``key``
+        for results_path, results in [(partial_path, partial),
+                                      (output_path, previous)]:
+            if key in results and results[key][1] == hash_:
+                return results_path, results[key][0]
+        return None
+
+    def tasks():
+        for dataset in registry.datasets:
+            key = relpath(abspath(dataset.data_path or
+                                  dataset.metadata_path), registry_path)
+            last_hash = state.get(key)
+            cached = key in state and saved(key, last_hash) is not None
+            yield (key, dataset.__class__, dataset.data_path,
+                   dataset.metadata_path, cached, last_hash)
+
+    with open(partial_path, 'ab') as handler, \
+            open(state_path, 'a') as state_handler, \
+            Pool(workers, _init_worker, (_config(),)) as pool:
+        for key, hash_, result in pool.imap_unordered(_run, tasks()):
+            if result is None:
+                counts['skipped'] += 1
+                results_path, result_offset = saved(key, hash_)
+                if results_path == partial_path:
+                    # already written by an interrupted run
+                    written[key] = (result_offset, hash_)
+                    continue
+                with open(results_path, 'rb') as source:
+                    source.seek(result_offset)
+                    line = source.readline()
+            else:
+                counts['validated'] += 1
+                if counts['validated'] % _PROGRESS_INTERVAL == 0:
+                    logging.getLogger(__name__).info(
+                        'Validated %d datasets', counts['validated'])
+                line = (json.dumps(dict(result, dataset=key, hash=hash_)) +
+                        '\n').encode()
+            handler.write(line)
+            handler.flush()
+            written[key] = (offset, hash_)
+            offset += len(line)
+            state_handler.write(
+                json.dumps({'dataset': key, 'hash': hash_}) + '\n')
+            state_handler.flush()
+    _finish(output_path, partial_path, state_path, written)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Validate every dataset on the IATI registry.')
+    parser.add_argument('output',
+                        help='file to write results to, as JSON lines')
+    parser.add_argument('--registry',
+                        help='path to the local registry data')
+    parser.add_argument('--workers', type=int,
+                        help='number of worker processes')
+    parser.add_argument('--state',
+                        help='file to checkpoint progress to')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    counts = validate_registry(args.output, args.registry, args.workers,
+                               args.state)
+    print('{validated} datasets validated, {skipped} unchanged.'.format(
+        **counts))
+
+
+if __name__ == '__main__':
+    main()
@@ -21,11 +21,20 @@ setup(
     license='MIT',
     keywords='IATI',
     long_description=readme,
+    entry_points={
+        'console_scripts': [
+            'iatikit-validate=iatikit.utils.validate:main',
+        ],
+    },
     install_requires=[
         'configparser',
         'lxml',
         'requests',
     ],
+    extras_require={
+        'arrow': ['pyarrow'],
+        'zstd': ['zstandard'],
+    },
     classifiers=[
         'Development Status :: 5 - Production/Stable',
         'Intended Audience :: Developers',
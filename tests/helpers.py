@@ -4,7 +4,10 @@ import re
 
 
 class CodelistMockRequest():
-    def __init__(self, url):
+    status_code = 200
+    headers = {}
+
+    def __init__(self, url, **kwargs):
         codelist_path = join(dirname(abspath(__file__)),
                              'fixtures', 'codelist_downloads')
 
@@ -23,6 +26,11 @@ class CodelistMockRequest():
         with open(self.filepath) as handler:
             return json.load(handler)
 
+    @property
+    def content(self):
+        with open(self.filepath, 'rb') as handler:
+            return handler.read()
+
     def iter_lines(self):
         with open(self.filepath, 'rb') as handler:
             return handler.readlines()
@@ -1,5 +1,7 @@
 import datetime
 from os.path import abspath, dirname, join
+import shutil
+import tempfile
 from unittest import TestCase
 
 from mock import patch
@@ -10,6 +12,9 @@ from iatikit.data.dataset import DatasetSet, Dataset
 from iatikit.data.activity import ActivitySet, Activity
 from iatikit.standard.activity_schema import ActivitySchema105
 from iatikit.utils.config import CONFIG
+from iatikit.utils import parallel
+from iatikit.utils.cache import tree_cache
+from iatikit.utils.exceptions import FieldError
 from iatikit import Sector
 
 
@@ -36,6 +41,198 @@ class TestActivitySet(TestCase):
     def test_activities_len(self):
         assert len(self.fixture_org_acts) == 4
 
+    def test_activities_evaluate(self):
+        acts = self.fixture_org_acts.evaluate()
+        assert len(acts) == 4
+        iati_id = 'GB-COH-01234567-Humanitarian Aid-1'
+        assert acts.get(iati_id).iati_identifier == iati_id
+        assert [x.iati_identifier for x in acts[1:3]] == [
+            'GB-COH-01234567-Humanitarian Aid-0', iati_id]
+
+    def test_activities_evaluate_reloads_activities(self):
+        acts = self.fixture_org_acts.evaluate()
+        serial_ids = [x.iati_identifier for x in self.fixture_org_acts]
+        tree_cache.clear()
+        # the results don't keep the dataset trees,
+        # so they are loaded again
+        assert [x.iati_identifier for x in acts] == serial_ids
+        assert len(tree_cache) == 2
+        assert acts[-1].iati_identifier == serial_ids[-1]
+
+    def test_activities_evaluate_stream_parallel(self):
+        serial_ids = [x.iati_identifier for x in self.fixture_org_acts]
+        streamed = self.fixture_org_acts.stream().evaluate()
+        assert [x.iati_identifier for x in streamed] == serial_ids
+        assert streamed[0].dataset._etree is None
+        acts = self.fixture_org_acts.parallel(workers=2).evaluate()
+        assert [x.iati_identifier for x in acts] == serial_ids
+
+    def test_activities_query_compiled_once(self):
+        query = self.fixture_org_acts.where(
+            iati_identifier='GB-COH-01234567-1')._query()
+        other_query = self.fixture_org_acts.where(
+            iati_identifier='GB-COH-01234567-2')._query()
+        assert isinstance(query.xpath, ET.XPath)
+        assert query.xpath is other_query.xpath
+        assert query.variables == {'v0': 'GB-COH-01234567-1'}
+
+    def test_activities_filter_value_with_quotes(self):
+        acts = self.fixture_org_acts.where(title='Say "hi" it\'s me')
+        assert len(acts) == 0
+        assert acts.all() == []
+
+    def test_activities_stream(self):
+        acts = self.fixture_org_acts.stream()
+        assert len(acts) == 4
+        serial_ids = [x.iati_identifier for x in self.fixture_org_acts]
+        streamed = acts.all()
+        assert [x.iati_identifier for x in streamed] == serial_ids
+        assert streamed[0].etree.getparent() is None
+        assert streamed[0].dataset._etree is None
+
+    def test_activities_stream_filter(self):
+        acts = self.fixture_org_acts.stream().where(
+            sector=Sector('15163', vocabulary='DAC'))
+        assert len(acts) == 1
+        assert acts.all()[0].iati_identifier == 'GB-COH-01234567-1'
+
+    def test_activities_stream_parallel(self):
+        acts = self.fixture_org_acts.stream().parallel(workers=2)
+        assert len(acts.where(humanitarian=True)) == 1
+        assert len(acts.all()) == 4
+
+    def test_activities_parallel(self):
+        acts = self.fixture_org_acts.parallel(workers=2)
+        assert len(acts) == 4
+        serial_ids = [x.iati_identifier for x in self.fixture_org_acts]
+        assert [x.iati_identifier for x in acts] == serial_ids
+        assert acts.first().dataset.name == 'fixture-org-activities'
+
+    def test_activities_parallel_bounded_queue(self):
+        dataset = self.fixture_org_acts.datasets.get('fixture-org-activities')
+        queued = []
+
+        def datasets():
+            for _ in range(100):
+                queued.append(dataset)
+                yield dataset
+
+        acts = ActivitySet([]).parallel(workers=1)
+        acts.datasets = datasets()
+        iterator = iter(acts)
+        assert next(iterator).dataset is dataset
+        assert len(queued) < 100
+        iterator.close()
+
+    def test_activities_parallel_tree_cache_cleared(self):
+        acts = self.fixture_org_acts.parallel(workers=2)
+        tree_cache.clear()
+        for _, task in parallel._tasks(acts, 'items'):
+            parallel._run(task)
+            assert len(tree_cache) == 0
+
+    def test_activities_parallel_config(self):
+        tree_memory = CONFIG['cache']['tree_memory']
+        CONFIG.read_dict({'cache': {'tree_memory': '1234'}})
+        try:
+            with patch.object(parallel, 'Pool', wraps=parallel.Pool) \
+                    as fake_pool:
+                assert len(self.fixture_org_acts.parallel(workers=2)) == 4
+        finally:
+            CONFIG.read_dict({'cache': {'tree_memory': tree_memory}})
+        config = fake_pool.call_args[0][2][0]
+        assert config['cache']['tree_memory'] == '1234'
+        assert config['paths'] == dict(CONFIG['paths'])
+        assert 'download' in config
+
+    def test_activities_parallel_filter(self):
+        acts = self.fixture_org_acts.parallel(workers=2).where(
+            planned_start='2011-11-01')
+        assert len(acts) == 1
+        assert acts.all()[0].title == ['Development work']
+
+    def test_activities_values(self):
+        acts = self.fixture_org_acts.where(humanitarian=True)
+        assert list(acts.values('iati_identifier', 'start')) == [{
+            'iati_identifier': 'GB-COH-01234567-1',
+            'start': datetime.date(2011, 10, 1),
+        }]
+        values = list(self.fixture_org_acts.values())
+        assert len(values) == 4
+        assert sorted(values[0].keys()) == sorted(ActivitySet._fields)
+
+    def test_activities_values_copied(self):
+        activity = self.fixture_org_acts.first()
+        acts = self.fixture_org_acts
+        with patch.object(ActivitySet, '__iter__',
+                          side_effect=lambda: iter([activity])):
+            list(acts.values('title'))[0]['title'].append('Changed')
+            list(acts.values_list('title', flat=True))[0].append('Changed')
+            list(acts.values_list('title'))[0][0].append('Changed')
+        assert 'Changed' not in activity.title
+
+    def test_activities_values_list(self):
+        values = list(self.fixture_org_acts.values_list(
+            'iati_identifier', 'humanitarian'))
+        assert values[0] == ('GB-COH-01234567-1', True)
+        ids = list(self.fixture_org_acts.values_list(
+            'iati_identifier', flat=True))
+        assert ids == [x.iati_identifier for x in self.fixture_org_acts]
+
+    def test_activities_values_unknown_field(self):
+        with pytest.raises(FieldError):
+            self.fixture_org_acts.values('not_a_field')
+        with pytest.raises(FieldError):
+            self.fixture_org_acts.values_list('id', 'title', flat=True)
+
+    def test_activities_to_arrow(self):
+        pytest.importorskip('pyarrow')
+        table = self.fixture_org_acts.to_arrow()
+        assert table.num_rows == 4
+        assert table.column_names == [
+            'iati_identifier', 'title', 'planned_start', 'actual_start',
+            'planned_end', 'actual_end', 'sector', 'humanitarian',
+        ]
+        row = table.to_pylist()[0]
+        assert row['iati_identifier'] == 'GB-COH-01234567-1'
+        assert row['title'] == ['Development work']
+        assert row['planned_start'] == datetime.date(2011, 11, 1)
+        assert row['sector'] == [
+            {'vocabulary': '1', 'code': '15163', 'percentage': None}]
+        assert row['humanitarian'] is True
+
+    def test_activities_to_arrow_filtered(self):
+        pytest.importorskip('pyarrow')
+        acts = self.fixture_org_acts.where(humanitarian=True)
+        table = acts.to_arrow(['iati_identifier'])
+        assert table.to_pydict() == {
+            'iati_identifier': ['GB-COH-01234567-1']}
+
+    def test_activities_to_arrow_unknown_field(self):
+        pytest.importorskip('pyarrow')
+        with pytest.raises(FieldError):
+            self.fixture_org_acts.to_arrow(['not_a_field'])
+
+    def test_activities_to_parquet(self):
+        pytest.importorskip('pyarrow')
+        import pyarrow.parquet as pq
+        tmp_path = tempfile.mkdtemp()
+        try:
+            path = join(tmp_path, 'activities.parquet')
+            self.fixture_org_acts.to_parquet(
+                path, ['iati_identifier', 'start'])
+            table = pq.read_table(path)
+            assert table.num_rows == 4
+            assert table.column('start').to_pylist()[0] == \
+                datetime.date(2011, 10, 1)
+        finally:
+            shutil.rmtree(tmp_path)
+
+    def test_activities_parallel_filter_by_sector(self):
+        sector = Sector(73010, vocabulary=1)
+        acts = self.fixture_org_acts.parallel(workers=2).where(sector=sector)
+        assert len(acts) == len(self.fixture_org_acts.where(sector=sector))
+
     def test_activities_filter_by_id(self):
         iati_id = 'GB-COH-01234567-Humanitarian Aid-1'
         acts = self.fixture_org_acts.where(id=iati_id).all()
@@ -168,6 +365,16 @@ class TestActivity(TestCase):
         self.activity.show()
         fake_open_new_tab.assert_called_once_with(url)
 
+    def test_activity_properties_memoized(self):
+        title = self.activity.title
+        with patch.object(ActivitySchema105, 'title') as mock_title:
+            assert self.activity.title is title
+            assert mock_title.call_count == 0
+        start = self.activity.start
+        with patch.object(ActivitySchema105, 'actual_start') as mock_start:
+            assert self.activity.actual_start == start
+            assert mock_start.call_count == 0
+
     def test_activity_xml(self):
         xml = self.activity.xml
         first_line = '<iati-activity default-currency="GBP" ' + \
@@ -1,12 +1,16 @@
+import json
+import os
 from os.path import abspath, dirname, join
 import shutil
 import tempfile
 from unittest import TestCase
 
+from mock import patch
 import pytest
 
 import iatikit
-from iatikit.standard.codelist import CodelistSet, Codelist
+from iatikit.standard import codelist as codelist_module
+from iatikit.standard.codelist import CodelistSet, Codelist, get_store
 from iatikit.utils.exceptions import NoCodelistsError
 from iatikit.utils.config import CONFIG
 
@@ -65,6 +69,11 @@ class TestCodelistSet(TestCase):
         sector_codelist = self.codelists.find(slug='Sector')
         assert sector_codelist.slug == 'Sector'
 
+    def test_codelists_get_reused(self):
+        sector_codelist = self.codelists.get('Sector')
+        assert self.codelists.get('Sector') is sector_codelist
+        assert self.codelists.get('NotACodelist') is None
+
 
 class TestCodelist(TestCase):
     def __init__(self, *args, **kwargs):
@@ -111,3 +120,72 @@ class TestCodelist(TestCase):
         item_repr = '<CodelistItem (Reconstruction relief and ' + \
                     'rehabilitation (73010))>'
         assert str(codelist_item) == item_repr
+
+    def test_codelist_item_interned(self):
+        codelist_item = self.codelist.get('73010')
+        assert self.codelist.get('73010') is codelist_item
+        assert self.codelist.find(name=codelist_item.name) is codelist_item
+        assert self.codelist.where(category='730').first() is codelist_item
+
+    def test_codelist_item_version(self):
+        newer = self.codelist.where(version='2.03').get('73010')
+        older = self.codelist.where(version='1.03').get('73010')
+        assert newer.codelist.version == '2.03'
+        assert older.codelist.version == '1.03'
+        assert newer.codelist.wheres == {}
+        assert self.codelist.get('73010').codelist.version == '1.05'
+
+    def test_codelist_get_missing(self):
+        assert self.codelist.get('99999') is None
+        assert self.codelist.where(category='151').get('73010') is None
+
+
+class TestCodelistStore(TestCase):
+    def setUp(self):
+        fixtures_path = join(dirname(abspath(__file__)),
+                             'fixtures', 'standard')
+        self.standard_path = tempfile.mkdtemp(dir=dirname(abspath(__file__)))
+        shutil.copytree(join(fixtures_path, 'codelists'),
+                        join(self.standard_path, 'codelists'))
+        config_dict = {'paths': {'standard': self.standard_path}}
+        CONFIG.read_dict(config_dict)
+
+    def test_store_shared(self):
+        store = get_store()
+        assert CodelistSet()._store is store
+        assert Codelist('Sector', '2.03')._store is store
+        sector = CodelistSet().get('Sector').get('73010')
+        assert CodelistSet().get('Sector').get('73010') is sector
+        assert Codelist('Sector', None).where(
+            category='730').first().codelist.wheres == {}
+
+    def test_store_reloaded_when_changed(self):
+        codelist = Codelist('ActivityStatus', None)
+        assert codelist.get('1').name == 'Pipeline/identification'
+        path = join(self.standard_path, 'codelists', 'ActivityStatus.json')
+        with open(path) as handler:
+            data = json.load(handler)
+        data['data']['1']['name'] = 'Changed'
+        data['metadata']['name'] = 'Changed Activity Status'
+        with open(path, 'w') as handler:
+            json.dump(data, handler)
+        # changes are noticed after a refresh
+        get_store().refresh()
+        assert codelist.get('1').name == 'Changed'
+        assert codelist.name == 'Changed Activity Status'
+
+    def test_store_checks_throttled(self):
+        codelist = Codelist('ActivityStatus', None)
+        codelist.get('1')
+        with patch.object(codelist_module, 'stat', wraps=os.stat) \
+                as fake_stat:
+            for _ in range(10):
+                codelist.get('1')
+            get_store()
+            assert fake_stat.call_count == 0
+            get_store().refresh()
+            codelist.get('1')
+            assert fake_stat.call_count == 1
+
+    def tearDown(self):
+        shutil.rmtree(self.standard_path, ignore_errors=True)
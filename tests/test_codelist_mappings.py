@@ -0,0 +1,45 @@
+from os.path import abspath, dirname, join
+from unittest import TestCase
+
+from mock import patch
+
+from iatikit.data.dataset import Dataset
+from iatikit.standard import codelist_mappings
+from iatikit.standard.codelist_mappings import CodelistMappings
+from iatikit.utils.config import CONFIG
+
+
+class TestCodelistMappings(TestCase):
+    def setUp(self):
+        fixtures_path = join(dirname(abspath(__file__)), 'fixtures')
+        CONFIG.read_dict({'paths': {
+            'standard': join(fixtures_path, 'standard'),
+        }})
+        self.dataset = Dataset(join(fixtures_path, 'registry', 'data',
+                                    'fixture-org',
+                                    'fixture-org-activities.xml'))
+        codelist_mappings._COMPILED_RULES.clear()
+
+    def test_rules(self):
+        rules = CodelistMappings('activity', '2.03').rules
+        slugs = sorted(x.codelist.slug for x in rules)
+        assert 'ActivityStatus' in slugs
+        rule = [x for x in rules if x.codelist.slug == 'ActivityStatus'][0]
+        assert isinstance(rule.codes, frozenset)
+        assert '2' in rule.codes
+
+    def test_rules_compiled_once(self):
+        with patch.object(CodelistMappings, '_compile',
+                          autospec=True,
+                          side_effect=CodelistMappings._compile) as compile_:
+            CodelistMappings('activity', '2.03').validate(self.dataset)
+            CodelistMappings('activity', '2.03').validate(self.dataset)
+        assert compile_.call_count == 1
+
+    def test_rules_recompiled_when_changed(self):
+        mappings = CodelistMappings('activity', '2.03')
+        rules = mappings.rules
+        with patch.object(codelist_mappings, 'stat') as mock_stat:
+            mock_stat.return_value.st_mtime = 0
+            assert mappings.rules is not rules
+        assert len(codelist_mappings._COMPILED_RULES) == 1
@@ -1,9 +1,15 @@
-from os.path import abspath, dirname, join
+from os.path import abspath, dirname, getsize, join
+from shutil import rmtree
+from tempfile import mkdtemp
 from unittest import TestCase
 
 from mock import patch
+import pytest
 
+from iatikit.data.activity import ActivitySet
 from iatikit.data.dataset import DatasetSet, Dataset
+from iatikit.utils import compression
+from iatikit.utils.cache import tree_cache
 from iatikit.utils.config import CONFIG
 
 
@@ -99,6 +105,13 @@ class TestDataset(TestCase):
     def test_dataset_root(self):
         assert self.old_org_acts.root == 'iati-activities'
 
+    def test_dataset_root_without_parsing(self):
+        dataset = Dataset(self.old_org_acts.data_path)
+        assert dataset.root == 'iati-activities'
+        assert dataset.version == '1.03'
+        assert dataset.filetype == 'activity'
+        assert dataset._etree is None
+
     @patch('webbrowser.open_new_tab')
     def test_dataset_show(self, fake_open_new_tab):
         url = 'https://iatiregistry.org/dataset/old-org-acts'
@@ -114,3 +127,164 @@ class TestDataset(TestCase):
         dataset_metadata = self.old_org_acts.metadata
         assert dataset_metadata.get('extras') \
             .get('publisher_organization_type') == '21'
+
+
+class TestTreeCache(TestCase):
+    def setUp(self):
+        registry_path = join(dirname(abspath(__file__)),
+                             'fixtures', 'registry')
+        self.data_path = join(registry_path, 'data',
+                              'old-org', 'old-org-acts.xml')
+        tree_cache.clear()
+
+    def test_tree_reused(self):
+        tree = Dataset(self.data_path).etree
+        assert Dataset(self.data_path).etree is tree
+        info = tree_cache.info()
+        assert info['hits'] == 1
+        assert info['misses'] == 1
+        assert info['trees'] == 1
+
+    def test_tree_evicted(self):
+        CONFIG.read_dict({'cache': {'tree_memory': '0'}})
+        try:
+            tree = Dataset(self.data_path).etree
+            assert Dataset(self.data_path).etree is not tree
+            assert len(tree_cache) == 0
+        finally:
+            CONFIG.read_dict({'cache': {'tree_memory': '512'}})
+
+    def test_lru_eviction(self):
+        registry_path = join(dirname(abspath(__file__)),
+                             'fixtures', 'registry')
+        other_path = join(registry_path, 'data',
+                          'fixture-org', 'fixture-org-org.xml')
+        # room for either tree, but not both
+        total_size = getsize(self.data_path) + getsize(other_path)
+        tree_memory = str((total_size * 4 - 1) / 1024 / 1024)
+        CONFIG.read_dict({'cache': {'tree_memory': tree_memory}})
+        try:
+            Dataset(self.data_path).etree
+            Dataset(other_path).etree
+            assert tree_cache.evictions == 1
+            assert len(tree_cache) == 1
+            Dataset(other_path).etree
+            assert tree_cache.hits == 1
+        finally:
+            CONFIG.read_dict({'cache': {'tree_memory': '512'}})
+
+    def tearDown(self):
+        tree_cache.clear()
+
+
+class TestCompressedDatasets(TestCase):
+    def setUp(self):
+        registry_path = join(dirname(abspath(__file__)),
+                             'fixtures', 'registry')
+        self.data_path = join(registry_path, 'data', 'fixture-org')
+        self.metadata_path = join(registry_path, 'metadata', 'fixture-org')
+        self.tmp_path = mkdtemp()
+        self.datasets = DatasetSet(join(self.data_path, '*'),
+                                   join(self.metadata_path, '*'))
+        self.compressed_datasets = DatasetSet(
+            join(self.tmp_path, '*'), join(self.metadata_path, '*'))
+
+    def _compress(self, method):
+        for dataset in self.datasets:
+            with open(dataset.data_path, 'rb') as handler:
+                compression.write(
+                    handler, join(self.tmp_path, dataset.name + '.xml'),
+                    method)
+
+    def _check(self):
+        datasets = self.datasets.all()
+        compressed_datasets = self.compressed_datasets.all()
+        assert [x.name for x in compressed_datasets] == \
+            [x.name for x in datasets]
+        for dataset, compressed in zip(datasets, compressed_datasets):
+            assert compressed.data_path != dataset.data_path
+            assert compressed.filetype == dataset.filetype
+            assert compressed.version == dataset.version
+            assert compressed.raw_xml == dataset.raw_xml
+            assert compressed.xml == dataset.xml
+        activities = ActivitySet(self.compressed_datasets)
+        ids = [x.iati_identifier for x in ActivitySet(self.datasets)]
+        assert [x.iati_identifier for x in activities] == ids
+        assert [x.iati_identifier for x in activities.stream()] == ids
+
+    def test_gzip_datasets(self):
+        self._compress('gzip')
+        self._check()
+
+    def test_zstd_datasets(self):
+        pytest.importorskip('zstandard')
+        self._compress('zstd')
+        self._check()
+
+    def tearDown(self):
+        rmtree(self.tmp_path, ignore_errors=True)
+
+
+PER_ACTIVITY_XML = b'''<?xml version="1.0" encoding="UTF-8"?>
+<iati-activities version="1.03">
+  <iati-activity>
+    <iati-identifier>XM-1</iati-identifier>
+  </iati-activity>
+  <iati-activity>
+    <iati-identifier>XM-2</iati-identifier>
+    <not-an-element/>
+  </iati-activity>
+  <iati-activity>
+    <iati-identifier>XM-3</iati-identifier>
+  </iati-activity>
+</iati-activities>'''
+
+
+class TestPerActivityValidation(TestCase):
+    def setUp(self):
+        standard_path = join(dirname(abspath(__file__)), 'fixtures',
+                             'standard')
+        CONFIG.read_dict({'paths': {'standard': standard_path}})
+        self.tmp_path = mkdtemp()
+        data_path = join(self.tmp_path, 'activities.xml')
+        with open(data_path, 'wb') as handler:
+            handler.write(PER_ACTIVITY_XML)
+        self.dataset = Dataset(data_path)
+
+    def test_validate_iati_per_activity(self):
+        results = self.dataset.validate_iati(per_activity=True)
+        assert [x.id for x, _ in results] == ['XM-1', 'XM-2', 'XM-3']
+        assert [bool(x) for _, x in results] == [True, False, True]
+        errors = results[1][1].errors
+        assert len(errors) == 1
+        assert errors[0].summary == 'An unexpected element was found.'
+
+    def test_validate_iati_per_activity_matches_activities(self):
+        results = self.dataset.validate_iati(per_activity=True)
+        for activity, result in results:
+            assert bool(activity.validate_iati()) is bool(result)
+
+    def test_activity_set_validate_iati(self):
+        activities = self.dataset.activities.where(
+            iati_identifier__startswith='XM-')
+        results = list(activities.validate_iati())
+        assert len(results) == 3
+
+        activities = self.dataset.activities.where(iati_identifier='XM-2')
+        results = list(activities.validate_iati())
+        assert len(results) == 1
+        assert results[0][0].id == 'XM-2'
+        assert bool(results[0][1]) is False
+
+    def test_validate_iati_per_activity_unknown_version(self):
+        data_path = join(self.tmp_path, 'unknown-version.xml')
+        with open(data_path, 'wb') as handler:
+            handler.write(PER_ACTIVITY_XML.replace(
+                b'version="1.03"', b'version="9.99"'))
+        dataset = Dataset(data_path)
+        assert bool(dataset.validate_iati()) is False
+        assert dataset.validate_iati(per_activity=True) == []
+        assert list(dataset.activities.validate_iati()) == []
+
+    def tearDown(self):
+        rmtree(self.tmp_path)
@@ -1,7 +1,9 @@
 import json
+import os
 from os.path import abspath, dirname, join
 import shutil
 import tempfile
+import time
 from unittest import TestCase
 from mock import patch
 
@@ -86,5 +88,35 @@ class TestDownloadCodelists(TestCase):
             mappings = json.load(handler)
         assert mappings == []
 
+    @patch('requests.Session')
+    def test_download_codelists_cached_concurrently(self, mock_session):
+        requested = []
+
+        def mock_request(url, **kwargs):
+            requested.append(url)
+            response = CodelistMockRequest(url)
+            response.headers = {'ETag': '"{}"'.format(url)}
+            return response
+        mock_session.return_value.get.side_effect = mock_request
+
+        replace = os.replace
+
+        def slow_replace(source, destination):
+            # give other threads writing the same URL a chance to run
+            time.sleep(0.01)
+            replace(source, destination)
+
+        with patch.object(download, 'replace', side_effect=slow_replace):
+            download.codelists(workers=8)
+
+        # versions 1.01 and 1.02 fetch the same URLs
+        assert len(requested) > len(set(requested))
+        cache_path = join(self.standard_path, '.http_cache')
+        assert not [x for x in os.listdir(cache_path)
+                    if x.endswith('.tmp')]
+        path = join(self.standard_path, 'codelists', 'Sector.json')
+        with open(path) as handler:
+            assert len(json.load(handler)['data']) == 2
+
     def tearDown(self):
         shutil.rmtree(self.standard_path, ignore_errors=True)
@@ -1,55 +1,357 @@
-# from io import BytesIO
-# import os
-# from os.path import abspath, dirname, join
-# import shutil
-# import tempfile
-# from unittest import TestCase
-# import zipfile
-
-# from mock import patch
-
-# from iatikit.utils import download
-# from iatikit.utils.config import CONFIG
-
-
-# class MockRequest():
-#     def __init__(self, url, stream=False):
-#         registry_path = join(dirname(abspath(__file__)),
-#                              'fixtures', 'registry')
-#         self.raw = BytesIO()
-#         with zipfile.ZipFile(self.raw, 'w') as ziph:
-#             for root, _, files in os.walk(registry_path):
-#                 for file in files:
-#                     fullpath = join(root, file)
-#                     ziph.write(fullpath, join('/', 'iati-data-main', fullpath[len(registry_path) + 1:]))
-#         self.raw.seek(0)
-
-
-# class TestDownloadData(TestCase):
-#     def setUp(self):
-#         self.data_path = tempfile.mkdtemp(dir=dirname(abspath(__file__)))
-#         config_dict = {'paths': {'registry': self.data_path}}
-#         CONFIG.read_dict(config_dict)
-
-#     @patch('requests.get', MockRequest)
-#     def test_download_data(self):
-#         def list_files(path):
-#             all_files = []
-#             for root, _, files in os.walk(path):
-#                 for file in files:
-#                     all_files.append(join(root, file)[len(path):])
-#             return all_files
-
-#         download.data()
-
-#         registry_path = join(dirname(abspath(__file__)),
-#                              'fixtures', 'registry')
-#         source_files = list_files(registry_path)
-#         dest_files = list_files(self.data_path)
-
-#         assert len(source_files) == len(dest_files)
-#         for dest_file in dest_files:
-#             assert dest_file in source_files
-
-#     def tearDown(self):
-#         shutil.rmtree(self.data_path, ignore_errors=True)
+from collections import OrderedDict
+from copy import deepcopy
+import gzip
+import hashlib
+from io import BytesIO
+import json
+import os
+from os.path import abspath, dirname, exists, join
+import shutil
+import tempfile
+from unittest import TestCase
+import warnings
+import zipfile
+
+from mock import patch
+import pytest
+import requests
+
+from iatikit.data.registry import Registry
+from iatikit.utils import download
+from iatikit.utils.config import CONFIG
+
+
+class MockResponse(object):
+    def __init__(self, status_code=200, content=b'', j=None):
+        self.status_code = status_code
+        self.content = content
+        self._json = j
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def json(self):
+        return self._json
+
+    def iter_content(self, chunk_size):
+        return iter([self.content])
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(self.status_code)
+
+
+class TestDownloadDataIncremental(TestCase):
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp(dir=dirname(abspath(__file__)))
+        self.registry_path = join(self.tmp_path, 'registry')
+        shutil.copytree(join(dirname(abspath(__file__)),
+                             'fixtures', 'registry'), self.registry_path)
+        self.paths = dict(CONFIG['paths'])
+        CONFIG.read_dict({'paths': {'registry': self.registry_path}})
+
+        metadata_path = join(self.registry_path, 'metadata')
+        self.datasets = OrderedDict()
+        for org_name in ['fixture-org', 'old-org']:
+            for filename in sorted(os.listdir(join(metadata_path,
+                                                   org_name))):
+                with open(join(metadata_path, org_name,
+                               filename)) as handler:
+                    res = json.load(handler)
+                self.datasets[res['name']] = res
+        self.files = {}
+        self.requests = []
+
+    def tearDown(self):
+        CONFIG.read_dict({'paths': self.paths})
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+    def _get(self, url, **kwargs):
+        self.requests.append((url, kwargs.get('headers', {})))
+        if 'package_search' in url:
+            results = list(self.datasets.values()) \
+                if 'start=0&' in url else []
+            return MockResponse(j={'result': {'results': results}})
+        if 'group_show' in url:
+            org_slug = url.rsplit('=', 1)[-1]
+            return MockResponse(j={'result': {'name': org_slug}})
+        if url not in self.files:
+            return MockResponse(404)
+        content = self.files[url]
+        range_ = kwargs.get('headers', {}).get('Range')
+        if range_:
+            offset = int(range_[len('bytes='):-1])
+            return MockResponse(206, content[offset:])
+        return MockResponse(content=content)
+
+    def _data(self, filepath):
+        with open(join(self.registry_path, 'data', filepath), 'rb') as f:
+            return f.read()
+
+    def _set_resource(self, name, content, url=None):
+        resource = self.datasets[name]['resources'][0]
+        resource['hash'] = hashlib.sha1(content).hexdigest()
+        if url:
+            resource['url'] = url
+        self.files[resource['url']] = content
+
+    @patch('requests.Session')
+    def test_download_data_incremental(self, mock_session):
+        mock_session.return_value.get.side_effect = self._get
+        unchanged = self._data('fixture-org/fixture-org-activities.xml')
+        del self.datasets['old-org-acts']
+        self._set_resource('fixture-org-activities2', b'<changed/>')
+        self.datasets['fixture-org-new'] = deepcopy(
+            self.datasets['fixture-org-org'])
+        self.datasets['fixture-org-new']['name'] = 'fixture-org-new'
+        self._set_resource('fixture-org-new', b'<new/>',
+                           url='http://fixture.org/iati/new.xml')
+
+        download.data(incremental=True, workers=2)
+
+        urls = [url for url, _ in self.requests]
+        assert 'http://fixture.org/iati/activity.xml' not in urls
+        assert 'http://fixture.org/iati/organisation.xml' not in urls
+        assert self._data(
+            'fixture-org/fixture-org-activities.xml') == unchanged
+        assert self._data(
+            'fixture-org/fixture-org-activities2.xml') == b'<changed/>'
+        assert self._data('fixture-org/fixture-org-new.xml') == b'<new/>'
+        # removed from the registry
+        assert not exists(join(self.registry_path, 'data', 'old-org',
+                               'old-org-acts.xml'))
+        # failed to download, with no previous copy
+        assert not exists(join(self.registry_path, 'data', 'old-org',
+                               'old-org-missing-acts.xml'))
+        assert exists(join(self.registry_path, 'metadata', 'fixture-org',
+                           'fixture-org-new.json'))
+        assert exists(join(self.registry_path, 'metadata.json'))
+        assert exists(join(self.registry_path, 'manifest.json'))
+        assert not exists(self.registry_path + '.staging')
+
+    @patch('requests.Session')
+    def test_download_data_incremental_resume(self, mock_session):
+        mock_session.return_value.get.side_effect = self._get
+        self._set_resource('fixture-org-activities2', b'<changed/>')
+        resource = self.datasets['fixture-org-activities2']['resources'][0]
+
+        # the state left by an interrupted download
+        staging_path = self.registry_path + '.staging'
+        os.makedirs(join(staging_path, 'data', 'fixture-org'))
+        with open(join(staging_path, 'download-state.json'), 'w') as f:
+            json.dump({join('fixture-org', 'fixture-org-activities2'): {
+                'url': resource['url'],
+                'hash': resource['hash'],
+                'size': resource['size'],
+            }}, f)
+        with open(join(staging_path, 'data', 'fixture-org',
+                       'fixture-org-activities2.xml.part'), 'wb') as f:
+            f.write(b'<chan')
+
+        download.data(incremental=True, workers=2)
+
+        assert (resource['url'], {'Range': 'bytes=5-'}) in self.requests
+        assert self._data(
+            'fixture-org/fixture-org-activities2.xml') == b'<changed/>'
+
+    @patch('requests.Session')
+    def test_download_data_incremental_failure(self, mock_session):
+        mock_session.return_value.get.side_effect = self._get
+        previous = self._data('fixture-org/fixture-org-activities2.xml')
+        resource = self.datasets['fixture-org-activities2']['resources'][0]
+        resource['hash'] = '5' * 40
+
+        download.data(incremental=True, workers=2)
+
+        assert resource['url'] in [url for url, _ in self.requests]
+        # the previous copy is kept
+        assert self._data(
+            'fixture-org/fixture-org-activities2.xml') == previous
+
+        # and it's still out of date, so is requested again
+        del self.requests[:]
+        download.data(incremental=True, workers=2)
+        assert resource['url'] in [url for url, _ in self.requests]
+
+    @patch('requests.Session')
+    def test_download_data_incremental_failure_interrupted(
+            self, mock_session):
+        mock_session.return_value.get.side_effect = self._get
+        resource = self.datasets['fixture-org-activities2']['resources'][0]
+        resource['hash'] = '5' * 40
+
+        # interrupted while downloading a later dataset
+        later = self.datasets['old-org-acts']['resources'][0]
+        later['hash'] = '6' * 40
+
+        def interrupt(url, **kwargs):
+            if url == later['url']:
+                raise KeyboardInterrupt()
+            return self._get(url, **kwargs)
+        mock_session.return_value.get.side_effect = interrupt
+        with self.assertRaises(KeyboardInterrupt):
+            download.data(incremental=True, workers=1)
+        mock_session.return_value.get.side_effect = self._get
+
+        # the same metadata is fetched again, and the download works
+        self.files[resource['url']] = b'<changed/>'
+        del self.requests[:]
+        download.data(incremental=True, workers=2)
+        assert resource['url'] in [url for url, _ in self.requests]
+        assert self._data(
+            'fixture-org/fixture-org-activities2.xml') == b'<changed/>'
+
+    @patch('requests.Session')
+    def test_download_data_incremental_selection(self, mock_session):
+        mock_session.return_value.get.side_effect = self._get
+
+        download.data(incremental=True, workers=2,
+                      publishers=['fixture-org'], filetypes=['activity'])
+
+        assert sorted(os.listdir(join(self.registry_path, 'data'))) == [
+            'fixture-org']
+        assert sorted(os.listdir(join(self.registry_path, 'data',
+                                      'fixture-org'))) == [
+            'fixture-org-activities.xml', 'fixture-org-activities2.xml']
+        assert sorted(os.listdir(join(self.registry_path, 'metadata'))) == [
+            'fixture-org', 'fixture-org.json']
+
+    @patch('requests.Session')
+    def test_download_data_incremental_compress(self, mock_session):
+        mock_session.return_value.get.side_effect = self._get
+        unchanged = self._data('fixture-org/fixture-org-activities.xml')
+        self._set_resource('fixture-org-activities2', b'<changed/>')
+
+        download.data(incremental=True, workers=2, compress='gzip')
+
+        data_path = join(self.registry_path, 'data', 'fixture-org')
+        assert sorted(os.listdir(data_path)) == [
+            'fixture-org-activities.xml.gz',
+            'fixture-org-activities2.xml.gz',
+            'fixture-org-org.xml.gz',
+        ]
+        with gzip.open(join(data_path, 'fixture-org-activities.xml.gz')) as f:
+            assert f.read() == unchanged
+        with gzip.open(join(data_path,
+                            'fixture-org-activities2.xml.gz')) as f:
+            assert f.read() == b'<changed/>'
+
+        # compressed files are recognised as unchanged
+        del self.requests[:]
+        download.data(incremental=True, workers=2, compress='gzip')
+        assert [url for url, _ in self.requests
+                if 'fixture.org' in url] == []
+
+
+class TestDownloadDataZip(TestCase):
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp(dir=dirname(abspath(__file__)))
+        self.registry_path = join(self.tmp_path, 'registry')
+        self.paths = dict(CONFIG['paths'])
+        CONFIG.read_dict({'paths': {'registry': self.registry_path}})
+
+        fixture_path = join(dirname(abspath(__file__)),
+                            'fixtures', 'registry')
+        self.zip_file = BytesIO()
+        self.fixture_files = []
+        with zipfile.ZipFile(self.zip_file, 'w') as ziph:
+            for root, _, files in os.walk(fixture_path):
+                for file in files:
+                    fullpath = join(root, file)
+                    relpath = fullpath[len(fixture_path) + 1:]
+                    self.fixture_files.append(relpath)
+                    ziph.write(fullpath, join('iati-data-main', relpath))
+
+    def tearDown(self):
+        CONFIG.read_dict({'paths': self.paths})
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+    def _get(self, url, **kwargs):
+        response = MockResponse()
+        if url.endswith('/download'):
+            response.text = 'https://example.org/iati_dump.zip\n'
+        else:
+            self.zip_file.seek(0)
+            response.raw = self.zip_file
+        return response
+
+    def _files(self):
+        all_files = []
+        for root, _, files in os.walk(self.registry_path):
+            for file in files:
+                all_files.append(
+                    join(root, file)[len(self.registry_path) + 1:])
+        return sorted(all_files)
+
+    @patch('requests.Session')
+    def test_download_data(self, mock_session):
+        mock_session.return_value.get.side_effect = self._get
+
+        download.data()
+
+        assert self._files() == sorted(
+            self.fixture_files + ['manifest.json'])
+        assert not exists(self.registry_path + '.zip')
+
+    @patch('requests.Session')
+    def test_download_data_replaces_existing(self, mock_session):
+        mock_session.return_value.get.side_effect = self._get
+        os.makedirs(join(self.registry_path, 'data', 'gone-org'))
+
+        download.data(publishers=['old-org'])
+
+        assert not exists(join(self.registry_path, 'data', 'gone-org'))
+        assert exists(join(self.registry_path, 'data', 'old-org'))
+
+    @patch('requests.Session')
+    def test_download_data_publishers(self, mock_session):
+        mock_session.return_value.get.side_effect = self._get
+
+        download.data(publishers=['old-org'])
+
+        assert self._files() == sorted([
+            join('data', 'old-org', 'old-org-acts.xml'),
+            'manifest.json',
+            join('metadata', 'old-org', 'old-org-acts.json'),
+            join('metadata', 'old-org', 'old-org-missing-acts.json'),
+            join('metadata', 'old-org.json'),
+            'metadata.json',
+        ])
+
+    @patch('requests.Session')
+    def test_download_data_filetypes(self, mock_session):
+        mock_session.return_value.get.side_effect = self._get
+
+        download.data(filetypes=['organisation'])
+
+        assert self._files() == sorted([
+            join('data', 'fixture-org', 'fixture-org-org.xml'),
+            'manifest.json',
+            join('metadata', 'fixture-org', 'fixture-org-org.json'),
+            join('metadata', 'fixture-org.json'),
+            join('metadata', 'old-org.json'),
+            'metadata.json',
+        ])
+
+    @patch('requests.Session')
+    def test_download_data_compress(self, mock_session):
+        mock_session.return_value.get.side_effect = self._get
+
+        download.data(compress='gzip')
+
+        assert self._files() == sorted([
+            x + '.gz' if x.startswith('data') else x
+            for x in self.fixture_files] + ['manifest.json'])
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            registry = Registry(self.registry_path)
+        assert len(registry.datasets) == 5
+        activities = registry.publishers.find(name='fixture-org').activities
+        assert len(activities) == 4
+
+    def test_download_data_unknown_compression(self):
+        with pytest.raises(ValueError):
+            download.data(compress='rar')
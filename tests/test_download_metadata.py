@@ -0,0 +1,117 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+from os.path import abspath, dirname, exists, join
+import shutil
+import tempfile
+from threading import Lock, Thread
+from unittest import TestCase
+from urllib.parse import parse_qs, urlparse
+
+from iatikit.utils import download
+from iatikit.utils.config import CONFIG
+
+
+class MockRegistry(object):
+    """A stand-in for the IATI registry API."""
+
+    def __init__(self, datasets, rate_limited=()):
+        self.datasets = datasets
+        self.rate_limited = set(rate_limited)
+        self.requests = []
+        self.lock = Lock()
+
+    def handle(self, url):
+        parsed = urlparse(url)
+        query = parse_qs(parsed.query)
+        with self.lock:
+            self.requests.append(url)
+            if url in self.rate_limited:
+                self.rate_limited.remove(url)
+                return 429, None
+        if parsed.path == '/api/3/action/package_search':
+            start = int(query['start'][0])
+            rows = int(query['rows'][0])
+            return 200, {'result': {
+                'count': len(self.datasets),
+                'results': self.datasets[start:start + rows],
+            }}
+        if parsed.path == '/api/3/action/group_show':
+            return 200, {'result': {'name': query['id'][0]}}
+        return 404, None
+
+
+class TestDownloadMetadata(TestCase):
+    def setUp(self):
+        self.registry_path = tempfile.mkdtemp(
+            dir=dirname(abspath(__file__)))
+        self.datasets = [{
+            'name': 'dataset-{}'.format(idx),
+            'organization': {'name': 'org-{}'.format(idx % 7)},
+        } for idx in range(2500)]
+        # a dataset with no publisher
+        self.datasets.append({'name': 'orphan', 'organization': None})
+        self.registry = MockRegistry(self.datasets, rate_limited=[
+            '/api/3/action/package_search?start=1000&rows=1000',
+            '/api/3/action/group_show?id=org-3',
+        ])
+
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, j = registry.handle(self.path)
+                self.send_response(status)
+                if status == 429:
+                    self.send_header('Retry-After', '0')
+                body = json.dumps(j).encode()
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.config = {
+            'paths': dict(CONFIG['paths']),
+            'data_sources': dict(CONFIG['data_sources']),
+        }
+        CONFIG.read_dict({
+            'paths': {'registry': self.registry_path},
+            'data_sources': {'registry_url': 'http://{}:{}'.format(
+                *self.server.server_address)},
+        })
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        CONFIG.read_dict(self.config)
+        shutil.rmtree(self.registry_path, ignore_errors=True)
+
+    def test_download_metadata(self):
+        download.metadata(workers=4)
+
+        metadata_path = join(self.registry_path, 'metadata')
+        for idx in range(2500):
+            filepath = join(metadata_path, 'org-{}'.format(idx % 7),
+                            'dataset-{}.json'.format(idx))
+            assert exists(filepath)
+        with open(join(metadata_path, 'org-3', 'dataset-3.json')) as f:
+            assert json.load(f) == self.datasets[3]
+        for idx in range(7):
+            with open(join(metadata_path, 'org-{}.json'.format(idx))) as f:
+                assert json.load(f) == {'name': 'org-{}'.format(idx)}
+        assert not exists(join(metadata_path, 'orphan.json'))
+        assert exists(join(self.registry_path, 'manifest.json'))
+
+        requests = self.registry.requests
+        # each publisher is only fetched once
+        assert len([x for x in requests if 'group_show' in x]) == 7 + 1
+        # rate limited requests are retried
+        assert self.registry.rate_limited == set()
+        assert requests.count(
+            '/api/3/action/package_search?start=1000&rows=1000') == 2
+        assert requests.count(
+            '/api/3/action/package_search?start=2000&rows=1000') == 1
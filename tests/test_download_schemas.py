@@ -23,13 +23,19 @@ XSD_TMPL = '''<?xml version="1.0" encoding="utf-8"?>
 
 
 class MockRequest():
-    def __init__(self, url):
+    status_code = 200
+    headers = {}
+
+    def __init__(self, url, **kwargs):
         filename = url.rsplit('/', 1)[-1]
         if filename == 'Version.json':
             self.filepath = join(dirname(abspath(__file__)),
                                  'fixtures', 'codelist_downloads',
                                  'Version-v201.json')
-        self.content = XSD_TMPL.format(filename=filename).encode()
+            with open(self.filepath, 'rb') as handler:
+                self.content = handler.read()
+        else:
+            self.content = XSD_TMPL.format(filename=filename).encode()
 
     def json(self):
         with open(self.filepath) as handler:
@@ -63,5 +69,32 @@ class TestDownloadSchemas(TestCase):
                     contents = handler.read()
                 assert contents == XSD_TMPL.format(filename=filename)
 
+    @patch('requests.Session')
+    def test_download_schemas_cached(self, mock_session):
+        requests = []
+
+        def mock_request(url, headers=None, **kwargs):
+            requests.append(headers)
+            response = MockRequest(url)
+            etag = '"{}"'.format(url.rsplit('/', 1)[-1])
+            if headers and headers.get('If-None-Match') == etag:
+                response.status_code = 304
+                response.content = b''
+            response.headers = {'ETag': etag}
+            return response
+        mock_session.return_value.get.side_effect = mock_request
+
+        download.schemas()
+        assert all(not headers for headers in requests)
+
+        del requests[:]
+        download.schemas()
+        assert len(requests) == 25
+        assert all(headers.get('If-None-Match') for headers in requests)
+
+        filepath = join(self.standard_path, 'schemas', '105', 'xml.xsd')
+        with open(filepath) as handler:
+            assert handler.read() == XSD_TMPL.format(filename='xml.xsd')
+
     def tearDown(self):
         shutil.rmtree(self.standard_path, ignore_errors=True)
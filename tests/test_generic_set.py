@@ -2,8 +2,10 @@ from os.path import abspath, dirname, join
 from unittest import TestCase
 
 from freezegun import freeze_time
+from mock import patch
 import pytest
 
+from iatikit.data.dataset import DatasetSet
 from iatikit.data.registry import Registry
 from iatikit.utils.exceptions import FilterError
 from iatikit.utils.config import CONFIG
@@ -78,6 +80,28 @@ class TestGenericSet(TestCase):
         org_dataset = org_datasets.where(name='fixture-org-org')
         assert org_dataset.count() == 1
 
+    def test_set_evaluate(self):
+        datasets = self.registry.datasets.where(filetype='activity')
+        results = datasets.evaluate()
+        assert len(results) == 4
+        assert results.count() == 4
+        assert results[0].name == 'fixture-org-activities'
+        assert [x.name for x in results[1:3]] == [
+            'fixture-org-activities2', 'old-org-acts']
+        assert [x.name for x in results] == [x.name for x in datasets]
+        assert results.first() is results[0]
+        assert results.get('old-org-acts') is results[2]
+        assert results.get(results[1]) is results[1]
+        assert results.get('fixture-org-org') is None
+
+    def test_set_evaluate_doesnt_rescan(self):
+        results = self.registry.datasets.evaluate()
+        with patch.object(DatasetSet, '__iter__') as fake_iter:
+            assert len(results) == 5
+            results.all()
+            results.get('fixture-org-org')
+            fake_iter.assert_not_called()
+
     def test_set_unknown_filter(self):
         with pytest.raises(FilterError):
             self.registry.datasets.where(unknown_filter='unknown')
@@ -0,0 +1,170 @@
+import os
+from os.path import abspath, dirname, exists, join
+import shutil
+import sqlite3
+import tempfile
+from unittest import TestCase
+
+from freezegun import freeze_time
+from mock import patch
+
+from iatikit.data.registry import Registry
+from iatikit.utils import compression, index
+from iatikit.utils.config import CONFIG
+from iatikit import Sector
+
+
+class TestActivityIndex(TestCase):
+    @freeze_time("2015-12-02")
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp(dir=dirname(abspath(__file__)))
+        self.registry_path = join(self.tmp_path, 'registry')
+        shutil.copytree(join(dirname(abspath(__file__)),
+                             'fixtures', 'registry'),
+                        self.registry_path)
+        standard_path = join(dirname(abspath(__file__)),
+                             'fixtures', 'standard')
+        config_dict = {'paths': {
+            'registry': self.registry_path,
+            'standard': standard_path,
+        }}
+        CONFIG.read_dict(config_dict)
+        self.registry = Registry()
+
+    def _ids(self, **kwargs):
+        return [act.iati_identifier
+                for act in self.registry.activities.where(**kwargs)]
+
+    def test_build(self):
+        index.build()
+        assert exists(join(self.registry_path, 'activity-index.sqlite'))
+
+    def test_indexed_results_match(self):
+        queries = [
+            {},
+            {'iati_identifier': 'GB-COH-01234567-Humanitarian Aid-1'},
+            {'id__startswith': 'NL-CHC'},
+            {'planned_start__gte': '2011-01-01'},
+            {'actual_end__lt': '2020-01-01'},
+            {'humanitarian': True},
+            {'humanitarian': False},
+            {'sector': Sector('15163', vocabulary='DAC')},
+        ]
+        expected = [self._ids(**query) for query in queries]
+        index.build()
+        for query, ids in zip(queries, expected):
+            assert self._ids(**query) == ids
+            assert len(self.registry.activities.where(**query)) == len(ids)
+
+    def test_only_matching_activities_loaded(self):
+        index.build()
+        act = self.registry.activities.find(
+            iati_identifier='GB-COH-01234567-1')
+        assert act.dataset._etree is None
+        assert act.title == ['Development work']
+
+    def test_evaluated_activities_loaded_from_index(self):
+        index.build()
+        acts = self.registry.activities.where(humanitarian=True).evaluate()
+        assert len(acts) == 1
+        act = acts[0]
+        assert act.dataset._etree is None
+        assert act.iati_identifier == 'GB-COH-01234567-1'
+
+    @freeze_time("2015-12-02")
+    def test_index_for_registry_path(self):
+        CONFIG.read_dict({'paths': {'registry': self.tmp_path}})
+        index.build(path=self.registry_path)
+        registry = Registry(self.registry_path)
+        act = registry.activities.find(iati_identifier='GB-COH-01234567-1')
+        assert act.dataset._etree is None
+        assert act.title == ['Development work']
+        assert len(registry.activities.where(humanitarian=True)) == 1
+
+    def test_connections_closed(self):
+        index.build()
+        close = index.ActivityIndex.close
+        with patch.object(index.ActivityIndex, 'close', autospec=True,
+                          side_effect=close) as mock_close:
+            acts = self.registry.activities.where(humanitarian=True)
+            for _ in range(3):
+                len(acts)
+            assert mock_close.call_count == 3
+            for _ in acts:
+                pass
+            assert mock_close.call_count == 4
+            # stopping part way through still closes the index
+            iterator = iter(self.registry.activities)
+            next(iterator)
+            iterator.close()
+            assert mock_close.call_count == 5
+
+    def test_end_tag_in_comment(self):
+        data_path = join(self.registry_path, 'data', 'fixture-org',
+                         'fixture-org-activities.xml')
+        with open(data_path, 'rb') as handler:
+            xml = handler.read()
+        xml = xml.replace(
+            b'<iati-identifier>GB-COH-01234567-1</iati-identifier>',
+            b'<!-- old </iati-activity> marker -->' +
+            b'<iati-identifier>GB-COH-01234567-1</iati-identifier>' +
+            b'<![CDATA[ </iati-activity> ]]>')
+        with open(data_path, 'wb') as handler:
+            handler.write(xml)
+        expected = self._ids()
+        index.build()
+        assert self._ids() == expected
+        assert self._ids(humanitarian=True) == ['GB-COH-01234567-1']
+
+    def test_bad_offsets_fall_back(self):
+        expected = self._ids()
+        index.build()
+        index_path = join(self.registry_path, 'activity-index.sqlite')
+        conn = sqlite3.connect(index_path)
+        conn.execute('UPDATE activities SET end_offset = end_offset - 20')
+        conn.commit()
+        conn.close()
+        assert self._ids() == expected
+
+    def test_unsupported_filter_falls_back(self):
+        index.build()
+        acts = self.registry.activities.where(title='Development work')
+        assert [x.iati_identifier for x in acts] == ['GB-COH-01234567-1']
+        assert acts.first().dataset._etree is not None
+
+    def test_changed_dataset_falls_back(self):
+        index.build()
+        data_path = join(self.registry_path, 'data', 'fixture-org',
+                         'fixture-org-activities.xml')
+        with open(data_path, 'rb') as handler:
+            xml = handler.read()
+        with open(data_path, 'wb') as handler:
+            handler.write(xml.replace(b'GB-COH-01234567-1',
+                                      b'GB-COH-01234567-99'))
+        ids = self._ids(id__startswith='GB-COH-01234567-99')
+        assert ids == ['GB-COH-01234567-99']
+
+        index.build()
+        assert self._ids(iati_identifier='GB-COH-01234567-1') == []
+        assert self._ids(iati_identifier='GB-COH-01234567-99') == \
+            ['GB-COH-01234567-99']
+
+    def test_compressed_dataset(self):
+        data_path = join(self.registry_path, 'data', 'fixture-org',
+                         'fixture-org-activities.xml')
+        with open(data_path, 'rb') as handler:
+            compression.write(handler, data_path, 'gzip')
+        os.unlink(data_path)
+        queries = [
+            {},
+            {'iati_identifier': 'GB-COH-01234567-1'},
+            {'humanitarian': True},
+        ]
+        expected = [self._ids(**query) for query in queries]
+        assert expected[1] == ['GB-COH-01234567-1']
+        index.build()
+        for query, ids in zip(queries, expected):
+            assert self._ids(**query) == ids
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
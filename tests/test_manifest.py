@@ -0,0 +1,89 @@
+import os
+from os.path import abspath, dirname, exists, join
+import shutil
+import tempfile
+from unittest import TestCase
+
+from freezegun import freeze_time
+from mock import patch
+
+from iatikit.data.dataset import Dataset
+from iatikit.data.registry import Registry
+from iatikit.utils import manifest
+from iatikit.utils.config import CONFIG
+
+
+class TestManifest(TestCase):
+    @freeze_time("2015-12-02")
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp(dir=dirname(abspath(__file__)))
+        self.registry_path = join(self.tmp_path, 'registry')
+        shutil.copytree(join(dirname(abspath(__file__)),
+                             'fixtures', 'registry'),
+                        self.registry_path)
+        config_dict = {'paths': {'registry': self.registry_path}}
+        CONFIG.read_dict(config_dict)
+        self.registry = Registry()
+
+    def test_no_manifest(self):
+        assert self.registry.publishers.manifest is None
+
+    def test_build(self):
+        manifest.build()
+        assert exists(join(self.registry_path, 'manifest.json'))
+        assert self.registry.publishers.manifest is not None
+
+    def test_manifest_results_match(self):
+        publishers = [x.name for x in self.registry.publishers]
+        datasets = [x.name for x in self.registry.datasets]
+        publisher_datasets = [x.name for x in
+                              self.registry.publishers.get('old-org').datasets]
+        manifest.build()
+        assert [x.name for x in self.registry.publishers] == publishers
+        assert [x.name for x in self.registry.datasets] == datasets
+        assert [x.name for x in self.registry.publishers.get(
+            'old-org').datasets] == publisher_datasets
+
+    def test_filetype_from_manifest(self):
+        manifest.build()
+        publisher = self.registry.publishers.get('fixture-org')
+        with patch.object(Dataset, 'metadata') as fake_metadata:
+            datasets = publisher.datasets.where(filetype='organisation')
+            assert [x.name for x in datasets] == ['fixture-org-org']
+            assert datasets.first()._etree is None
+            fake_metadata.__getitem__.assert_not_called()
+
+    def test_new_dataset_found(self):
+        manifest.build()
+        shutil.copy(join(self.registry_path, 'data', 'old-org',
+                         'old-org-acts.xml'),
+                    join(self.registry_path, 'data', 'old-org',
+                         'old-org-acts-copy.xml'))
+        dataset = self.registry.datasets.get('old-org-acts-copy')
+        assert dataset is not None
+        assert dataset.filetype == 'activity'
+        assert dataset.version == '1.03'
+
+    def test_unchanged_files_not_checked(self):
+        manifest.build()
+        with patch.object(manifest, 'stat', wraps=os.stat) as fake_stat:
+            datasets = [x.name for x in self.registry.datasets]
+        assert datasets
+        checked = [call[0][0] for call in fake_stat.call_args_list]
+        assert not [x for x in checked if x.endswith(('.xml', '.json'))]
+
+    def test_read_only_registry(self):
+        manifest.build()
+        shutil.copy(join(self.registry_path, 'data', 'old-org',
+                         'old-org-acts.xml'),
+                    join(self.registry_path, 'data', 'old-org',
+                         'old-org-acts-copy.xml'))
+        with patch.object(manifest, 'replace',
+                          side_effect=PermissionError):
+            dataset = self.registry.datasets.get('old-org-acts-copy')
+            assert dataset.version == '1.03'
+            with self.assertRaises(PermissionError):
+                manifest.get_manifest(self.registry_path).save()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
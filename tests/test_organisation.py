@@ -33,6 +33,19 @@ class TestOrganisationSet(TestCase):
     def test_organisations_len(self):
         assert len(self.fixture_org_orgs) == 1
 
+    def test_organisations_parallel(self):
+        orgs = self.fixture_org_orgs.parallel(workers=2)
+        assert len(orgs) == 1
+        assert orgs.first().org_identifier == 'GB-COH-01234567'
+
+    def test_organisations_evaluate(self):
+        orgs = self.fixture_org_orgs.evaluate()
+        assert len(orgs) == 1
+        assert orgs.get('GB-COH-01234567').org_identifier == \
+            'GB-COH-01234567'
+        orgs = self.fixture_org_orgs.parallel(workers=2).evaluate()
+        assert [x.org_identifier for x in orgs] == ['GB-COH-01234567']
+
     def test_organisations_filter_by_id(self):
         iati_id = 'GB-COH-01234567'
         orgs = self.fixture_org_orgs.where(id=iati_id).all()
@@ -86,6 +99,13 @@ class TestOrganisation(TestCase):
         assert self.organisation.id == id_
         assert self.organisation.org_identifier == id_
 
+    def test_organisation_id_memoized(self):
+        id_ = self.organisation.org_identifier
+        with patch.object(OrganisationSchema203,
+                          'org_identifier') as mock_org_identifier:
+            assert self.organisation.id == id_
+            assert mock_org_identifier.call_count == 0
+
     def test_organisation_repr(self):
         org_repr = '<Organisation (GB-COH-01234567)>'
         assert str(self.organisation) == org_repr
@@ -1,6 +1,8 @@
 from os.path import abspath, dirname, join
+import pickle
 from unittest import TestCase
 
+from lxml import etree as ET
 import pytest
 
 from iatikit import Sector
@@ -64,3 +66,92 @@ class TestSector(TestCase):
         codelist_item = codelist.get('DAC')
         with pytest.raises(InvalidSectorCodeError):
             Sector(codelist_item)
+
+    def test_sector_from_elements(self):
+        etree = ET.fromstring(
+            '<iati-activity>' +
+            '<sector code="73010" vocabulary="1" percentage="50" />' +
+            '<sector code="151" vocabulary="2" percentage="50" />' +
+            '<sector code="73010" />' +
+            '<sector code="ABCD" vocabulary="3" />' +
+            '</iati-activity>')
+        sectors = Sector.from_elements(etree.findall('sector'))
+        assert sectors == [
+            Sector('73010', vocabulary='1', percentage='50'),
+            Sector('151', vocabulary='2', percentage='50'),
+            Sector('73010', vocabulary='1'),
+            Sector('ABCD', vocabulary='3'),
+        ]
+        assert sectors[0].percentage == 50.0
+        assert sectors[2].percentage is None
+        assert sectors[0].code is sectors[2].code
+
+    def test_sector_from_elements_unknown_code(self):
+        etree = ET.fromstring('<sector code="12345" vocabulary="1" />')
+        with pytest.raises(UnknownSectorCodeError):
+            Sector.from_elements([etree])
+
+    def test_sector_from_elements_interned(self):
+        etree = ET.fromstring(
+            '<iati-activity>' +
+            '<sector code="73010" vocabulary="1" />' +
+            '<sector code="73010" vocabulary="1" />' +
+            '<sector code="73010" vocabulary="1" percentage="50" />' +
+            '</iati-activity>')
+        sectors = Sector.from_elements(etree.findall('sector'))
+        assert sectors[0] is sectors[1]
+        assert sectors[2] is not sectors[0]
+        assert sectors[2].code is sectors[0].code
+
+    def test_sector_immutable(self):
+        sector = Sector('73010', vocabulary='1', percentage=50)
+        with pytest.raises(AttributeError):
+            sector.percentage = 100
+        with pytest.raises(AttributeError):
+            sector.code.name = 'Changed'
+        with pytest.raises(AttributeError):
+            sector.other = True
+
+    def test_sector_hashable(self):
+        sectors = {
+            Sector('73010', vocabulary='1'),
+            Sector('73010', vocabulary='1'),
+            Sector('151', vocabulary='2'),
+        }
+        assert len(sectors) == 2
+        assert Sector('73010', vocabulary='1') in sectors
+        counts = {Sector('151', vocabulary='2'): 1}
+        assert counts[Sector('151', vocabulary='2')] == 1
+
+        codelist_item = Codelist('Sector', '2.03').get('73010')
+        assert hash(codelist_item) == hash('73010')
+        assert len({codelist_item, codelist_item}) == 1
+
+    def test_sector_hash_matches_equality(self):
+        sectors = [
+            Sector('', vocabulary='99'),
+            Sector('ABCD', vocabulary='99'),
+            Sector('EFGH', vocabulary='99'),
+            Sector('ABCD'),
+            Sector('ABCD', vocabulary='99', percentage=50),
+        ]
+        for sector in sectors:
+            for other in sectors:
+                if sector == other:
+                    assert hash(sector) == hash(other)
+        assert Sector('', vocabulary='99') == Sector('ABCD', vocabulary='99')
+        assert Sector('ABCD') == Sector('ABCD', vocabulary='99')
+
+    def test_sector_from_elements_codelist(self):
+        Codelist('Sector', '2.03').get('73010')
+        etree = ET.fromstring('<sector code="73010" vocabulary="1" />')
+        sector = Sector.from_elements([etree])[0]
+        assert sector.code.codelist.version is None
+        assert sector.code is Sector('73010', vocabulary='1').code
+
+    def test_sector_pickle(self):
+        sector = Sector('73010', vocabulary='1', percentage=50)
+        unpickled = pickle.loads(pickle.dumps(sector))
+        assert unpickled == sector
+        assert unpickled.code.codelist.slug == 'Sector'
+        assert unpickled.code.codelist.get('73010') == sector.code
@@ -0,0 +1,118 @@
+from contextlib import contextmanager, redirect_stdout
+import io
+import json
+import os
+from os.path import abspath, dirname, exists, join
+from shutil import rmtree
+import sys
+from tempfile import mkdtemp
+from unittest import TestCase
+import warnings
+
+from mock import patch
+
+from iatikit.utils.config import CONFIG
+from iatikit.utils.validate import main, validate_registry
+
+
+class TestValidateRegistry(TestCase):
+    def setUp(self):
+        fixtures_path = join(dirname(abspath(__file__)), 'fixtures')
+        self.registry_path = join(fixtures_path, 'registry')
+        CONFIG.read_dict({'paths': {
+            'standard': join(fixtures_path, 'standard'),
+        }})
+        self.tmp_path = mkdtemp()
+        self.output_path = join(self.tmp_path, 'results.jsonl')
+
+    @contextmanager
+    def _ignore_stale_data(self):
+        with warnings.catch_warnings():
+            # the fixture registry is always out of date
+            warnings.filterwarnings('ignore', 'Warning: Data was last',
+                                    UserWarning)
+            yield
+
+    def _validate(self):
+        with self._ignore_stale_data():
+            return validate_registry(self.output_path, self.registry_path,
+                                     workers=2)
+
+    def _results(self):
+        with open(self.output_path) as handler:
+            return {x['name']: x for x in map(json.loads, handler)}
+
+    def test_validate_registry(self):
+        counts = self._validate()
+        assert counts == {'validated': 5, 'skipped': 0}
+        assert exists(self.output_path + '.state')
+
+        results = self._results()
+        assert len(results) == 5
+        result = results['old-org-acts']
+        assert result['dataset'] == join('data', 'old-org',
+                                         'old-org-acts.xml')
+        assert result['version'] == '1.03'
+        assert result['xml']['valid'] is True
+        assert result['iati']['valid'] is True
+        assert result['codelists']['valid'] is True
+
+        result = results['fixture-org-activities']
+        assert result['codelists']['valid'] is False
+        assert len(result['codelists']['errors']) == 2
+
+        result = results['old-org-missing-acts']
+        assert result['xml']['valid'] is False
+        assert result['hash'] is None
+
+    def test_unchanged_datasets_skipped(self):
+        self._validate()
+        first_results = self._results()
+        counts = self._validate()
+        assert counts == {'validated': 0, 'skipped': 5}
+        assert self._results() == first_results
+
+    def test_state_changed(self):
+        self._validate()
+        # forget one of the datasets
+        state_path = self.output_path + '.state'
+        with open(state_path) as handler:
+            state = [json.loads(line) for line in handler]
+        assert len(state) == 5
+        with open(state_path, 'w') as handler:
+            for entry in state:
+                if entry['dataset'] != join('data', 'old-org',
+                                            'old-org-acts.xml'):
+                    handler.write(json.dumps(entry) + '\n')
+
+        counts = self._validate()
+        assert counts == {'validated': 1, 'skipped': 4}
+        assert len(self._results()) == 5
+
+    def test_resume(self):
+        self._validate()
+        first_results = self._results()
+        # simulate a first run, interrupted part way through
+        # writing a result
+        partial_path = self.output_path + '.partial'
+        os.rename(self.output_path, partial_path)
+        with open(partial_path, 'ab') as handler:
+            handler.write(b'{"name": "cut sho')
+
+        counts = self._validate()
+        assert counts == {'validated': 0, 'skipped': 5}
+        assert self._results() == first_results
+        assert not exists(partial_path)
+
+    def test_main(self):
+        argv = ['iatikit-validate', self.output_path,
+                '--registry', self.registry_path, '--workers', '2']
+        output = io.StringIO()
+        with patch.object(sys, 'argv', argv), redirect_stdout(output), \
+                self._ignore_stale_data():
+            main()
+        assert output.getvalue() == '5 datasets validated, 0 unchanged.\n'
+        assert len(self._results()) == 5
+
+    def tearDown(self):
+        rmtree(self.tmp_path)
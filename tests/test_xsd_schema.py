@@ -0,0 +1,58 @@
+from os.path import abspath, dirname, join
+from unittest import TestCase
+
+from lxml import etree as ET
+from mock import patch
+
+from iatikit.standard import xsd_schema
+from iatikit.standard.xsd_schema import XSDSchema, compile_schemas
+from iatikit.utils.config import CONFIG
+
+
+class TestXSDSchema(TestCase):
+    def setUp(self):
+        standard_path = join(dirname(abspath(__file__)), 'fixtures',
+                             'standard')
+        CONFIG.read_dict({'paths': {'standard': standard_path}})
+        xsd_schema._COMPILED_SCHEMAS.clear()
+
+    def test_schema_compiled_once(self):
+        etree = ET.fromstring(b'<iati-activities version="1.03" />')
+        with patch.object(ET, 'XMLSchema',
+                          wraps=ET.XMLSchema) as mock_xmlschema:
+            XSDSchema('activity', '1.03').validate(etree)
+            XSDSchema('activity', '1.03').validate(etree)
+        assert mock_xmlschema.call_count == 1
+
+    def test_schema_recompiled_when_changed(self):
+        etree = ET.fromstring(b'<iati-activities version="1.03" />')
+        schema = XSDSchema('activity', '1.03')
+        schema.validate(etree)
+        compiled = schema._compiled()
+        with patch.object(xsd_schema, 'stat') as mock_stat:
+            mock_stat.return_value.st_mtime = 0
+            assert schema._compiled() is not compiled
+        assert len(xsd_schema._COMPILED_SCHEMAS) == 1
+
+    def test_validate_errors(self):
+        etree = ET.fromstring(b'<iati-activities version="1.03">' +
+                              b'<iati-activity /></iati-activities>')
+        schema = XSDSchema('activity', '1.03')
+        invalid = schema.validate(etree)
+        assert not invalid.is_valid
+        assert len(invalid.errors) > 0
+
+        etree = ET.fromstring(b'<iati-activities version="1.03" />')
+        valid = schema.validate(etree)
+        assert valid.is_valid
+        assert len(valid.errors) == 0
+        # errors from earlier validations are unaffected
+        assert len(invalid.errors) > 0
+
+    def test_compile_schemas(self):
+        schemas = compile_schemas()
+        assert [(x.filetype, x.version) for x in schemas] == [
+            ('activity', '1.03'),
+            ('organisation', '1.03'),
+        ]
+        assert len(xsd_schema._COMPILED_SCHEMAS) == 2